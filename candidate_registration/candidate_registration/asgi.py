@@ -2,6 +2,9 @@
 ASGI config for candidate_registration project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by Django; WebSocket connections (the exam
+monitoring channel at /ws/monitor) are handled by registration.consumers.
+Run it under an ASGI server such as uvicorn or daphne.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +16,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'candidate_registration.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads the views and the monitor
+from registration.consumers import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'registration.middleware.SampledProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'candidate_registration.urls'
@@ -129,6 +130,11 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB in bytes
 FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB in bytes
 
+# Sampled request profiling (registration/utils/profiling.py). Off by default;
+# PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_PATHS and PROFILE_DIR can be
+# set here or through the environment.
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '0') == '1'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import queue
+import base64
+import asyncio
+import functools
+from urllib.parse import parse_qs
+
+from registration.utils.db import get_user, is_storage_available
+from registration.utils.events import alert_events
+from registration.utils.executors import run_io, run_inference
+from registration.utils.capture_policy import capture_policy
+from registration.utils.admission import frame_admission, RUN, SHED
+from registration.views import monitor_instance
+
+# Telemetry events buffered per connection before the oldest are dropped
+WS_EVENT_QUEUE_SIZE = int(os.environ.get('WS_EVENT_QUEUE_SIZE', 256))
+
+# Close codes (4000-4999 are reserved for applications)
+CLOSE_BAD_REQUEST = 4400
+CLOSE_UNKNOWN_USER = 4404
+
+
+class MonitorSocket:
+    """
+    Per-session WebSocket channel for exam monitoring.
+
+    The client connects once to /ws/monitor?user_id=...&session_id=..., which
+    fixes the session identity for the whole connection. Upstream messages
+    are webcam frames (binary JPEG, or JSON {"type": "frame", "frame": data
+    URL}) and telemetry events (JSON {"type": "event", "event": name, "data":
+    {...}}); {"type": "end"} ends the session. Downstream messages are
+    detection results ({"type": "result"}) and alerts ({"type": "alert"}).
+
+    Frames use latest-frame-wins back-pressure: only one frame per
+    connection is analyzed at a time, and a frame arriving while another is
+    waiting replaces it, so a slow server never works through a backlog of
+    stale frames. Telemetry events are processed in order. Each result
+    carries the capture settings the client should use next (see
+    capture_policy).
+    """
+
+    event_handlers = {
+        'tab_switch': monitor_instance.log_tab_switch,
+        'mouse_movement': monitor_instance.log_mouse_movement,
+        'screen_capture': monitor_instance.detect_screen_capture,
+        'copy_paste': monitor_instance.log_copy_paste,
+    }
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self._send_lock = asyncio.Lock()
+
+        params = parse_qs(scope.get('query_string', b'').decode())
+        self.user_id = params.get('user_id', [None])[0]
+        self.session_id = params.get('session_id', [None])[0]
+        self.session_key = f"{self.user_id}:{self.session_id}"
+
+        self._latest_frame = None
+        self._frame_ready = asyncio.Event()
+        self._events = asyncio.Queue(maxsize=WS_EVENT_QUEUE_SIZE)
+        self._alerts = None
+
+        self.frames_received = 0
+        self.frames_superseded = 0
+        self.events_dropped = 0
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        if not self.user_id or not self.session_id:
+            await self.send({'type': 'websocket.close', 'code': CLOSE_BAD_REQUEST})
+            return
+        if await run_io(is_storage_available) and not await run_io(get_user, self.user_id, ['id']):
+            await self.send({'type': 'websocket.close', 'code': CLOSE_UNKNOWN_USER})
+            return
+
+        await self.send({'type': 'websocket.accept'})
+        self._alerts = alert_events.subscribe(self.session_key)
+        workers = [
+            asyncio.create_task(self.process_frames()),
+            asyncio.create_task(self.process_events()),
+        ]
+        try:
+            while True:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('bytes') is not None:
+                    self.offer_frame(message['bytes'])
+                elif message.get('text') is not None:
+                    if await self.handle_text(message['text']):
+                        break
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            alert_events.unsubscribe(self.session_key, self._alerts)
+
+    async def handle_text(self, text):
+        """Handle a JSON message; returns True once the session has ended."""
+        try:
+            data = json.loads(text)
+        except ValueError:
+            await self.send_json({'type': 'error', 'message': 'Invalid JSON'})
+            return False
+
+        message_type = data.get('type')
+        if message_type == 'frame':
+            try:
+                frame = data.get('frame') or ''
+                self.offer_frame(base64.b64decode(frame.split(',')[-1]))
+            except ValueError:
+                await self.send_json({'type': 'error', 'message': 'Invalid frame encoding'})
+        elif message_type == 'event':
+            self.offer_event(data.get('event'), data.get('data') or {})
+        elif message_type == 'end':
+            # Let queued telemetry land before the session's logs are closed
+            await self._events.join()
+            result = await run_io(monitor_instance.end_session, self.user_id, self.session_id)
+            await self.send_json({'type': 'ended', **result})
+            await self.send({'type': 'websocket.close', 'code': 1000})
+            return True
+        else:
+            await self.send_json({'type': 'error', 'message': f'Unknown message type: {message_type}'})
+        return False
+
+    def offer_frame(self, image_data):
+        """Make image_data the next frame to analyze, replacing any frame still waiting."""
+        self.frames_received += 1
+        if self._latest_frame is not None:
+            self.frames_superseded += 1
+            frame_admission.record_superseded()
+        self._latest_frame = image_data
+        self._frame_ready.set()
+
+    def offer_event(self, name, event_data):
+        if self._events.full():
+            self._events.get_nowait()
+            self._events.task_done()
+            self.events_dropped += 1
+        self._events.put_nowait((name, event_data))
+
+    async def process_frames(self):
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            image_data, self._latest_frame = self._latest_frame, None
+            if image_data is None:
+                continue
+
+            # The global inference bound applies to socket frames too
+            outcome = await frame_admission.acquire(self.session_key)
+            if outcome != RUN:
+                if outcome == SHED:
+                    await self.send_json({
+                        'type': 'result',
+                        'status': 'shed',
+                        'retry_after': frame_admission.retry_after(capture_policy.latency_ewma),
+                        'capture': capture_policy.recommend(self.session_key),
+                    })
+                continue
+
+            # Released when the job finishes, even if the socket closes first
+            started = time.monotonic()
+            result = await run_inference(monitor_instance.monitor_frame_bytes, image_data,
+                                         self.user_id, self.session_id,
+                                         on_done=functools.partial(frame_admission.release, self.session_key))
+            capture_policy.observe(self.session_key, time.monotonic() - started, result,
+                                   enrolled_user_id=self.user_id if self.user_id in monitor_instance.gallery else None)
+            await self.send_json({
+                'type': 'result',
+                **result,
+                'capture': capture_policy.recommend(self.session_key),
+                'frames_received': self.frames_received,
+                'frames_superseded': self.frames_superseded,
+            })
+            await self.flush_alerts()
+
+    async def process_events(self):
+        while True:
+            name, event_data = await self._events.get()
+            try:
+                handler = self.event_handlers.get(name)
+                if handler is None:
+                    await self.send_json({'type': 'error', 'message': f'Unknown event: {name}'})
+                    continue
+                result = await run_io(handler, self.user_id, self.session_id, event_data)
+                if result.get('status') != 'success':
+                    await self.send_json({'type': 'error', 'event': name, 'message': result.get('message')})
+                await self.flush_alerts()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self.send_json({'type': 'error', 'event': name, 'message': str(e)})
+            finally:
+                self._events.task_done()
+
+    async def flush_alerts(self):
+        """Forward alerts raised for this session since the last flush."""
+        while True:
+            try:
+                alert = self._alerts.get_nowait()
+            except queue.Empty:
+                return
+            await self.send_json({'type': 'alert', **alert})
+
+    async def send_json(self, payload):
+        async with self._send_lock:
+            await self.send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for WebSocket connections, routed by path."""
+    if scope['path'].rstrip('/') == '/ws/monitor':
+        await MonitorSocket(scope, receive, send).run()
+        return
+    message = await receive()
+    if message['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': CLOSE_BAD_REQUEST})
@@ -0,0 +1,78 @@
+import os
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.utils.db import init_db, JSONEncoder
+from registration.utils.recording_analysis import (
+    analyze_recording, RECORDING_SAMPLE_FPS, RECORDING_BATCH_SIZE, RECORDING_IDENTITY_INTERVAL,
+    RECORDING_WORKERS,
+)
+
+
+class Command(BaseCommand):
+    help = "Analyze recorded exam sessions offline and store their violation timelines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('videos', nargs='+',
+                            help="Recording file(s) to analyze")
+        parser.add_argument('--user-id', default=None,
+                            help="Candidate in the recording(s); enables identity checks")
+        parser.add_argument('--session-id', default=None,
+                            help="Exam session id (default: recording file name)")
+        parser.add_argument('--sample-fps', type=float, default=RECORDING_SAMPLE_FPS,
+                            help="Frames analyzed per second of recording")
+        parser.add_argument('--batch-size', type=int, default=RECORDING_BATCH_SIZE,
+                            help="Frames per detector batch")
+        parser.add_argument('--identity-interval', type=float, default=RECORDING_IDENTITY_INTERVAL,
+                            help="Seconds between identity checks")
+        parser.add_argument('--workers', type=int, default=RECORDING_WORKERS,
+                            help="Worker processes per recording")
+        parser.add_argument('--output', default=None,
+                            help="Also write the results to this JSON file")
+        parser.add_argument('--no-store', action='store_true',
+                            help="Do not save results to the recording_analyses collection")
+
+    def handle(self, *args, **options):
+        if options['sample_fps'] <= 0:
+            raise CommandError("--sample-fps must be positive")
+        init_db()
+
+        results = []
+        for video in options['videos']:
+            if not os.path.isfile(video):
+                raise CommandError(f"Recording not found: {video}")
+            session_id = options['session_id'] or os.path.splitext(os.path.basename(video))[0]
+            try:
+                result = analyze_recording(
+                    video,
+                    user_id=options['user_id'],
+                    session_id=session_id,
+                    sample_fps=options['sample_fps'],
+                    batch_size=max(1, options['batch_size']),
+                    identity_interval=options['identity_interval'],
+                    workers=max(1, options['workers']),
+                    store=not options['no_store'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            results.append(result)
+
+            self.stdout.write(
+                f"{video}: {result['duration_seconds']:.0f}s analyzed in {result['processing_seconds']:.1f}s "
+                f"({result['speedup']}x real time, {result['sampled_frames']} frames, "
+                f"{result['segments']} segments)"
+            )
+            for interval in result['timeline']:
+                self.stdout.write(
+                    f"  {interval['start']:8.1f}s - {interval['end']:8.1f}s  {interval['type']:<18} "
+                    f"frames={interval['frames']} max={interval['max_count']}"
+                )
+            if result['identity_checks']:
+                self.stdout.write(f"  identity: {result['identity_mismatches']}/{result['identity_checks']} "
+                                  f"checks mismatched")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, cls=JSONEncoder)
+            self.stdout.write(f"Results written to {options['output']}")
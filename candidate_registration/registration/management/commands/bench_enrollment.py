@@ -0,0 +1,216 @@
+import os
+import time
+import uuid
+import base64
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.utils.bench import (BENCH_DIR, latency_summary, environment_info, scratch_storage,
+                                      write_report, tree_bytes, sqlite_bytes, PeakRSSMonitor)
+from registration.utils.video_processor import extract_frames, process_video, store_frames_in_db
+from registration.utils.model_trainer import train_yolo_model
+
+# Container formats the browser may upload, and the codec used to synthesize them
+CLIP_CODECS = {
+    'webm': 'VP80',
+    'mp4': 'mp4v',
+}
+STAGES = ('decode', 'extract_frames', 'process_video', 'store_frames', 'train_model')
+
+
+class Command(BaseCommand):
+    help = "Drive synthetic enrollment videos through the save_video stages and report cost per stage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clips', type=int, default=4,
+                            help="Number of candidate videos to enroll")
+        parser.add_argument('--seconds', type=float, default=5,
+                            help="Length of each synthetic clip")
+        parser.add_argument('--fps', type=int, default=30)
+        parser.add_argument('--resolution', default='640x480',
+                            help="Clip resolution as WIDTHxHEIGHT")
+        parser.add_argument('--format', choices=sorted(CLIP_CODECS), default='webm',
+                            help="Container of the synthetic clips")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Enrollments run at once in the concurrent pass")
+        parser.add_argument('--mode', choices=['sequential', 'concurrent', 'both'], default='both')
+        parser.add_argument('--skip-train', action='store_true',
+                            help="Stop before model training, which dominates the run time")
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the working directory with clips, frames and models")
+        parser.add_argument('--output', default=None,
+                            help="JSON report path (default: logs/benchmarks/enrollment_<time>.json)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            width, height = (int(v) for v in options['resolution'].lower().split('x'))
+        except ValueError:
+            raise CommandError(f"Invalid resolution: {options['resolution']}")
+
+        work_dir = tempfile.mkdtemp(prefix='bench_enrollment_')
+        stages = STAGES[:-1] if options['skip_train'] else STAGES
+        report = {
+            'benchmark': 'enrollment',
+            'environment': environment_info(),
+            'options': {k: options[k] for k in ('clips', 'seconds', 'fps', 'resolution', 'format',
+                                                'concurrency', 'mode', 'skip_train', 'seed')},
+            'runs': {},
+        }
+        try:
+            rng = np.random.default_rng(options['seed'])
+            clips = [self.make_clip(os.path.join(work_dir, f"clip_{i}.{options['format']}"),
+                                    options['format'], options['seconds'], options['fps'], width, height, rng)
+                     for i in range(options['clips'])]
+            self.stdout.write(f"Generated {len(clips)} clips of {options['seconds']}s at "
+                              f"{width}x{height}@{options['fps']} ({options['format']}, "
+                              f"{sum(len(c) for c in clips) / len(clips) / 1024:.0f} KB average)")
+
+            modes = ['sequential', 'concurrent'] if options['mode'] == 'both' else [options['mode']]
+            for mode in modes:
+                concurrency = 1 if mode == 'sequential' else options['concurrency']
+                report['runs'][mode] = self.run(clips, os.path.join(work_dir, mode), concurrency, stages)
+                self.print_run(mode, report['runs'][mode])
+        finally:
+            if options['keep']:
+                self.stdout.write(f"Working directory kept at {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        output = options['output'] or os.path.join(BENCH_DIR, f"enrollment_{int(time.time())}.json")
+        write_report(report, output)
+        self.stdout.write(f"Report written to {output}")
+
+    def make_clip(self, path, container, seconds, fps, width, height, rng):
+        """
+        Write a synthetic webcam-like clip: a face-sized ellipse drifting over a
+        textured background with sensor noise, so the encoder cannot collapse it.
+
+        Returns:
+            The clip as the base64 data URL the registration page uploads
+        """
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*CLIP_CODECS[container]), fps, (width, height))
+        if not writer.isOpened():
+            raise CommandError(f"OpenCV cannot encode {container} ({CLIP_CODECS[container]}) on this system")
+        background = rng.integers(60, 200, (height // 8, width // 8, 3), dtype=np.uint8)
+        background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+        for i in range(max(1, int(seconds * fps))):
+            frame = background.copy()
+            t = i / fps
+            center = (int(width / 2 + width / 6 * np.sin(t)), int(height / 2 + height / 10 * np.cos(t * 1.3)))
+            cv2.ellipse(frame, center, (width // 8, height // 5), 0, 0, 360, (140, 170, 210), -1)
+            noise = rng.integers(-8, 9, frame.shape, dtype=np.int16)
+            writer.write(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+        writer.release()
+
+        with open(path, 'rb') as f:
+            mime = 'video/webm' if container == 'webm' else 'video/mp4'
+            return f"data:{mime};base64," + base64.b64encode(f.read()).decode('ascii')
+
+    def run(self, clips, run_dir, concurrency, stages):
+        """Enroll every clip with the given concurrency against a scratch store."""
+        os.makedirs(run_dir, exist_ok=True)
+        model_dir = os.path.join(run_dir, 'models')
+        with scratch_storage(run_dir) as backend, PeakRSSMonitor() as rss:
+            db_before = sqlite_bytes(backend)
+            # Peak memory and database growth are attributed to stages only
+            # when one enrollment runs at a time
+            per_stage_resources = concurrency == 1
+
+            def enroll(video_data):
+                user_id = str(uuid.uuid4())
+                backend.insert_user({'id': user_id, 'registration_status': 'registered'})
+                return self.enroll(video_data, user_id, os.path.join(run_dir, user_id), model_dir,
+                                   stages, backend if per_stage_resources else None, rss)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                enrollments = list(executor.map(enroll, clips))
+            wall = time.perf_counter() - started
+            peak_rss = rss.peak
+            db_bytes = sqlite_bytes(backend) - db_before
+
+        result = {
+            'concurrency': concurrency,
+            'enrollments': len(enrollments),
+            'failures': sum(1 for e in enrollments if e['failed_stage']),
+            'wall_seconds': round(wall, 3),
+            'enrollments_per_minute': round(60 * len(enrollments) / wall, 2) if wall else 0.0,
+            'peak_rss_bytes': peak_rss,
+            'disk_bytes_written': sum(e['disk_bytes'] for e in enrollments),
+            'db_bytes_written': db_bytes,
+            'stages': {},
+        }
+        for stage in stages:
+            timings = [e['stages'][stage]['seconds'] for e in enrollments if stage in e['stages']]
+            summary = latency_summary(timings)
+            if per_stage_resources:
+                summary['peak_rss_bytes'] = max(e['stages'][stage]['peak_rss_bytes']
+                                                for e in enrollments if stage in e['stages'])
+                summary['db_bytes_written'] = sum(e['stages'][stage]['db_bytes']
+                                                  for e in enrollments if stage in e['stages'])
+            result['stages'][stage] = summary
+        return result
+
+    def enroll(self, video_data, user_id, user_dir, model_dir, stages, backend, rss):
+        """Run one enrollment through the same stages, in the same order, as the save_video view."""
+        frames_dir = os.path.join(user_dir, 'frames')
+        annotations_dir = os.path.join(user_dir, 'annotations')
+        video_path = os.path.join(user_dir, 'video.webm')
+        os.makedirs(frames_dir, exist_ok=True)
+        os.makedirs(annotations_dir, exist_ok=True)
+
+        steps = {
+            'decode': lambda: self.write_video(video_data, video_path),
+            'extract_frames': lambda: extract_frames(video_path, frames_dir),
+            'process_video': lambda: process_video(frames_dir, annotations_dir, user_id),
+            'store_frames': lambda: store_frames_in_db(frames_dir, user_id),
+            'train_model': lambda: train_yolo_model(frames_dir, annotations_dir, model_dir, user_id),
+        }
+        timings = {}
+        failed_stage = None
+        for stage in stages:
+            if backend is not None:
+                rss.reset()
+                db_before = sqlite_bytes(backend)
+            started = time.perf_counter()
+            ok = steps[stage]()
+            timings[stage] = {'seconds': time.perf_counter() - started}
+            if backend is not None:
+                timings[stage].update(peak_rss_bytes=rss.peak, db_bytes=sqlite_bytes(backend) - db_before)
+            # store_frames failing is not fatal in save_video either
+            if not ok and stage != 'store_frames':
+                failed_stage = stage
+                break
+
+        disk_bytes = tree_bytes(user_dir)
+        for name in (f'user_{user_id}.pt', f'user_{user_id}_metadata.txt', f'dataset_{user_id}'):
+            path = os.path.join(model_dir, name)
+            if os.path.exists(path):
+                disk_bytes += tree_bytes(path)
+        return {'stages': timings, 'failed_stage': failed_stage, 'disk_bytes': disk_bytes}
+
+    @staticmethod
+    def write_video(video_data, video_path):
+        with open(video_path, 'wb') as f:
+            f.write(base64.b64decode(video_data.split(',')[1]))
+        return True
+
+    def print_run(self, mode, result):
+        self.stdout.write(
+            f"\n{mode}: {result['enrollments']} enrollments (concurrency {result['concurrency']}) in "
+            f"{result['wall_seconds']:.1f}s, {result['enrollments_per_minute']:.1f}/min, "
+            f"{result['failures']} failed, peak RSS {result['peak_rss_bytes'] / 2 ** 20:.0f} MB, "
+            f"disk {result['disk_bytes_written'] / 2 ** 20:.1f} MB, db {result['db_bytes_written'] / 2 ** 20:.1f} MB"
+        )
+        for stage, summary in result['stages'].items():
+            line = f"  {stage:<15} mean {summary['mean_ms']:>9.1f} ms  p95 {summary['p95_ms']:>9.1f} ms"
+            if 'peak_rss_bytes' in summary:
+                line += (f"  peak RSS {summary['peak_rss_bytes'] / 2 ** 20:>6.0f} MB"
+                         f"  db +{summary['db_bytes_written'] / 1024:>8.0f} KB")
+            self.stdout.write(line)
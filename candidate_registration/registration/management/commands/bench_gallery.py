@@ -0,0 +1,173 @@
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.utils.bench import BENCH_DIR, parse_int_list, latency_summary, environment_info, write_report
+from registration.utils.db import init_db, iter_users, get_embeddings
+from registration.utils.prototypes import PrototypeGallery, extract_prototypes
+
+# face_recognition encodings are 128-d; same-person distances fall well under
+# the 0.55 match tolerance and different people sit around 0.8-0.9 apart
+ENCODING_DIM = 128
+IDENTITY_SCALE = 0.055
+
+
+class Command(BaseCommand):
+    help = "Compare mean-only, prototype and all-frames face galleries on a verification benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help="Synthetic registered users")
+        parser.add_argument('--frames-per-user', type=int, default=30,
+                            help="Enrollment encodings per synthetic user")
+        parser.add_argument('--poses', type=int, default=5,
+                            help="Distinct head poses per synthetic user")
+        parser.add_argument('--pose-spread', type=float, default=0.045,
+                            help="Per-component spread of a pose around the identity")
+        parser.add_argument('--noise', type=float, default=0.012,
+                            help="Per-component frame-to-frame noise")
+        parser.add_argument('--probes-per-user', type=int, default=4,
+                            help="Genuine probe encodings per user")
+        parser.add_argument('--impostors', type=int, default=1000,
+                            help="Probe encodings of people who are not registered")
+        parser.add_argument('--from-storage', action='store_true',
+                            help="Use registered users' stored encodings instead of synthetic ones "
+                                 "(each user's frames are split into enrollment and probes)")
+        parser.add_argument('--k', default='1,2,3,5',
+                            help="Comma-separated prototype counts to evaluate")
+        parser.add_argument('--tolerance', type=float, default=0.55,
+                            help="Match distance tolerance (as in ExamMonitor.match_face)")
+        parser.add_argument('--latency-probes', type=int, default=500,
+                            help="Probes timed one at a time for match latency")
+        parser.add_argument('--output', default=None,
+                            help="JSON report path (default: logs/benchmarks/gallery_<time>.json)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        if options['from_storage']:
+            enrollment, probes, probe_owners = self.load_stored(rng)
+        else:
+            enrollment, probes, probe_owners = self.synthesize(options, rng)
+        if not enrollment:
+            raise CommandError("No users with stored face encodings")
+        user_ids = list(enrollment)
+        genuine = len(probe_owners) - int(np.sum(probe_owners == -1))
+        self.stdout.write(f"{len(user_ids)} users, {genuine} genuine and {len(probe_owners) - genuine} "
+                          f"impostor probes")
+
+        # Enrollment encodings are stored as float64 (as computed by face_recognition);
+        # prototypes are stored as float32
+        galleries = [('mean', lambda encodings: encodings.mean(axis=0, keepdims=True))]
+        galleries += [(f'prototypes_k{k}', lambda encodings, k=k: extract_prototypes(encodings, k))
+                      for k in parse_int_list(options['k'])]
+        galleries.append(('all_frames', lambda encodings: encodings))
+
+        results = []
+        for name, build in galleries:
+            gallery = PrototypeGallery()
+            started = time.perf_counter()
+            for user_id in user_ids:
+                gallery.set_user(user_id, build(enrollment[user_id]))
+            build_seconds = time.perf_counter() - started
+            result = {'gallery': name, 'build_ms_per_user': round(1000 * build_seconds / len(user_ids), 3)}
+            result.update(gallery.stats())
+            result.update(self.verify(gallery, user_ids, probes, probe_owners, options['tolerance']))
+            result.update(self.time_matches(gallery, probes, options['latency_probes'], options['tolerance']))
+            results.append(result)
+            self.stdout.write(
+                f"{name:<16} {result['bytes_per_user']:>9.0f} B/user  p50={result['p50_ms']:>7.3f} ms  "
+                f"p99={result['p99_ms']:>7.3f} ms  TAR={result['true_accept_rate']:.4f}  "
+                f"FAR={result['false_accept_rate']:.4f}  misid={result['misidentification_rate']:.4f}"
+            )
+
+        report = {
+            'benchmark': 'face_gallery',
+            'environment': environment_info(),
+            'options': {k: options[k] for k in ('users', 'frames_per_user', 'poses', 'pose_spread', 'noise',
+                                                'probes_per_user', 'impostors', 'from_storage', 'k',
+                                                'tolerance', 'latency_probes', 'seed')},
+            'results': results,
+        }
+        output = options['output'] or os.path.join(BENCH_DIR, f"gallery_{int(time.time())}.json")
+        write_report(report, output)
+        self.stdout.write(f"Report written to {output}")
+
+    def synthesize(self, options, rng):
+        """
+        Model each user as an identity vector plus a few head-pose offsets;
+        every frame is one pose plus noise. Probes are fresh frames of the
+        same poses, impostors are fresh identities.
+        """
+        def frames(identity, poses, count):
+            chosen = poses[rng.integers(len(poses), size=count)]
+            return identity + chosen + rng.normal(0, options['noise'], (count, ENCODING_DIM))
+
+        def person():
+            identity = rng.normal(0, IDENTITY_SCALE, ENCODING_DIM)
+            poses = rng.normal(0, options['pose_spread'], (max(1, options['poses']), ENCODING_DIM))
+            return identity, poses
+
+        enrollment, probes, owners = {}, [], []
+        for index in range(options['users']):
+            identity, poses = person()
+            enrollment[f'user-{index}'] = frames(identity, poses, options['frames_per_user'])
+            probes.append(frames(identity, poses, options['probes_per_user']))
+            owners += [index] * options['probes_per_user']
+        for _ in range(options['impostors']):
+            identity, poses = person()
+            probes.append(frames(identity, poses, 1))
+            owners.append(-1)
+        return enrollment, np.vstack(probes), np.array(owners)
+
+    def load_stored(self, rng):
+        """Split each registered user's stored encodings into enrollment and probe halves."""
+        init_db()
+        enrollment, probes, owners = {}, [], []
+        for user in iter_users({"registration_status": "completed_successfully"}, fields=['id']):
+            encodings = get_embeddings(user['id'])
+            if encodings is None or len(encodings) < 2:
+                continue
+            order = rng.permutation(len(encodings))
+            half = len(encodings) // 2
+            index = len(enrollment)
+            enrollment[user['id']] = np.asarray(encodings[order[:half]], dtype=np.float64)
+            probes.append(encodings[order[half:]])
+            owners += [index] * (len(encodings) - half)
+        if not probes:
+            return {}, np.empty((0, ENCODING_DIM)), np.empty(0, dtype=int)
+        return enrollment, np.vstack(probes), np.array(owners)
+
+    def verify(self, gallery, user_ids, probes, probe_owners, tolerance):
+        """Accept/reject rates for every probe, matched in batches."""
+        accepted_owner = np.full(len(probes), -2)
+        index_of = {user_id: i for i, user_id in enumerate(user_ids)}
+        for start in range(0, len(probes), 256):
+            distances, owners, gallery_ids = gallery.distances(probes[start:start + 256])
+            nearest = distances.argmin(axis=1)
+            within = distances[np.arange(len(nearest)), nearest] <= tolerance
+            for row in np.flatnonzero(within):
+                accepted_owner[start + row] = index_of[gallery_ids[owners[nearest[row]]]]
+
+        genuine = probe_owners >= 0
+        impostor = ~genuine
+        correct = genuine & (accepted_owner == probe_owners)
+        wrong = genuine & (accepted_owner >= 0) & (accepted_owner != probe_owners)
+        return {
+            'true_accept_rate': round(float(correct.sum() / max(1, genuine.sum())), 4),
+            'misidentification_rate': round(float(wrong.sum() / max(1, genuine.sum())), 4),
+            'false_accept_rate': round(float((impostor & (accepted_owner >= 0)).sum() / max(1, impostor.sum())), 4),
+        }
+
+    def time_matches(self, gallery, probes, count, tolerance):
+        """Latency of single-probe matches, as match_face makes them."""
+        gallery.match(probes[0], tolerance)
+        latencies = []
+        # Spread over genuine and impostor probes
+        for i in np.linspace(0, len(probes) - 1, min(count, len(probes))).astype(int):
+            started = time.perf_counter()
+            gallery.match(probes[i], tolerance)
+            latencies.append(time.perf_counter() - started)
+        return {k: v for k, v in latency_summary(latencies).items() if k != 'count'}
@@ -0,0 +1,89 @@
+import os
+import time
+import random
+import string
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from registration.utils.bench import BENCH_DIR, parse_int_list, latency_summary, environment_info, write_report
+from registration.utils.id_index import IdIndex
+
+EMAIL_DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'university.edu')
+FIRST_NAMES = ('james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda', 'david',
+               'elizabeth', 'william', 'susan', 'richard', 'jessica', 'joseph', 'sarah', 'priya', 'rahul',
+               'amit', 'neha', 'wei', 'li', 'mohammed', 'fatima', 'carlos', 'maria')
+LAST_NAMES = ('smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis', 'rodriguez',
+              'martinez', 'sharma', 'patel', 'kumar', 'singh', 'wang', 'zhang', 'khan', 'ali', 'lopez',
+              'gonzalez', 'wilson', 'anderson', 'thomas', 'taylor', 'moore', 'jackson')
+
+
+class Command(BaseCommand):
+    help = "Time IdIndex.lookup for OCR'd identifiers with one misread character, at several user counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default='10000,100000',
+                            help="Comma-separated user counts to index")
+        parser.add_argument('--queries', type=int, default=2000,
+                            help="Lookups timed per user count")
+        parser.add_argument('--field', default='id_number', choices=['id_number', 'email', 'phone'],
+                            help="User field the misread queries are taken from")
+        parser.add_argument('--output', default=None,
+                            help="JSON report path (default: logs/benchmarks/id_index_<time>.json)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        results = []
+        for count in parse_int_list(options['users']):
+            rng = random.Random(options['seed'])
+            users = [self.synthesize(rng, i) for i in range(count)]
+            index = IdIndex()
+            started = time.perf_counter()
+            index.build(users)
+            build_seconds = time.perf_counter() - started
+
+            queries = [rng.choice(users) for _ in range(options['queries'])]
+            latencies, found = [], 0
+            for user in queries:
+                query = self.misread(rng, user[options['field']])
+                started = time.perf_counter()
+                candidates = index.lookup(query)
+                latencies.append(time.perf_counter() - started)
+                found += bool(candidates) and candidates[0]['user_id'] == user['id']
+
+            result = {'users': count, 'build_seconds': round(build_seconds, 2), **index.stats(),
+                      'top1_accuracy': round(found / len(queries), 4)}
+            result.update({k: v for k, v in latency_summary(latencies).items() if k != 'count'})
+            results.append(result)
+            self.stdout.write(
+                f"{count:>8} users {result['entries']:>8} entries  p50={result['p50_ms']:.2f} ms  "
+                f"p99={result['p99_ms']:.2f} ms  top-1={result['top1_accuracy']:.2%}"
+            )
+
+        report = {
+            'benchmark': 'id_index',
+            'environment': environment_info(),
+            'options': {k: options[k] for k in ('users', 'queries', 'field', 'seed')},
+            'results': results,
+        }
+        output = options['output'] or os.path.join(BENCH_DIR, f"id_index_{int(time.time())}.json")
+        write_report(report, output)
+        self.stdout.write(f"Report written to {output}")
+
+    @staticmethod
+    def synthesize(rng, i):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return {
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'email': f"{first}.{last}{i}@{rng.choice(EMAIL_DOMAINS)}",
+            'phone': '+1' + ''.join(rng.choices(string.digits, k=10)),
+            'id_number': ''.join(rng.choices(string.ascii_uppercase, k=2)) + ''.join(rng.choices(string.digits, k=7)),
+        }
+
+    @staticmethod
+    def misread(rng, value):
+        """Replace one character, as a single OCR error would."""
+        position = rng.randrange(len(value))
+        alphabet = string.digits if value[position].isdigit() else string.ascii_letters
+        replacement = rng.choice([c for c in alphabet if c.lower() != value[position].lower()])
+        return value[:position] + replacement + value[position + 1:]
@@ -0,0 +1,168 @@
+import os
+import glob
+import time
+import base64
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.utils.bench import (BENCH_DIR, parse_int_list, latency_summary, environment_info,
+                                      scratch_storage, write_report, compare_to_baseline)
+from registration.utils.metrics import metrics
+
+DEFAULT_IMAGES = os.path.join('static', 'models', 'dataset_*', 'train', 'images')
+# face_recognition encodings are 128-d with components of roughly this spread
+ENCODING_DIM = 128
+ENCODING_SCALE = 0.09
+
+
+class Command(BaseCommand):
+    help = "Replay JPEG frames through ExamMonitor.monitor_single_frame and report throughput and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', default=DEFAULT_IMAGES,
+                            help="Directory (or glob of directories) of JPEG frames to replay")
+        parser.add_argument('--frames', type=int, default=200,
+                            help="Frames replayed per configuration (the corpus is cycled)")
+        parser.add_argument('--concurrency', default='1,2,4,8',
+                            help="Comma-separated numbers of concurrent callers")
+        parser.add_argument('--gallery-sizes', default='10,100,1000',
+                            help="Comma-separated numbers of synthetic registered users")
+        parser.add_argument('--warmup', type=int, default=5,
+                            help="Frames run before measuring each gallery size")
+        parser.add_argument('--with-session', action='store_true',
+                            help="Pass a user/session id so frame buffering and alerts are exercised")
+        parser.add_argument('--output', default=None,
+                            help="JSON report path (default: logs/benchmarks/monitor_<time>.json)")
+        parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'monitor_baseline.json'),
+                            help="Baseline report to compare against, if it exists")
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Also write this run's report as the baseline")
+        parser.add_argument('--tolerance', type=float, default=0.10,
+                            help="Relative change in throughput or p99 counted as a regression")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        frames = self.load_frames(options['images'])
+        if not frames:
+            raise CommandError(f"No JPEG frames found in {options['images']}")
+        concurrency_levels = parse_int_list(options['concurrency'])
+        gallery_sizes = parse_int_list(options['gallery_sizes'])
+        rng = np.random.default_rng(options['seed'])
+        self.stdout.write(f"Replaying {len(frames)} distinct frames, {options['frames']} per configuration")
+
+        results = []
+        with scratch_storage() as backend:
+            # Imported here so the model and gallery load against the scratch store
+            from registration.utils.monitor_engine import ExamMonitor
+            monitor = ExamMonitor()
+            seeded = 0
+            for gallery_size in sorted(gallery_sizes):
+                seeded = self.seed_gallery(backend, seeded, gallery_size, rng)
+                started = time.perf_counter()
+                monitor.gallery.clear()
+                monitor.user_info_map.clear()
+                monitor.load_registered_users()
+                load_seconds = time.perf_counter() - started
+
+                for i in range(options['warmup']):
+                    monitor.monitor_single_frame(frames[i % len(frames)])
+
+                for concurrency in concurrency_levels:
+                    result = self.replay(monitor, frames, options['frames'], concurrency,
+                                         options['with_session'])
+                    result.update(gallery_size=len(monitor.gallery),
+                                  gallery_load_ms=round(1000 * load_seconds, 1))
+                    results.append(result)
+                    self.stdout.write(
+                        f"gallery={result['gallery_size']:>6} concurrency={concurrency:>3} "
+                        f"{result['throughput_fps']:>8.2f} fps  p50={result['p50_ms']:>8.1f} ms  "
+                        f"p99={result['p99_ms']:>8.1f} ms  errors={result['errors']}"
+                    )
+
+        report = {
+            'benchmark': 'monitor_single_frame',
+            'environment': environment_info(),
+            'options': {k: options[k] for k in ('images', 'frames', 'concurrency', 'gallery_sizes',
+                                                'warmup', 'with_session', 'seed')},
+            'results': results,
+            'stages': {
+                stage: summary for (pipeline, stage), summary in metrics.stage_summary().items()
+                if pipeline == 'monitoring'
+            },
+        }
+        comparisons = compare_to_baseline(
+            results, options['baseline'], ('gallery_size', 'concurrency'),
+            {'throughput_fps': True, 'p99_ms': False}, options['tolerance'],
+        )
+        report['baseline_comparison'] = comparisons
+
+        output = options['output'] or os.path.join(BENCH_DIR, f"monitor_{int(time.time())}.json")
+        write_report(report, output)
+        self.stdout.write(f"Report written to {output}")
+        if options['save_baseline']:
+            write_report(report, options['baseline'])
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+
+        if comparisons is None:
+            return
+        regressions = [c for c in comparisons if c['regression']]
+        for c in regressions:
+            self.stdout.write(self.style.WARNING(
+                f"Regression: gallery={c['gallery_size']} concurrency={c['concurrency']} {c['metric']} "
+                f"{c['baseline']} -> {c['current']} ({c['change_pct']:+.1f}%)"
+            ))
+        if regressions:
+            raise CommandError(f"{len(regressions)} metrics regressed beyond {options['tolerance']:.0%}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def load_frames(self, pattern):
+        """Read the corpus once, as the data URLs the browser sends."""
+        paths = []
+        for directory in sorted(glob.glob(pattern)):
+            for ext in ('*.jpg', '*.jpeg', '*.JPG', '*.JPEG'):
+                paths.extend(glob.glob(os.path.join(directory, ext)))
+        frames = []
+        for path in sorted(paths):
+            with open(path, 'rb') as f:
+                frames.append('data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii'))
+        return frames
+
+    def seed_gallery(self, backend, seeded, gallery_size, rng):
+        """Register synthetic users up to gallery_size, each with a stored random face encoding."""
+        for i in range(seeded, gallery_size):
+            user_id = str(uuid.UUID(bytes=rng.bytes(16), version=4))
+            backend.insert_user({
+                'id': user_id,
+                'name': f'Bench User {i}',
+                'email': f'bench{i}@example.com',
+                'phone': f'9{i:09d}',
+                'registration_status': 'completed_successfully',
+            })
+            backend.save_embeddings(user_id, 'face', rng.normal(0, ENCODING_SCALE, (1, ENCODING_DIM)))
+        return max(seeded, gallery_size)
+
+    def replay(self, monitor, frames, count, concurrency, with_session):
+        session = (str(uuid.uuid4()), 'bench') if with_session else (None, None)
+
+        def run(i):
+            started = time.perf_counter()
+            result = monitor.monitor_single_frame(frames[i % len(frames)], *session)
+            return time.perf_counter() - started, result.get('status') == 'success'
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(run, range(count)))
+        wall = time.perf_counter() - started
+
+        summary = latency_summary([latency for latency, _ in outcomes])
+        return {
+            'concurrency': concurrency,
+            'frames': count,
+            'errors': sum(1 for _, ok in outcomes if not ok),
+            'wall_seconds': round(wall, 3),
+            'throughput_fps': round(count / wall, 2) if wall else 0.0,
+            **{k: v for k, v in summary.items() if k != 'count'},
+        }
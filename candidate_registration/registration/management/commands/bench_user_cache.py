@@ -0,0 +1,103 @@
+import os
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from registration.utils import db
+from registration.utils.bench import BENCH_DIR, latency_summary, environment_info, scratch_storage, write_report
+
+# Registration statuses a candidate moves through while their video is processed
+ENROLLMENT_STATUSES = ['video_captured', 'frame_extraction_complete', 'model_training_started',
+                       'completed_successfully']
+
+
+class Command(BaseCommand):
+    help = "Replay enrollment status polling against get_user and count storage reads with and without user_cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50,
+                            help="Candidates enrolling")
+        parser.add_argument('--polls', type=int, default=21,
+                            help="Status polls per candidate")
+        parser.add_argument('--updates', type=int, default=6,
+                            help="Status updates per candidate, spread between the polls")
+        parser.add_argument('--output', default=None,
+                            help="JSON report path (default: logs/benchmarks/user_cache_<time>.json)")
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_storage() as backend:
+            user_ids = []
+            for i in range(options['users']):
+                user_id = str(uuid.uuid4())
+                backend.insert_user({'id': user_id, 'name': f'Bench User {i}', 'registration_status': 'initiated'})
+                user_ids.append(user_id)
+
+            # Every get_user that is not served from the cache reads the backend
+            reads = [0]
+            find_user = backend.find_user
+
+            def counting_find_user(*args, **kwargs):
+                reads[0] += 1
+                return find_user(*args, **kwargs)
+
+            backend.find_user = counting_find_user
+            ttl = db.user_cache.ttl
+            try:
+                # A negative TTL makes every lookup a miss, as without the cache
+                for mode, mode_ttl in (('uncached', -1), ('cached', ttl)):
+                    db.user_cache.clear()
+                    db.user_cache.ttl = mode_ttl
+                    reads[0] = 0
+                    result = self.replay(user_ids, options['polls'], options['updates'])
+                    result.update(mode=mode, storage_reads=reads[0])
+                    results.append(result)
+            finally:
+                db.user_cache.ttl = ttl
+                db.user_cache.clear()
+                backend.find_user = find_user
+
+        uncached, cached = results
+        saved = 1 - cached['storage_reads'] / uncached['storage_reads'] if uncached['storage_reads'] else 0.0
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<9} lookups={result['lookups']:>6} storage_reads={result['storage_reads']:>6} "
+                f"p50={result['p50_ms']:.3f} ms  p99={result['p99_ms']:.3f} ms"
+            )
+        self.stdout.write(f"Storage reads reduced by {saved:.0%} (cache hit ratio {cached['hit_ratio']:.0%})")
+
+        report = {
+            'benchmark': 'user_cache',
+            'environment': environment_info(),
+            'options': {k: options[k] for k in ('users', 'polls', 'updates')},
+            'results': results,
+            'read_reduction': round(saved, 4),
+        }
+        output = options['output'] or os.path.join(BENCH_DIR, f"user_cache_{int(time.time())}.json")
+        write_report(report, output)
+        self.stdout.write(f"Report written to {output}")
+
+    def replay(self, user_ids, polls, updates):
+        """Poll each candidate's status, updating it at evenly spaced polls."""
+        update_at = {round((i + 1) * polls / (updates + 1)) for i in range(updates)}
+        hits, misses = db.user_cache.hits, db.user_cache.misses
+        latencies = []
+        for user_id in user_ids:
+            status = 0
+            for poll in range(polls):
+                if poll in update_at:
+                    db.update_user(user_id, {
+                        'registration_status': ENROLLMENT_STATUSES[min(status, len(ENROLLMENT_STATUSES) - 1)]
+                    })
+                    status += 1
+                started = time.perf_counter()
+                db.get_user(user_id)
+                latencies.append(time.perf_counter() - started)
+        hits, misses = db.user_cache.hits - hits, db.user_cache.misses - misses
+        summary = latency_summary(latencies)
+        return {
+            'lookups': summary['count'],
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            **{k: v for k, v in summary.items() if k != 'count'},
+        }
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.utils.db import init_db
+from registration.utils.utils import import_existing_models_to_mongodb
+
+
+class Command(BaseCommand):
+    help = "Import user model files from static/models into the storage backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-dir', default=os.path.join('static', 'models'),
+                            help="Directory containing user_<uuid>.pt files")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Number of concurrent upload threads")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Number of user documents linked per bulk write")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be imported without writing anything")
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip model files finished by a previous run")
+        parser.add_argument('--state-file', default=os.path.join('logs', 'import_models.state'),
+                            help="File that records finished model files for --resume")
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['model_dir']):
+            raise CommandError(f"Model directory not found: {options['model_dir']}")
+        if not init_db():
+            raise CommandError("Storage not available. Cannot import models.")
+
+        state_dir = os.path.dirname(options['state_file'])
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+        imported, failed, skipped = import_existing_models_to_mongodb(
+            model_dir=options['model_dir'],
+            workers=options['workers'],
+            dry_run=options['dry_run'],
+            state_file=options['state_file'],
+            resume=options['resume'],
+            link_batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported}, failed {failed}, skipped {skipped}"
+        ))
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import http.client
+from urllib.parse import urlsplit
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+
+from registration.utils.bench import (BENCH_DIR, latency_summary, environment_info, scratch_storage,
+                                      write_report, count_event_docs)
+
+# Events per minute of one exam session. Mouse moves are throttled to one
+# every 500ms by monitor.js, and only while the candidate moves the mouse.
+DEFAULT_EVENT_RATES = {
+    'mouse_movement': 60.0,
+    'tab_switch': 1.0,
+    'copy_paste': 0.5,
+    'screen_capture': 0.05,
+}
+ENDPOINTS = {
+    'mouse_movement': '/log_mouse_movement',
+    'tab_switch': '/log_tab_switch',
+    'copy_paste': '/log_copy_paste',
+    'screen_capture': '/detect_screen_capture',
+}
+SCREEN_WIDTH, SCREEN_HEIGHT = 1366, 768
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Simulate concurrent exam sessions emitting telemetry events and report latency and write volume"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50,
+                            help="Number of concurrent exam sessions")
+        parser.add_argument('--duration', type=float, default=60,
+                            help="Seconds each session keeps sending events")
+        parser.add_argument('--ramp-up', type=float, default=5,
+                            help="Seconds over which sessions are started")
+        for event, rate in DEFAULT_EVENT_RATES.items():
+            parser.add_argument(f"--{event.replace('_', '-')}-rate", type=float, default=rate,
+                                help=f"{event} events per session-minute")
+        parser.add_argument('--url', default=None,
+                            help="Target an already running server instead of starting a local one "
+                                 "(database writes are then not counted)")
+        parser.add_argument('--timeout', type=float, default=10,
+                            help="Per-request timeout in seconds")
+        parser.add_argument('--output', default=None,
+                            help="JSON report path (default: logs/benchmarks/telemetry_<time>.json)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rates = {event: options[f'{event}_rate'] for event in DEFAULT_EVENT_RATES}
+        if sum(rates.values()) <= 0:
+            raise CommandError("At least one event rate must be positive")
+
+        if options['url']:
+            result = self.run_load(options['url'], rates, options)
+        else:
+            with scratch_storage() as backend:
+                server, url = self.start_server()
+                try:
+                    result = self.run_load(url, rates, options)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+                docs = count_event_docs(backend)
+            session_minutes = options['sessions'] * options['duration'] / 60
+            result['db_docs_written'] = docs
+            result['db_docs_per_session_minute'] = {
+                collection: round(count / session_minutes, 2) for collection, count in docs.items()
+            }
+            result['db_docs_per_session_minute']['total'] = round(sum(docs.values()) / session_minutes, 2)
+
+        report = {
+            'benchmark': 'telemetry_load',
+            'environment': environment_info(),
+            'options': {k: options[k] for k in ('sessions', 'duration', 'ramp_up', 'url', 'seed')},
+            'event_rates_per_minute': rates,
+            **result,
+        }
+        self.print_report(report)
+        output = options['output'] or os.path.join(BENCH_DIR, f"telemetry_{int(time.time())}.json")
+        write_report(report, output)
+        self.stdout.write(f"Report written to {output}")
+
+    def start_server(self):
+        """Serve the project on an ephemeral local port, like the test runner's live server."""
+        if '127.0.0.1' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['127.0.0.1']
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+        server.daemon_threads = True
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, name='telemetry-server', daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    def run_load(self, url, rates, options):
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+        target = urlsplit(url)
+        deadline_offset = options['duration']
+        total_rate = sum(rates.values()) / 60
+        events, weights = zip(*rates.items())
+
+        def session_worker(index):
+            rng = random.Random(options['seed'] * 100003 + index)
+            time.sleep(options['ramp_up'] * index / max(1, options['sessions']))
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=options['timeout'])
+            user_id, session_id = str(uuid.UUID(int=rng.getrandbits(128))), f"load_{index}"
+            state = {'visible': True, 'x': SCREEN_WIDTH // 2, 'y': SCREEN_HEIGHT // 2}
+            deadline = time.monotonic() + deadline_offset
+            try:
+                while True:
+                    # Poisson arrivals across all event types of this session
+                    next_at = time.monotonic() + rng.expovariate(total_rate)
+                    if next_at >= deadline:
+                        break
+                    time.sleep(max(0.0, next_at - time.monotonic()))
+                    event = rng.choices(events, weights)[0]
+                    payload = self.make_payload(event, user_id, session_id, state, rng)
+                    self.send(conn, ENDPOINTS[event], payload, event, latencies, errors, lock)
+                self.send(conn, '/end_session', {'user_id': user_id, 'session_id': session_id},
+                          'end_session', latencies, errors, lock)
+            finally:
+                conn.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=session_worker, args=(i,), daemon=True)
+                   for i in range(options['sessions'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        requests = sum(len(values) for values in latencies.values())
+        endpoints = {}
+        for event in sorted(set(latencies) | set(errors)):
+            summary = latency_summary(latencies[event])
+            summary['errors'] = errors[event]
+            summary['error_rate'] = round(errors[event] / summary['count'], 4) if summary['count'] else 0.0
+            endpoints[event] = summary
+        all_latencies = [value for values in latencies.values() for value in values]
+        return {
+            'wall_seconds': round(wall, 2),
+            'requests': requests,
+            'requests_per_second': round(requests / wall, 2) if wall else 0.0,
+            'error_rate': round(sum(errors.values()) / requests, 4) if requests else 0.0,
+            'latency': latency_summary(all_latencies),
+            'endpoints': endpoints,
+        }
+
+    @staticmethod
+    def make_payload(event, user_id, session_id, state, rng):
+        """Build the request body monitor.js sends for an event."""
+        payload = {'user_id': user_id, 'session_id': session_id}
+        now = int(time.time() * 1000)
+        if event == 'mouse_movement':
+            # A walk of at least 50px (monitor.js ignores smaller moves)
+            state['x'] = min(SCREEN_WIDTH, max(0, state['x'] + rng.choice((-1, 1)) * rng.randint(50, 300)))
+            state['y'] = min(SCREEN_HEIGHT, max(0, state['y'] + rng.choice((-1, 1)) * rng.randint(50, 200)))
+            payload['movement_data'] = {'x': state['x'], 'y': state['y'], 'screenWidth': SCREEN_WIDTH,
+                                        'screenHeight': SCREEN_HEIGHT, 'timestamp': now}
+        elif event == 'tab_switch':
+            state['visible'] = not state['visible']
+            payload['event_data'] = {'visible': state['visible'], 'timestamp': now}
+        elif event == 'copy_paste':
+            action = rng.choice(('copy', 'paste', 'cut', 'contextmenu'))
+            event_data = {'type': action, 'timestamp': now}
+            if action == 'paste':
+                event_data['content'] = 'x' * rng.choice((12, 80, 400))
+            payload['event_data'] = event_data
+        else:
+            payload['event_data'] = {'type': rng.choice(('printscreen', 'screen_recording')), 'timestamp': now}
+        return payload
+
+    @staticmethod
+    def send(conn, path, payload, name, latencies, errors, lock):
+        body = json.dumps(payload)
+        started = time.perf_counter()
+        ok = False
+        try:
+            conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = response.read()
+            ok = response.status == 200 and json.loads(data).get('status') == 'success'
+        except Exception:
+            # Drop the connection; http.client reopens it on the next request
+            conn.close()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[name].append(elapsed)
+            if not ok:
+                errors[name] += 1
+
+    def print_report(self, report):
+        latency = report['latency']
+        self.stdout.write(
+            f"{report['options']['sessions']} sessions for {report['options']['duration']:.0f}s: "
+            f"{report['requests']} requests, {report['requests_per_second']:.1f} req/s, "
+            f"error rate {report['error_rate']:.2%}, p50 {latency['p50_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms"
+        )
+        for name, summary in report['endpoints'].items():
+            self.stdout.write(
+                f"  {name:<15} {summary['count']:>7} req  p50 {summary['p50_ms']:>7.1f} ms  "
+                f"p99 {summary['p99_ms']:>7.1f} ms  errors {summary['errors']}"
+            )
+        if 'db_docs_per_session_minute' in report:
+            self.stdout.write("Documents written per session-minute:")
+            for collection, rate in sorted(report['db_docs_per_session_minute'].items()):
+                self.stdout.write(f"  {collection:<20} {rate:>8.2f}")
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.utils.profiling import profile_setting
+
+
+class Command(BaseCommand):
+    help = "Aggregate request profiles from logs/profiles into the top hot functions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help="Profile directory (default: PROFILE_DIR)")
+        parser.add_argument('--top', type=int, default=25,
+                            help="Number of functions to list")
+        parser.add_argument('--path', default=None,
+                            help="Only include profiles of requests whose path starts with this")
+        parser.add_argument('--reason', choices=['sampled', 'slow'], default=None,
+                            help="Only include sampled or only slow-request profiles")
+        parser.add_argument('--since', type=float, default=None,
+                            help="Only include profiles started in the last N hours")
+
+    def handle(self, *args, **options):
+        profile_dir = options['dir'] or str(profile_setting('PROFILE_DIR'))
+        if not os.path.isdir(profile_dir):
+            raise CommandError(f"Profile directory not found: {profile_dir}")
+
+        since = None
+        if options['since'] is not None:
+            since = time.time() - options['since'] * 3600
+
+        # Self time counts the function at the top of each sampled stack;
+        # inclusive time counts every function on it, once per stack
+        self_samples = Counter()
+        inclusive_samples = Counter()
+        total_samples = 0
+        profiles = 0
+        durations = []
+
+        for name in sorted(os.listdir(profile_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(profile_dir, name)) as f:
+                    profile = json.load(f)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f"Skipping {name}: {str(e)}")
+                continue
+
+            metadata = profile.get('metadata', {})
+            if options['path'] and not metadata.get('path', '').startswith(options['path']):
+                continue
+            if options['reason'] and metadata.get('reason') != options['reason']:
+                continue
+            if since is not None and metadata.get('started_at', 0) < since:
+                continue
+
+            profiles += 1
+            durations.append(metadata.get('duration_ms', 0))
+            for entry in profile.get('stacks', []):
+                stack, count = entry['stack'], entry['count']
+                if not stack:
+                    continue
+                total_samples += count
+                self_samples[stack[-1]] += count
+                for function in set(stack):
+                    inclusive_samples[function] += count
+
+        if not profiles:
+            self.stdout.write("No matching profiles found")
+            return
+
+        durations.sort()
+        self.stdout.write(
+            f"{profiles} profiles, {total_samples} samples, "
+            f"median request {durations[len(durations) // 2]:.0f} ms, max {durations[-1]:.0f} ms"
+        )
+
+        top = options['top']
+        for title, counter in (("Self", self_samples), ("Inclusive", inclusive_samples)):
+            self.stdout.write(f"\nTop {top} functions by {title.lower()} samples:")
+            self.stdout.write(f"{'samples':>9} {'%':>6}  function")
+            for function, count in counter.most_common(top):
+                self.stdout.write(f"{count:>9} {100.0 * count / total_samples:>5.1f}%  {function}")
@@ -0,0 +1,53 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from registration.utils.profiling import (start_profile, finish_profile,
+                                          attach_current_thread, use_profile)
+
+
+class SampledProfilingMiddleware:
+    """
+    Profile a fraction of requests, and any slow request, on the hot endpoints.
+
+    Disabled unless PROFILE_ENABLED is set (see registration/utils/profiling.py
+    for the other options). Profiles are written to logs/profiles/ and can be
+    aggregated with `manage.py profile_report`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        session = start_profile(request)
+        if session is None:
+            return self.get_response(request)
+        response = None
+        try:
+            with attach_current_thread(session):
+                response = self.get_response(request)
+            return response
+        finally:
+            finish_profile(session, getattr(response, 'status_code', None))
+
+    async def __acall__(self, request):
+        session = start_profile(request)
+        if session is None:
+            return await self.get_response(request)
+        response = None
+        try:
+            # The event loop thread serves other requests too, so only the
+            # executor threads and sync view threads doing this request's work
+            # are sampled
+            with use_profile(session):
+                response = await self.get_response(request)
+            return response
+        finally:
+            finish_profile(session, getattr(response, 'status_code', None))
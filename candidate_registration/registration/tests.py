@@ -1,3 +1,721 @@
-from django.test import TestCase
+import io
+import os
+import re
+import time
+import uuid
+import base64
+import shutil
+import asyncio
+import hashlib
+import datetime
+import tempfile
 
-# Create your tests here.
+import numpy as np
+import pymongo
+from django.test import SimpleTestCase, override_settings
+
+from .utils.admission import FrameAdmission, RUN, SHED, SUPERSEDED
+from .utils.alert_limiter import AlertRateLimiter
+from .utils.artifact_cache import ArtifactCache, STREAM_CHUNK_SIZE
+from .utils import db
+from .utils.id_index import IdIndex
+from .utils.prototypes import PrototypeGallery, extract_prototypes, load_prototypes, prototype_kind
+from .utils.db import MongoBackend, SQLiteBackend, UserCache, model_link_fields
+from .utils.bench import scratch_storage
+from .utils.utils import import_existing_models_to_mongodb
+from .utils.recording_analysis import _sampling_steps, _segments, build_timeline
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'alert_limiter': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'alert-limiter-tests'},
+    'users': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'user-cache-tests'},
+}
+
+
+class AlertRateLimiterTests(SimpleTestCase):
+    def test_first_alert_is_emitted(self):
+        limiter = AlertRateLimiter(cooldown=30, shared_cache='')
+        decision = limiter.record('s1', 'tab_switch', timestamp=100)
+        self.assertEqual(decision, {'occurrence_count': 1, 'first_seen': 100, 'last_seen': 100})
+
+    def test_alerts_within_cooldown_are_suppressed(self):
+        limiter = AlertRateLimiter(cooldown=30, shared_cache='')
+        limiter.record('s1', 'tab_switch', timestamp=100)
+        self.assertIsNone(limiter.record('s1', 'tab_switch', timestamp=110))
+        self.assertIsNone(limiter.record('s1', 'tab_switch', timestamp=129))
+        self.assertEqual(limiter.stats()['suppressed'], 2)
+
+    def test_cooldown_is_per_session_and_type(self):
+        limiter = AlertRateLimiter(cooldown=30, shared_cache='')
+        limiter.record('s1', 'tab_switch', timestamp=100)
+        self.assertIsNotNone(limiter.record('s1', 'copy_paste', timestamp=101))
+        self.assertIsNotNone(limiter.record('s2', 'tab_switch', timestamp=102))
+
+    def test_burst_is_folded_into_next_alert(self):
+        limiter = AlertRateLimiter(cooldown=30, shared_cache='')
+        limiter.record('s1', 'tab_switch', timestamp=100)
+        for timestamp in (105, 110, 115):
+            limiter.record('s1', 'tab_switch', timestamp=timestamp)
+        decision = limiter.record('s1', 'tab_switch', timestamp=131)
+        self.assertEqual(decision, {'occurrence_count': 4, 'first_seen': 105, 'last_seen': 131})
+        # The new window starts from scratch
+        self.assertIsNone(limiter.record('s1', 'tab_switch', timestamp=140))
+        self.assertEqual(limiter.record('s1', 'tab_switch', timestamp=162)['occurrence_count'], 2)
+
+    def test_ttl_eviction_reports_pending_counts(self):
+        limiter = AlertRateLimiter(cooldown=30, ttl=60, shared_cache='')
+        limiter.record('s1', 'tab_switch', timestamp=100)
+        limiter.record('s1', 'tab_switch', timestamp=110)
+        limiter.record('s2', 'copy_paste', timestamp=200)
+        self.assertEqual(limiter.drain_expired(), [{
+            'session_id': 's1', 'alert_type': 'tab_switch',
+            'occurrence_count': 1, 'first_seen': 110, 'last_seen': 110,
+        }])
+        self.assertEqual(limiter.drain_expired(), [])
+        self.assertEqual(limiter.stats()['tracked_keys'], 1)
+
+    def test_size_cap_evicts_least_recently_used(self):
+        limiter = AlertRateLimiter(cooldown=30, max_keys=2, shared_cache='')
+        limiter.record('s1', 'tab_switch', timestamp=100)
+        limiter.record('s1', 'tab_switch', timestamp=101)
+        limiter.record('s2', 'tab_switch', timestamp=102)
+        limiter.record('s3', 'tab_switch', timestamp=103)
+        summaries = limiter.drain_expired()
+        self.assertEqual([(s['session_id'], s['occurrence_count']) for s in summaries], [('s1', 1)])
+        self.assertEqual(limiter.stats()['tracked_keys'], 2)
+
+    def test_pop_session_flushes_pending_counts(self):
+        limiter = AlertRateLimiter(cooldown=30, shared_cache='')
+        limiter.record('s1', 'tab_switch', timestamp=100)
+        limiter.record('s1', 'tab_switch', timestamp=105)
+        limiter.record('s1', 'tab_switch', timestamp=108)
+        limiter.record('s1', 'copy_paste', timestamp=109)
+        limiter.record('s2', 'tab_switch', timestamp=110)
+        limiter.record('s2', 'tab_switch', timestamp=111)
+        self.assertEqual(limiter.pop_session('s1'), [{
+            'session_id': 's1', 'alert_type': 'tab_switch',
+            'occurrence_count': 2, 'first_seen': 105, 'last_seen': 108,
+        }])
+        self.assertEqual(limiter.pop_session('s1'), [])
+        self.assertEqual(limiter.pop_session('s2')[0]['occurrence_count'], 1)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class SharedAlertRateLimiterTests(SimpleTestCase):
+    def make_limiter(self, cooldown=30):
+        from django.core.cache import caches
+        caches['alert_limiter'].clear()
+        return AlertRateLimiter(cooldown=cooldown, shared_cache='alert_limiter')
+
+    def test_cooldown_is_shared_between_limiters(self):
+        first, second = self.make_limiter(), AlertRateLimiter(cooldown=30, shared_cache='alert_limiter')
+        self.assertIsNotNone(first.record('s1', 'tab_switch', timestamp=100))
+        self.assertIsNone(second.record('s1', 'tab_switch', timestamp=101))
+        self.assertIsNone(first.record('s1', 'tab_switch', timestamp=102))
+        self.assertIsNotNone(second.record('s1', 'copy_paste', timestamp=103))
+
+    def test_pop_session_flushes_counts_from_any_process(self):
+        first = self.make_limiter()
+        second = AlertRateLimiter(cooldown=30, shared_cache='alert_limiter')
+        first.record('s1', 'tab_switch', timestamp=100)
+        second.record('s1', 'tab_switch', timestamp=101)
+        first.record('s1', 'tab_switch', timestamp=102)
+        second.record('s1', 'copy_paste', timestamp=103)
+        second.record('s1', 'copy_paste', timestamp=104)
+        # The session ends in a process that saw none of the suppressed alerts
+        third = AlertRateLimiter(cooldown=30, shared_cache='alert_limiter')
+        summaries = sorted(third.pop_session('s1'), key=lambda s: s['alert_type'])
+        self.assertEqual(summaries, [
+            {'session_id': 's1', 'alert_type': 'copy_paste', 'occurrence_count': 1,
+             'first_seen': 104, 'last_seen': 104},
+            {'session_id': 's1', 'alert_type': 'tab_switch', 'occurrence_count': 2,
+             'first_seen': 101, 'last_seen': 102},
+        ])
+        self.assertEqual(first.pop_session('s1'), [])
+        self.assertEqual(first.drain_expired(now=1000), [])
+
+    def test_expired_window_is_flushed_once(self):
+        first = self.make_limiter(cooldown=0.2)
+        second = AlertRateLimiter(cooldown=0.2, shared_cache='alert_limiter')
+        now = time.time()
+        first.record('s1', 'tab_switch', timestamp=now)
+        first.record('s1', 'tab_switch', timestamp=now + 0.01)
+        second.record('s1', 'tab_switch', timestamp=now + 0.02)
+        self.assertEqual(first.drain_expired(now=now + 0.05), [])
+        time.sleep(0.3)
+        summaries = first.drain_expired(now=now + 0.3) + second.drain_expired(now=now + 0.3)
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]['occurrence_count'], 2)
+        # Flushing does not hold the gate: the next alert is emitted at once
+        self.assertEqual(first.record('s1', 'tab_switch', timestamp=now + 0.31)['occurrence_count'], 1)
+
+    def test_burst_is_folded_into_next_alert(self):
+        limiter = self.make_limiter(cooldown=0.2)
+        now = time.time()
+        limiter.record('s1', 'tab_switch', timestamp=now)
+        limiter.record('s1', 'tab_switch', timestamp=now + 0.01)
+        limiter.record('s1', 'tab_switch', timestamp=now + 0.02)
+        time.sleep(0.3)
+        decision = limiter.record('s1', 'tab_switch', timestamp=now + 0.3)
+        self.assertEqual(decision['occurrence_count'], 3)
+        self.assertEqual(decision['first_seen'], now + 0.01)
+        self.assertEqual(limiter.drain_expired(now=now + 10), [])
+
+
+class FakeGridOut(io.BytesIO):
+    """GridOut stand-in: iterating yields lines, as in PyMongo 4, and readchunk one chunk."""
+    chunk_size = STREAM_CHUNK_SIZE
+
+    def readchunk(self):
+        return self.read(self.chunk_size)
+
+
+class FakeGridFS:
+    def __init__(self, files):
+        self.files = files
+        self.opened = []
+
+    def get(self, file_id):
+        grid_out = FakeGridOut(self.files[file_id])
+        self.opened.append(grid_out)
+        return grid_out
+
+
+class MongoModelStreamTests(SimpleTestCase):
+    def setUp(self):
+        # A binary payload with no newlines: iterating the GridOut would return it in one piece
+        self.payload = bytes(range(11, 256)) * (2 * STREAM_CHUNK_SIZE // 245 + 7)
+        client = pymongo.MongoClient('mongodb://localhost:1', connect=False)
+        self.backend = MongoBackend(client['test'])
+        self.backend.fs = FakeGridFS({'model-1': self.payload})
+
+    def test_open_model_yields_bounded_chunks(self):
+        chunks = list(self.backend.open_model('model-1'))
+        self.assertEqual(b''.join(chunks), self.payload)
+        self.assertEqual(len(chunks), -(-len(self.payload) // STREAM_CHUNK_SIZE))
+        self.assertTrue(all(len(chunk) <= STREAM_CHUNK_SIZE for chunk in chunks))
+        self.assertTrue(self.backend.fs.opened[0].closed)
+
+    def test_model_is_cached_from_chunks(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ArtifactCache(cache_dir=cache_dir)
+            checksum = hashlib.sha256(self.payload).hexdigest()
+            path = cache.put_stream('model-1', checksum, self.backend.open_model('model-1'))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.payload)
+            self.assertEqual(os.listdir(cache_dir), [os.path.basename(path)])
+
+
+class ImportModelsTests(SimpleTestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        self.state_file = os.path.join(self.model_dir, 'import.state')
+        self.user_id = str(uuid.uuid4())
+        self.model_file = f'user_{self.user_id}.pt'
+        with open(os.path.join(self.model_dir, self.model_file), 'wb') as f:
+            f.write(os.urandom(4096))
+
+    def run_import(self):
+        return import_existing_models_to_mongodb(self.model_dir, workers=1, state_file=self.state_file,
+                                                 resume=True)
+
+    def recorded(self):
+        with open(self.state_file) as f:
+            return f.read().split()
+
+    def test_model_stored_but_never_linked_is_linked_on_resume(self):
+        with scratch_storage() as backend:
+            backend.insert_user({'id': self.user_id, 'name': 'Candidate'})
+            # A previous run uploaded the model and stopped before linking the user
+            model_id = db.save_model(self.user_id, os.path.join(self.model_dir, self.model_file), link_user=False)
+            self.assertEqual(self.run_import(), (0, 0, 1))
+            self.assertEqual(db.get_user(self.user_id)['model_db_id'], str(model_id))
+            self.assertEqual(self.recorded(), [self.model_file])
+
+    def test_linked_model_is_recorded_without_relinking(self):
+        with scratch_storage() as backend:
+            backend.insert_user({'id': self.user_id, 'name': 'Candidate'})
+            self.assertEqual(self.run_import(), (1, 0, 0))
+            model_id = db.get_user(self.user_id)['model_db_id']
+            os.remove(self.state_file)
+            self.assertEqual(self.run_import(), (0, 0, 1))
+            self.assertEqual(db.get_user(self.user_id)['model_db_id'], model_id)
+            self.assertEqual(self.recorded(), [self.model_file])
+            self.assertEqual(self.run_import(), (0, 0, 1))
+
+
+class RecordingAnalysisTests(SimpleTestCase):
+    def test_identity_checks_fall_on_sampled_frames(self):
+        for fps in (15, 24, 25, 29.97, 30, 60):
+            step, identity_step = _sampling_steps(fps, sample_fps=2, identity_interval=5)
+            self.assertEqual(identity_step % step, 0)
+            # Checked about every 5 seconds, give or take one sample
+            self.assertAlmostEqual(identity_step / fps, 5, delta=step / fps)
+
+    def test_identity_cadence_at_25_fps(self):
+        step, identity_step = _sampling_steps(25, sample_fps=2, identity_interval=5)
+        checked = [i for i in range(0, 25 * 60) if i % step == 0 and i % identity_step == 0]
+        self.assertEqual(len(checked), 13)
+
+    def test_identity_interval_shorter_than_sampling(self):
+        self.assertEqual(_sampling_steps(30, sample_fps=2, identity_interval=0.1), (15, 15))
+
+    def test_segments_cover_the_recording(self):
+        # 10 minutes at 30 fps with 4 workers
+        segments = _segments(18000, 30, 4)
+        self.assertEqual(len(segments), 4)
+        self.assertEqual(segments[0][0], 0)
+        self.assertEqual(segments[-1][1], 18000)
+        self.assertTrue(all(end == start for (_, end), (start, _) in zip(segments, segments[1:])))
+
+    def test_short_or_unknown_recordings_are_one_segment(self):
+        self.assertEqual(_segments(30 * 45, 30, 8), [(0, 1350)])
+        self.assertEqual(_segments(0, 30, 8), [(0, None)])
+
+    def test_timeline_merges_close_observations(self):
+        def observation(t, person=1, phone=0, identity=None):
+            return {'t': t, 'person': person, 'cell phone': phone, 'identity': identity}
+
+        observations = [
+            observation(0.0, phone=1), observation(0.5, phone=1), observation(1.0, phone=2),
+            observation(1.5), observation(2.0),
+            observation(3.0, phone=1),
+            observation(3.5, person=0), observation(4.0, identity='mismatch'),
+        ]
+        timeline = build_timeline(observations, sample_interval=0.5)
+        self.assertEqual(timeline, [
+            {'type': 'mobile_phone', 'start': 0.0, 'end': 1.5, 'frames': 3, 'max_count': 2},
+            {'type': 'mobile_phone', 'start': 3.0, 'end': 3.5, 'frames': 1, 'max_count': 1},
+            {'type': 'no_person', 'start': 3.5, 'end': 4.0, 'frames': 1, 'max_count': 0},
+            {'type': 'identity_mismatch', 'start': 4.0, 'end': 4.5, 'frames': 1, 'max_count': 1},
+        ])
+
+
+class UserCacheTests(SimpleTestCase):
+    def make_cache(self, **kwargs):
+        return UserCache(shared_cache='', **kwargs)
+
+    def test_read_through(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get('u1'))
+        cache.set('u1', {'id': 'u1', 'name': 'A'}, cache.version('u1'))
+        user = cache.get('u1')
+        self.assertEqual(user, {'id': 'u1', 'name': 'A'})
+        # Callers get a copy
+        user['name'] = 'B'
+        self.assertEqual(cache.get('u1')['name'], 'A')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_invalidate_drops_entry(self):
+        cache = self.make_cache()
+        cache.set('u1', {'id': 'u1'}, cache.version('u1'))
+        cache.invalidate('u1')
+        self.assertIsNone(cache.get('u1'))
+
+    def test_document_read_before_invalidation_is_not_cached(self):
+        cache = self.make_cache()
+        version = cache.version('u1')
+        cache.invalidate('u1')
+        cache.set('u1', {'id': 'u1', 'status': 'stale'}, version)
+        self.assertIsNone(cache.get('u1'))
+        cache.set('u1', {'id': 'u1', 'status': 'fresh'}, cache.version('u1'))
+        self.assertEqual(cache.get('u1')['status'], 'fresh')
+
+    def test_stale_write_rejected_after_eviction_and_pruning(self):
+        cache = self.make_cache(max_entries=1)
+        version = cache.version('u1')
+        cache.invalidate('u1')
+        # Enough other invalidations to prune the version bookkeeping
+        for i in range(10):
+            cache.set(f'other{i}', {'id': f'other{i}'}, cache.version(f'other{i}'))
+            cache.invalidate(f'other{i}')
+        cache.set('u1', {'id': 'u1'}, version)
+        self.assertIsNone(cache.get('u1'))
+
+    def test_ttl_and_size_limit(self):
+        cache = self.make_cache(max_entries=2, ttl=0.05)
+        for user_id in ('u1', 'u2', 'u3'):
+            cache.set(user_id, {'id': user_id}, cache.version(user_id))
+        self.assertIsNone(cache.get('u1'))
+        self.assertIsNotNone(cache.get('u3'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('u3'))
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class SharedUserCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        caches['users'].clear()
+        self.process_a = UserCache(shared_cache='users')
+        self.process_b = UserCache(shared_cache='users')
+
+    def test_entries_are_shared(self):
+        self.process_a.set('u1', {'id': 'u1'}, self.process_a.version('u1'))
+        self.assertEqual(self.process_b.get('u1'), {'id': 'u1'})
+
+    def test_invalidation_is_shared(self):
+        self.process_a.set('u1', {'id': 'u1'}, self.process_a.version('u1'))
+        self.process_b.invalidate('u1')
+        self.assertIsNone(self.process_a.get('u1'))
+
+    def test_stale_write_from_another_process_is_not_served(self):
+        # A reads the user, then B updates it and invalidates, then A caches what it read
+        version = self.process_a.version('u1')
+        self.process_b.invalidate('u1')
+        self.process_a.set('u1', {'id': 'u1', 'status': 'stale'}, version)
+        self.assertIsNone(self.process_a.get('u1'))
+        self.assertIsNone(self.process_b.get('u1'))
+
+    def test_stale_document_already_written_is_ignored(self):
+        # A passes the version check just before B invalidates
+        version = self.process_a.version('u1')
+        from django.core.cache import caches
+        caches['users'].set('user_doc:u1', (version, {'id': 'u1', 'status': 'stale'}))
+        self.process_b.invalidate('u1')
+        caches['users'].set('user_doc:u1', (version, {'id': 'u1', 'status': 'stale'}))
+        self.assertIsNone(self.process_a.get('u1'))
+        self.process_b.set('u1', {'id': 'u1', 'status': 'fresh'}, self.process_b.version('u1'))
+        self.assertEqual(self.process_a.get('u1')['status'], 'fresh')
+
+
+class SQLiteStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.store = SQLiteBackend(os.path.join(directory, 'store.sqlite3'))
+        self.store.init()
+
+    def test_user_round_trip(self):
+        created = datetime.datetime(2024, 5, 1, 12, 30)
+        self.store.insert_user({'id': 'u1', 'name': 'A', 'registration_status': 'initiated',
+                                'created_at': created})
+        self.store.insert_user({'id': 'u2', 'name': 'B', 'registration_status': 'completed_successfully'})
+        self.assertEqual(self.store.find_user('u1', fields=['name', 'created_at']),
+                         {'name': 'A', 'created_at': created.isoformat()})
+        self.assertTrue(self.store.update_user('u1', {'registration_status': 'completed_successfully',
+                                                      'frames': 3}))
+        self.assertFalse(self.store.update_user('missing', {'frames': 1}))
+        self.assertEqual(self.store.find_user('u1')['frames'], 3)
+        completed = self.store.iter_users({'registration_status': 'completed_successfully'}, fields=['id'])
+        self.assertEqual(sorted(user['id'] for user in completed), ['u1', 'u2'])
+        self.assertEqual([user['id'] for user in self.store.iter_users({'name': 'B'}, batch_size=1)], ['u2'])
+        self.assertIsNone(self.store.find_user('missing'))
+
+    def test_frame_round_trip(self):
+        images = [os.urandom(100), os.urandom(50)]
+        frames = [{'frame_id': f'f{i}', 'image_data': base64.b64encode(image).decode('ascii')}
+                  for i, image in enumerate(images)]
+        self.assertEqual(self.store.insert_frames('u1', frames), 2)
+        stored = list(self.store.iter_frames('u1', batch_size=1))
+        self.assertEqual([frame['frame_id'] for frame in stored], ['f0', 'f1'])
+        self.assertEqual([frame['image_data'] for frame in stored], [frame['image_data'] for frame in frames])
+        raw = list(self.store.iter_frames('u1', raw=True))
+        self.assertEqual([frame['image_data'] for frame in raw], images)
+        self.assertEqual(list(self.store.iter_frames('u1', fields=['frame_id'])),
+                         [{'frame_id': 'f0'}, {'frame_id': 'f1'}])
+        self.assertEqual(list(self.store.iter_frames('u2')), [])
+
+    def test_embedding_round_trip(self):
+        vectors = np.random.default_rng(0).normal(size=(5, 128))
+        self.store.save_embeddings('u1', 'face', vectors)
+        loaded = self.store.load_embeddings('u1', 'face')
+        self.assertEqual(loaded.dtype, np.float64)
+        np.testing.assert_array_equal(loaded, vectors)
+        self.store.save_embeddings('u1', 'face', vectors[:2].astype(np.float32))
+        self.assertEqual(self.store.load_embeddings('u1', 'face').shape, (2, 128))
+        self.assertIsNone(self.store.load_embeddings('u1', 'prototypes_k3'))
+        self.assertEqual(self.store.delete_embeddings('u1'), 1)
+        self.assertIsNone(self.store.load_embeddings('u1', 'face'))
+
+    def test_model_round_trip(self):
+        payload = os.urandom(3 * 255 * 1024 + 17)
+        checksum = hashlib.sha256(payload).hexdigest()
+        model_id = self.store.put_model('u1', io.BytesIO(payload), 'user_u1.pt', {'epochs': 5}, checksum,
+                                        len(payload))
+        legacy_id = self.store.put_model('u2', io.BytesIO(b'old'), 'user_u2.pt', None, None, 3)
+        latest = self.store.latest_model('u1')
+        self.assertEqual((latest['gridfs_id'], latest['sha256'], latest['metadata']),
+                         (model_id, checksum, {'epochs': 5}))
+        self.assertEqual(b''.join(self.store.open_model(model_id)), payload)
+        self.assertEqual(self.store.model_checksums(), {('u1', checksum): model_id})
+        self.assertEqual(self.store.unchecksummed_models(), {('u2', 'user_u2.pt'): legacy_id})
+        self.assertIsNone(self.store.latest_model('u3'))
+        with self.assertRaises(KeyError):
+            list(self.store.open_model('missing'))
+
+    def test_link_models(self):
+        self.store.insert_user({'id': 'u1'})
+        self.assertEqual(self.store.link_models([('u1', 'm1'), ('missing', 'm2')], model_link_fields), 1)
+        self.assertEqual(self.store.find_user('u1')['model_db_id'], 'm1')
+
+    def test_events_are_stored(self):
+        docs = [{'user_id': 'u1', 'session_id': 's1', 'timestamp': 1.0 + i, 'alert_type': 'tab_switch'}
+                for i in range(3)]
+        self.assertEqual(self.store.insert_events('alerts', docs), 3)
+        rows = self.store.connection().execute(
+            "SELECT collection, session_id FROM store_events ORDER BY timestamp").fetchall()
+        self.assertEqual([tuple(row) for row in rows], [('alerts', 's1')] * 3)
+
+
+class FrameAdmissionTests(SimpleTestCase):
+    async def test_newer_frame_supersedes_the_waiting_one(self):
+        admission = FrameAdmission(max_pending=8)
+        self.assertEqual(await admission.acquire('s1'), RUN)
+        waiting = asyncio.create_task(admission.acquire('s1'))
+        await asyncio.sleep(0)
+        newer = asyncio.create_task(admission.acquire('s1'))
+        self.assertEqual(await waiting, SUPERSEDED)
+        self.assertFalse(newer.done())
+        admission.release('s1')
+        self.assertEqual(await newer, RUN)
+        admission.release('s1')
+        stats = admission.stats()
+        self.assertEqual((stats['pending'], stats['sessions'], stats['superseded']), (0, 0, 1))
+
+    async def test_sessions_do_not_wait_for_each_other(self):
+        admission = FrameAdmission(max_pending=8)
+        self.assertEqual(await admission.acquire('s1'), RUN)
+        self.assertEqual(await admission.acquire('s2'), RUN)
+        admission.release('s1')
+        admission.release('s2')
+        self.assertEqual(admission.stats()['pending'], 0)
+
+    async def test_frames_are_shed_at_max_pending(self):
+        admission = FrameAdmission(max_pending=2)
+        self.assertEqual(await admission.acquire('s1'), RUN)
+        self.assertEqual(await admission.acquire(None), RUN)
+        self.assertEqual(await admission.acquire('s2'), SHED)
+        self.assertEqual(await admission.acquire(None), SHED)
+        # A session's waiting slot counts towards the bound as well
+        self.assertEqual(await admission.acquire('s1'), SHED)
+        admission.release(None)
+        waiting = asyncio.create_task(admission.acquire('s1'))
+        await asyncio.sleep(0)
+        self.assertEqual(await admission.acquire('s3'), SHED)
+        admission.release('s1')
+        self.assertEqual(await waiting, RUN)
+        admission.release('s1')
+        stats = admission.stats()
+        self.assertEqual((stats['pending'], stats['shed'], stats['max_pending_seen']), (0, 4, 2))
+
+    async def test_cancelled_waiter_gives_up_its_slot(self):
+        admission = FrameAdmission(max_pending=8)
+        self.assertEqual(await admission.acquire('s1'), RUN)
+        waiting = asyncio.create_task(admission.acquire('s1'))
+        await asyncio.sleep(0)
+        self.assertEqual(admission.stats()['pending'], 2)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(admission.stats()['pending'], 1)
+        admission.release('s1')
+        stats = admission.stats()
+        self.assertEqual((stats['pending'], stats['sessions']), (0, 0))
+
+    async def test_cancelled_after_being_given_run_releases(self):
+        admission = FrameAdmission(max_pending=8)
+        self.assertEqual(await admission.acquire('s1'), RUN)
+        waiting = asyncio.create_task(admission.acquire('s1'))
+        await asyncio.sleep(0)
+        # The running frame finishes, handing RUN to the waiter, which is
+        # cancelled before it can resume
+        admission.release('s1')
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        stats = admission.stats()
+        self.assertEqual((stats['pending'], stats['sessions']), (0, 0))
+        self.assertEqual(await admission.acquire('s1'), RUN)
+        admission.release('s1')
+        self.assertEqual(admission.stats()['pending'], 0)
+
+
+class IdIndexTests(SimpleTestCase):
+    def make_index(self, users):
+        index = IdIndex()
+        index.build(users)
+        return index
+
+    def test_misread_id_number_finds_its_user(self):
+        index = self.make_index([
+            {'id': 'u1', 'id_number': 'AB1234567', 'email': 'a@example.com'},
+            {'id': 'u2', 'id_number': 'XY7654321', 'email': 'b@example.com'},
+        ])
+        best = index.lookup('AB-1234S67')[0]
+        self.assertEqual((best['user_id'], best['field'], best['value']), ('u1', 'id_number', 'AB1234567'))
+        self.assertEqual(index.lookup('ab 1234567')[0]['similarity'], 100.0)
+        self.assertEqual(index.lookup('--'), [])
+
+    def test_users_added_during_build_are_kept(self):
+        index = IdIndex()
+
+        def users():
+            yield {'id': 'u1', 'id_number': 'AB1234567'}
+            # A candidate registers while the users collection is being read
+            index.add_user({'id': 'u2', 'id_number': 'CD7654321'})
+            yield {'id': 'u3', 'id_number': 'EF1111111'}
+
+        self.assertEqual(index.build(users()), 2)
+        self.assertEqual(index.stats()['users'], 3)
+        self.assertEqual(index.lookup('CD7654321')[0]['user_id'], 'u2')
+
+    def test_reindexed_user_only_matches_new_values(self):
+        index = self.make_index([{'id': 'u1', 'id_number': 'AB1234567'}])
+        index.add_user({'id': 'u1', 'id_number': 'ZZ9999999'})
+        # The user id and the new ID number; the old entries are tombstoned
+        self.assertEqual(index.stats()['entries'], 2)
+        self.assertEqual(index.lookup('AB1234567', min_similarity=50), [])
+        self.assertEqual(index.lookup('ZZ9999999')[0]['user_id'], 'u1')
+        index.remove_user('u1')
+        self.assertEqual(index.lookup('ZZ9999999'), [])
+        self.assertEqual(index.stats()['entries'], 0)
+
+    def test_scan_cap_starts_from_the_rarest_ngrams(self):
+        users = [{'id': f'r{i}', 'id_number': f'{i:07d}'} for i in range(200)]
+        # Five users share "mnp7"; only the target has "qzm"
+        users += [{'id': f'u{i}', 'id_number': f'MNP7{i}{i}'} for i in range(5)]
+        users.append({'id': 'target', 'id_number': 'QZMNP7'})
+        index = self.make_index(users)
+        uncapped = index.lookup('QZMNP7', limit=10)
+        self.assertEqual(uncapped[0]['user_id'], 'target')
+        self.assertGreater(len(uncapped), 1)
+        self.assertEqual([r['user_id'] for r in index.lookup('QZMNP7', limit=10, max_postings_scanned=1)],
+                         ['target'])
+        # The rarest n-gram is scanned even if it alone exceeds the budget
+        self.assertEqual([r['user_id'] for r in index.lookup('MNP733', limit=10, max_postings_scanned=0)],
+                         ['u3'])
+
+    def test_limit_and_min_similarity(self):
+        rng = np.random.default_rng(0)
+        users = [{'id': f'r{i}', 'id_number': ''.join(rng.choice(list('ABCDEFGHJKLMNPQRSTUVWXYZ0123456789'), 9))}
+                 for i in range(200)]
+        neighbours = ['AB1234507', 'AB1234508', 'AB1234577', 'AB1239507', 'AB1284507', 'AC1234557']
+        users += [{'id': f'u{i}', 'id_number': value} for i, value in enumerate(neighbours)]
+        index = self.make_index(users)
+        results = index.lookup('AB1234507', limit=3)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], {'user_id': 'u0', 'field': 'id_number', 'value': 'AB1234507',
+                                      'similarity': 100.0})
+        self.assertEqual([r['similarity'] for r in results], sorted((r['similarity'] for r in results), reverse=True))
+        # The bar raised once limit users are found keeps the best ones
+        unlimited = index.lookup('AB1234507', limit=20, shortlist=20)
+        self.assertEqual([r['similarity'] for r in results], [r['similarity'] for r in unlimited[:3]])
+        self.assertTrue(all(r['similarity'] >= 95 for r in index.lookup('AB1234507', min_similarity=95)))
+        self.assertEqual(index.lookup('QQ0000000', min_similarity=90), [])
+
+
+class PrototypeTests(SimpleTestCase):
+    def poses(self, counts, seed=0):
+        """Encodings around len(counts) well separated head poses."""
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(0, 1, (len(counts), 128))
+        return np.vstack([center + rng.normal(0, 0.01, (count, 128)) for center, count in zip(centers, counts)])
+
+    def test_fewer_encodings_than_k_are_kept_as_is(self):
+        encodings = self.poses([1, 1])
+        prototypes = extract_prototypes(encodings, k=3)
+        self.assertEqual(prototypes.dtype, np.float32)
+        np.testing.assert_allclose(prototypes, encodings, rtol=1e-6)
+        self.assertEqual(extract_prototypes(np.empty((0, 128)), k=3).shape, (0, 128))
+
+    def test_duplicate_encodings_give_fewer_prototypes(self):
+        encodings = np.repeat(self.poses([1, 1]), 10, axis=0)
+        prototypes = extract_prototypes(encodings, k=5)
+        self.assertEqual(len(prototypes), 2)
+
+    def test_one_prototype_per_pose_and_deterministic(self):
+        encodings = self.poses([12, 8, 5])
+        prototypes = extract_prototypes(encodings, k=3)
+        self.assertEqual(prototypes.shape, (3, 128))
+        # Every pose is within noise of one prototype
+        for pose in (encodings[0], encodings[12], encodings[20]):
+            self.assertLess(np.linalg.norm(prototypes - pose, axis=1).min(), 0.5)
+        np.testing.assert_array_equal(prototypes, extract_prototypes(encodings, k=3))
+
+    def test_gallery_match_respects_tolerance(self):
+        gallery = PrototypeGallery()
+        self.assertEqual(gallery.match(np.zeros(128), 0.55), (None, float('inf')))
+        a, b = np.zeros((2, 128), dtype=np.float32), np.zeros((1, 128), dtype=np.float32)
+        a[1, 0] = 1.0
+        b[0, 1] = 1.0
+        gallery.set_user('a', a)
+        gallery.set_user('b', b)
+        probe = np.zeros(128)
+        probe[0] = 0.9
+        user_id, distance = gallery.match(probe, 0.55)
+        self.assertEqual(user_id, 'a')
+        self.assertAlmostEqual(distance, 0.1, places=5)
+        probe[0] = 0.4
+        probe[1] = 0.6
+        self.assertEqual(gallery.match(probe, 0.3), (None, float('inf')))
+        gallery.remove_user('a')
+        self.assertNotIn('a', gallery)
+        self.assertEqual(gallery.match(probe, 0.6)[0], 'b')
+        self.assertEqual(gallery.stats()['prototypes'], 1)
+
+    def test_replacing_face_encodings_drops_stored_prototypes(self):
+        with scratch_storage():
+            db.save_embeddings('u1', self.poses([5, 5], seed=1))
+            first = load_prototypes('u1', k=2)
+            self.assertIsNotNone(db.get_embeddings('u1', kind=prototype_kind(2)))
+            db.save_embeddings('u1', self.poses([5, 5], seed=2))
+            self.assertIsNone(db.get_embeddings('u1', kind=prototype_kind(2)))
+            second = load_prototypes('u1', k=2)
+            self.assertFalse(np.allclose(np.sort(first, axis=0), np.sort(second, axis=0)))
+
+    def test_prefix_delete_on_sqlite(self):
+        with scratch_storage() as backend:
+            for kind in ('face', 'prototypes_k2', 'prototypes_k3', 'prototypesXk3'):
+                backend.save_embeddings('u1', kind, np.zeros((1, 4)))
+            backend.save_embeddings('u2', 'prototypes_k3', np.zeros((1, 4)))
+            # "_" is matched literally, not as a LIKE wildcard
+            self.assertEqual(backend.delete_embeddings('u1', kind_prefix='prototypes_k'), 2)
+            self.assertIsNotNone(backend.load_embeddings('u1', 'face'))
+            self.assertIsNotNone(backend.load_embeddings('u1', 'prototypesXk3'))
+            self.assertIsNotNone(backend.load_embeddings('u2', 'prototypes_k3'))
+
+    def test_prefix_delete_on_mongo(self):
+        client = pymongo.MongoClient('mongodb://localhost:1', connect=False)
+        backend = MongoBackend(client['test'])
+        backend.embeddings = FakeEmbeddings([('u1', 'face'), ('u1', 'prototypes_k2'), ('u1', 'prototypes_k3'),
+                                             ('u1', 'prototypesXk3'), ('u2', 'prototypes_k3')])
+        self.assertEqual(backend.delete_embeddings('u1', kind_prefix='prototypes_k'), 2)
+        self.assertEqual(sorted(backend.embeddings.docs),
+                         [('u1', 'face'), ('u1', 'prototypesXk3'), ('u2', 'prototypes_k3')])
+        self.assertEqual(backend.delete_embeddings('u1'), 2)
+
+
+class FakeEmbeddings:
+    """Embeddings collection stand-in evaluating delete_many filters on user_id and a kind $regex."""
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def delete_many(self, query):
+        def matches(user_id, kind):
+            if user_id != query['user_id']:
+                return False
+            pattern = query.get('kind', {}).get('$regex')
+            return pattern is None or re.search(pattern, kind) is not None
+
+        kept = [doc for doc in self.docs if not matches(*doc)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+
+        class Result:
+            deleted_count = deleted
+        return Result()
+
+
+class ProcessingEventsTests(SimpleTestCase):
+    def test_wsgi_request_is_told_to_poll(self):
+        response = self.client.get('/processing_events', {'user_id': 'u1'})
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+    async def test_asgi_request_streams(self):
+        response = await self.async_client.get('/processing_events', {'user_id': 'u1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
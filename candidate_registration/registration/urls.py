@@ -13,6 +13,10 @@ urlpatterns = [
     path('log_mouse_movement', views.log_mouse_movement, name='log_mouse_movement'),
     path('detect_screen_capture', views.detect_screen_capture, name='detect_screen_capture'),
     path('log_copy_paste', views.log_copy_paste, name='log_copy_paste'),
+    path('end_session', views.end_session, name='end_session'),
+    path('verify_id', views.verify_id, name='verify_id'),
     path('processing_status', views.processing_status, name='processing_status'),
+    path('processing_events', views.processing_events, name='processing_events'),
     path('skip_processing', views.skip_processing, name='skip_processing'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
 ]
@@ -0,0 +1,166 @@
+import os
+import math
+import asyncio
+import threading
+
+from .executors import INFERENCE_WORKERS
+
+# Frames admitted for inference (running + waiting) across all sessions in this process
+ADMISSION_MAX_PENDING = int(os.environ.get('ADMISSION_MAX_PENDING', INFERENCE_WORKERS * 4))
+
+RUN = 'run'
+SUPERSEDED = 'superseded'
+SHED = 'shed'
+
+
+class _Waiter:
+    __slots__ = ('loop', 'future', 'outcome')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.outcome = None
+
+
+class _SessionSlot:
+    __slots__ = ('running', 'waiting')
+
+    def __init__(self):
+        self.running = False
+        # _Waiter of the one frame waiting behind the running one
+        self.waiting = None
+
+
+class FrameAdmission:
+    """
+    Admission control for webcam frame inference.
+
+    Bounds the frames admitted across all sessions (running or waiting) and
+    allows each session one running frame plus one waiting frame. A newer
+    frame from the same session replaces the waiting one, whose request is
+    answered straight away as superseded, so stale frames never reach the
+    model. When the bound is reached, new frames are shed immediately and
+    the client is told when to retry, instead of queueing until it times out.
+
+    Futures are resolved through their own event loop, so this works whether
+    async views run on one ASGI loop or on per-request loops under WSGI.
+    """
+
+    def __init__(self, max_pending=ADMISSION_MAX_PENDING):
+        self.max_pending = max(1, max_pending)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.pending = 0
+
+        self.admitted = 0
+        self.shed = 0
+        self.superseded = 0
+        self.max_pending_seen = 0
+
+    @staticmethod
+    def _resolve(waiter, outcome):
+        # Called with the lock held; outcome is recorded first so a request
+        # cancelled before the callback runs still knows what it was given
+        waiter.outcome = outcome
+        future = waiter.future
+        waiter.loop.call_soon_threadsafe(lambda: future.done() or future.set_result(outcome))
+
+    async def acquire(self, session_key=None):
+        """
+        Wait for this frame's turn.
+
+        Returns:
+            RUN when the frame may run (call release() afterwards), SUPERSEDED
+            if a newer frame from the same session replaced it while it waited,
+            or SHED if the server is saturated
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if session_key is None:
+                # Frames without a session identity are only bounded globally
+                if self.pending >= self.max_pending:
+                    self.shed += 1
+                    return SHED
+                self._admit()
+                return RUN
+
+            slot = self._sessions.get(session_key)
+            if slot is None or not slot.running:
+                if self.pending >= self.max_pending:
+                    self.shed += 1
+                    return SHED
+                slot = slot or self._sessions.setdefault(session_key, _SessionSlot())
+                slot.running = True
+                self._admit()
+                return RUN
+
+            waiter = _Waiter(loop)
+            if slot.waiting is not None:
+                # Take over the stale frame's place in the queue
+                self._resolve(slot.waiting, SUPERSEDED)
+                self.superseded += 1
+            elif self.pending >= self.max_pending:
+                self.shed += 1
+                return SHED
+            else:
+                self._admit()
+            slot.waiting = waiter
+
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if slot.waiting is waiter:
+                    slot.waiting = None
+                    self.pending -= 1
+                elif waiter.outcome == RUN:
+                    # Our turn came just as the request was abandoned
+                    self._release_locked(session_key)
+            raise
+
+    def _admit(self):
+        self.pending += 1
+        self.admitted += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+
+    def release(self, session_key=None):
+        """Finish a frame that acquire() allowed to RUN and start the session's waiting frame."""
+        with self._lock:
+            self._release_locked(session_key)
+
+    def _release_locked(self, session_key):
+        self.pending -= 1
+        slot = self._sessions.get(session_key)
+        if slot is None:
+            return
+        if slot.waiting is not None:
+            waiting, slot.waiting = slot.waiting, None
+            # The waiting frame's admission carries over to its run
+            self._resolve(waiting, RUN)
+        else:
+            del self._sessions[session_key]
+
+    def record_superseded(self, count=1):
+        """Count frames replaced before admission, e.g. by a WebSocket connection's latest-frame slot."""
+        with self._lock:
+            self.superseded += count
+
+    def retry_after(self, frame_latency):
+        """Seconds a shed client should wait, from the backlog and per-frame latency."""
+        backlog = self.pending / max(1, INFERENCE_WORKERS)
+        return max(1, math.ceil(backlog * frame_latency))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'max_pending_seen': self.max_pending_seen,
+                'sessions': len(self._sessions),
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'superseded': self.superseded,
+            }
+
+
+frame_admission = FrameAdmission()
@@ -0,0 +1,256 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Tunables for alert rate limiting
+ALERT_COOLDOWN_SECONDS = float(os.environ.get('ALERT_COOLDOWN_SECONDS', 30))
+ALERT_LIMITER_MAX_KEYS = int(os.environ.get('ALERT_LIMITER_MAX_KEYS', 10000))
+ALERT_LIMITER_TTL_SECONDS = float(os.environ.get('ALERT_LIMITER_TTL_SECONDS', 3600))
+# Name of a Django cache alias (e.g. a Redis or Memcached cache) to share
+# limiter state between worker processes. Empty means per-process state.
+ALERT_LIMITER_SHARED_CACHE = os.environ.get('ALERT_LIMITER_SHARED_CACHE', '')
+
+
+class AlertRateLimiter:
+    """
+    Per-(session, alert_type) cooldown with burst aggregation.
+
+    The first occurrence of an alert type in a session is emitted straight
+    away. Further occurrences during the cooldown are only counted, and the
+    next emitted alert carries the number of occurrences it stands for, so
+    "12 tab switches in 60s" becomes a single alert document with a counter.
+    Counts that are still pending when a session ends or its state expires
+    are handed back through pop_session() and drain_expired() so they can be
+    written as summary alerts instead of being lost.
+
+    With a shared cache, counts live in the cache so any process can emit
+    or flush them; drain_expired() flushes a key's count once its cooldown
+    window closes, since cache entries cannot be held until a TTL sweep.
+    """
+
+    def __init__(self, cooldown=ALERT_COOLDOWN_SECONDS, max_keys=ALERT_LIMITER_MAX_KEYS,
+                 ttl=ALERT_LIMITER_TTL_SECONDS, shared_cache=ALERT_LIMITER_SHARED_CACHE):
+        self.cooldown = cooldown
+        self.max_keys = max(1, max_keys)
+        self.ttl = ttl
+        self._state = OrderedDict()
+        self._expired = []
+        self._lock = threading.Lock()
+        # Shared mode: keys this process has counted suppressed occurrences
+        # for, with the time of the last one, so their counts can be flushed
+        self._shared_pending = OrderedDict()
+
+        self._cache = None
+        if shared_cache:
+            try:
+                from django.core.cache import caches
+                self._cache = caches[shared_cache]
+            except Exception as e:
+                logger.warning(f"Alert limiter shared cache '{shared_cache}' unavailable, using local state: {str(e)}")
+
+        self.emitted = 0
+        self.suppressed = 0
+
+    def record(self, session_id, alert_type, timestamp=None):
+        """
+        Record one occurrence of an alert.
+
+        Args:
+            session_id: Exam session the alert belongs to
+            alert_type: Alert type (e.g. 'tab_switch')
+            timestamp: Time of the occurrence, defaults to now
+
+        Returns:
+            None if the alert should be suppressed, otherwise a dict with
+            occurrence_count, first_seen and last_seen to store on the alert
+        """
+        now = timestamp if timestamp is not None else time.time()
+        if self._cache is not None:
+            return self._record_shared(session_id, alert_type, now)
+
+        key = (session_id, alert_type)
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state['last_emit'] >= self.cooldown:
+                count = 1 + (state['pending'] if state else 0)
+                first_seen = state['first_pending'] if state and state['pending'] else now
+                self._state[key] = {'last_emit': now, 'last_seen': now, 'pending': 0, 'first_pending': None}
+                self._state.move_to_end(key)
+                self._evict(now)
+                self.emitted += 1
+                return {'occurrence_count': count, 'first_seen': first_seen, 'last_seen': now}
+
+            state['pending'] += 1
+            state['last_seen'] = now
+            if state['first_pending'] is None:
+                state['first_pending'] = now
+            self._state.move_to_end(key)
+            self._evict(now)
+            self.suppressed += 1
+            return None
+
+    def _keys(self, session_id, alert_type):
+        prefix = f"alert_rl:{session_id}:{alert_type}"
+        return {name: f"{prefix}:{name}" for name in ('gate', 'count', 'first', 'last', 'indexed')}
+
+    def _incr(self, key):
+        try:
+            return self._cache.incr(key)
+        except ValueError:
+            if self._cache.add(key, 1, timeout=self.ttl):
+                return 1
+            return self._cache.incr(key)
+
+    def _record_shared(self, session_id, alert_type, now):
+        keys = self._keys(session_id, alert_type)
+        try:
+            # cache.add is atomic: only one process wins the right to emit per cooldown
+            if self._cache.add(keys['gate'], now, timeout=self.cooldown):
+                pending = self._take_pending(keys)
+                with self._lock:
+                    self._shared_pending.pop((session_id, alert_type), None)
+                self.emitted += 1
+                count = 1 + (pending['occurrence_count'] if pending else 0)
+                first_seen = pending['first_seen'] if pending else now
+                return {'occurrence_count': count, 'first_seen': first_seen, 'last_seen': now}
+
+            self._incr(keys['count'])
+            self._cache.add(keys['first'], now, timeout=self.ttl)
+            self._cache.set(keys['last'], now, timeout=self.ttl)
+            # Index the alert type under its session, so pop_session can find it
+            if self._cache.add(keys['indexed'], 1, timeout=self.ttl):
+                slot = self._incr(f"alert_rl:{session_id}:types")
+                self._cache.set(f"alert_rl:{session_id}:type:{slot}", alert_type, timeout=self.ttl)
+            with self._lock:
+                self._shared_pending[(session_id, alert_type)] = now
+                self._shared_pending.move_to_end((session_id, alert_type))
+            self.suppressed += 1
+            return None
+        except Exception as e:
+            # Never drop an alert because the shared cache is unhealthy
+            logger.error(f"Alert limiter cache error: {str(e)}")
+            return {'occurrence_count': 1, 'first_seen': now, 'last_seen': now}
+
+    def _take_pending(self, keys):
+        """Read and clear the pending count of one key; None if nothing is pending."""
+        pending = self._cache.get_many([keys['count'], keys['first'], keys['last']])
+        self._cache.delete_many([keys['count'], keys['first'], keys['last']])
+        count = pending.get(keys['count'], 0)
+        if not count:
+            return None
+        last_seen = pending.get(keys['last'])
+        return {
+            'occurrence_count': count,
+            'first_seen': pending.get(keys['first'], last_seen),
+            'last_seen': last_seen if last_seen is not None else pending.get(keys['first']),
+        }
+
+    def _flush_shared_expired(self, now):
+        """
+        Summarize pending counts whose cooldown window has closed with no
+        further alert to fold them into. Claiming the gate makes the flush
+        exclusive across processes; it is released straight away so the next
+        alert is still emitted immediately.
+        """
+        with self._lock:
+            candidates = [key for key, last_seen in self._shared_pending.items()
+                          if now - last_seen >= self.cooldown]
+            # Keys beyond the size cap are flushed early rather than forgotten
+            overflow = len(self._shared_pending) - self.max_keys
+            if overflow > 0:
+                candidates += [key for key in list(self._shared_pending)[:overflow] if key not in candidates]
+            for key in candidates:
+                del self._shared_pending[key]
+
+        summaries = []
+        for session_id, alert_type in candidates:
+            keys = self._keys(session_id, alert_type)
+            try:
+                if not self._cache.add(keys['gate'], now, timeout=self.cooldown):
+                    # A newer alert opened another window; it folds the count in
+                    continue
+                pending = self._take_pending(keys)
+                self._cache.delete(keys['gate'])
+            except Exception as e:
+                logger.error(f"Alert limiter cache error: {str(e)}")
+                continue
+            if pending:
+                summaries.append({'session_id': session_id, 'alert_type': alert_type, **pending})
+        return summaries
+
+    def _pop_shared_session(self, session_id):
+        types_key = f"alert_rl:{session_id}:types"
+        try:
+            slots = self._cache.get(types_key) or 0
+            slot_keys = [f"alert_rl:{session_id}:type:{slot}" for slot in range(1, slots + 1)]
+            alert_types = self._cache.get_many(slot_keys).values() if slot_keys else []
+            summaries = []
+            for alert_type in alert_types:
+                keys = self._keys(session_id, alert_type)
+                pending = self._take_pending(keys)
+                self._cache.delete_many([keys['gate'], keys['indexed']])
+                if pending:
+                    summaries.append({'session_id': session_id, 'alert_type': alert_type, **pending})
+            self._cache.delete_many(slot_keys + [types_key])
+        except Exception as e:
+            logger.error(f"Alert limiter cache error: {str(e)}")
+            summaries = []
+        with self._lock:
+            for key in [k for k in self._shared_pending if k[0] == session_id]:
+                del self._shared_pending[key]
+        return summaries
+
+    def _evict(self, now):
+        """Drop expired and least recently used state, keeping pending counts."""
+        while self._state:
+            key, state = next(iter(self._state.items()))
+            if len(self._state) <= self.max_keys and now - state['last_seen'] < self.ttl:
+                break
+            self._state.popitem(last=False)
+            if state['pending']:
+                self._expired.append(self._summary(key, state))
+
+    def _summary(self, key, state):
+        session_id, alert_type = key
+        return {
+            'session_id': session_id,
+            'alert_type': alert_type,
+            'occurrence_count': state['pending'],
+            'first_seen': state['first_pending'],
+            'last_seen': state['last_seen'],
+        }
+
+    def pop_session(self, session_id):
+        """Forget a finished session and return summaries of its pending counts."""
+        if self._cache is not None:
+            return self._pop_shared_session(session_id)
+        summaries = []
+        with self._lock:
+            for key in [k for k in self._state if k[0] == session_id]:
+                state = self._state.pop(key)
+                if state['pending']:
+                    summaries.append(self._summary(key, state))
+        return summaries
+
+    def drain_expired(self, now=None):
+        """
+        Return summaries for state evicted by TTL or the size cap, and in
+        shared mode for pending counts whose cooldown window has closed.
+        """
+        if self._cache is not None:
+            return self._flush_shared_expired(now if now is not None else time.time())
+        with self._lock:
+            expired, self._expired = self._expired, []
+        return expired
+
+    def stats(self):
+        return {
+            'tracked_keys': len(self._shared_pending) if self._cache is not None else len(self._state),
+            'emitted': self.emitted,
+            'suppressed': self.suppressed,
+        }
@@ -0,0 +1,131 @@
+import os
+import shutil
+import hashlib
+import threading
+
+# Local on-disk cache of model artifacts fetched from GridFS
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', os.path.join('cache', 'models'))
+MODEL_CACHE_MAX_BYTES = int(os.environ.get('MODEL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+STREAM_CHUNK_SIZE = 255 * 1024  # GridFS default chunk size
+
+
+def file_sha256(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Return the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    LRU cache of model files on local disk, keyed by GridFS id and checksum.
+
+    A changed artifact gets a new GridFS id and checksum and therefore a new
+    key, so entries never need invalidating; stale ones simply age out when
+    the cache grows past its size limit. Recency is tracked through the
+    files' modification times so it survives process restarts.
+    """
+
+    def __init__(self, cache_dir=MODEL_CACHE_DIR, max_bytes=MODEL_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, gridfs_id, checksum=None):
+        key = f"{gridfs_id}_{checksum}" if checksum else str(gridfs_id)
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def get(self, gridfs_id, checksum=None):
+        """Return the cached file path for an artifact, or None on a miss."""
+        path = self.path_for(gridfs_id, checksum)
+        if os.path.exists(path):
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def put_stream(self, gridfs_id, checksum, chunks):
+        """
+        Write an artifact into the cache from an iterable of byte chunks.
+
+        The file is written under a temporary name and renamed into place, so
+        a partially downloaded artifact is never served.
+
+        Returns:
+            Path of the cached file
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(gridfs_id, checksum)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+            if checksum and digest.hexdigest() != checksum:
+                raise ValueError(f"Checksum mismatch for artifact {gridfs_id}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        # The new entry is kept even if it alone exceeds the limit, so the
+        # caller is never handed a path that was just deleted
+        self.evict(keep=path)
+        return path
+
+    def copy_to(self, cached_path, output_path):
+        """Copy a cached artifact to output_path in chunks."""
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(cached_path, output_path)
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used artifacts until the cache fits its size
+        limit, never removing the file at keep.
+        """
+        with self._lock:
+            try:
+                entries = []
+                for name in os.listdir(self.cache_dir):
+                    if not name.endswith('.bin'):
+                        continue
+                    path = os.path.join(self.cache_dir, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                return
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+model_cache = ArtifactCache()
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from .db import SQLiteBackend, use_storage
+
+# Where benchmark reports and baselines are written
+BENCH_DIR = os.path.join('logs', 'benchmarks')
+
+
+def parse_int_list(value):
+    """Parse a comma-separated option such as "1,2,4,8"."""
+    return [int(item) for item in str(value).split(',') if item.strip()]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+def latency_summary(latencies):
+    """Summarize latencies in seconds as milliseconds."""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'count': count,
+        'mean_ms': round(1000 * sum(values) / count, 2) if count else 0.0,
+        'p50_ms': round(1000 * percentile(values, 0.50), 2),
+        'p95_ms': round(1000 * percentile(values, 0.95), 2),
+        'p99_ms': round(1000 * percentile(values, 0.99), 2),
+        'max_ms': round(1000 * values[-1], 2) if count else 0.0,
+    }
+
+
+def environment_info():
+    return {
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def tree_bytes(path):
+    """Total size of the files under path."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def sqlite_bytes(backend):
+    """Size of a SQLite store on disk, including its write-ahead log."""
+    return sum(os.path.getsize(path) for path in (backend.path, backend.path + '-wal')
+               if os.path.exists(path))
+
+
+def count_event_docs(backend):
+    """Monitoring documents in a SQLite store, by collection."""
+    rows = backend.connection().execute(
+        "SELECT collection, COUNT(*) FROM store_events GROUP BY collection"
+    ).fetchall()
+    return {collection: count for collection, count in rows}
+
+
+def current_rss():
+    """Resident set size of this process in bytes (0 where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class PeakRSSMonitor:
+    """
+    Track the peak resident memory of this process by sampling it in a
+    background thread. reset() starts a new measurement window, so the peak
+    can be attributed to one pipeline stage at a time.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-monitor', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def reset(self):
+        self.peak = current_rss()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+@contextmanager
+def scratch_storage(directory=None):
+    """
+    Run against an empty SQLite store in a temporary directory instead of the
+    configured database, then restore the previous backend.
+
+    Stands in for MongoDB: both go through the same StorageBackend interface,
+    so the benchmarked code paths are the ones used in production.
+    """
+    path = tempfile.mkdtemp(prefix='bench_', dir=directory)
+    backend = SQLiteBackend(os.path.join(path, 'bench.sqlite3'))
+    previous = use_storage(backend)
+    try:
+        yield backend
+    finally:
+        use_storage(previous)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def write_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return path
+
+
+def compare_to_baseline(results, baseline_path, key_fields, metrics, tolerance):
+    """
+    Compare benchmark results with a stored baseline report.
+
+    Args:
+        results: List of result dicts from this run
+        baseline_path: JSON report written by an earlier run
+        key_fields: Fields identifying a configuration, e.g. ('gallery_size', 'concurrency')
+        metrics: {metric: True if higher is better, False if lower is better}
+        tolerance: Allowed relative change before a metric counts as a regression
+
+    Returns:
+        list of comparison dicts (one per metric found in both runs), or None
+        if there is no baseline
+    """
+    if not baseline_path or not os.path.exists(baseline_path):
+        return None
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    baseline_results = {tuple(r.get(k) for k in key_fields): r for r in baseline.get('results', [])}
+    comparisons = []
+    for result in results:
+        key = tuple(result.get(k) for k in key_fields)
+        previous = baseline_results.get(key)
+        if previous is None:
+            continue
+        for metric, higher_is_better in metrics.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regression = change < -tolerance if higher_is_better else change > tolerance
+            comparisons.append({
+                **dict(zip(key_fields, key)),
+                'metric': metric,
+                'baseline': old,
+                'current': new,
+                'change_pct': round(100 * change, 1),
+                'regression': regression,
+            })
+    return comparisons
@@ -0,0 +1,143 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from .executors import INFERENCE_WORKERS, inference_pending
+
+# Capture settings sent to clients while the server has headroom
+CAPTURE_BASE_INTERVAL_MS = int(os.environ.get('CAPTURE_BASE_INTERVAL_MS', 1000))
+CAPTURE_MAX_INTERVAL_MS = int(os.environ.get('CAPTURE_MAX_INTERVAL_MS', 5000))
+CAPTURE_MAX_WIDTH = int(os.environ.get('CAPTURE_MAX_WIDTH', 640))
+CAPTURE_JPEG_QUALITY = float(os.environ.get('CAPTURE_JPEG_QUALITY', 0.8))
+# Load at which clients start backing off: frames waiting per inference
+# worker, and per-frame inference latency
+CAPTURE_TARGET_QUEUE_DEPTH = float(os.environ.get('CAPTURE_TARGET_QUEUE_DEPTH', 2))
+CAPTURE_TARGET_LATENCY_SECONDS = float(os.environ.get('CAPTURE_TARGET_LATENCY_SECONDS', 0.5))
+# Sessions at or above this risk keep full fidelity regardless of load
+CAPTURE_HIGH_RISK = float(os.environ.get('CAPTURE_HIGH_RISK', 0.5))
+# Risk from weaker signals (medium alerts, nobody in view); kept below
+# CAPTURE_HIGH_RISK so they are reported without pinning full fidelity
+CAPTURE_MEDIUM_RISK = float(os.environ.get('CAPTURE_MEDIUM_RISK', 0.3))
+CAPTURE_RISK_HALF_LIFE_SECONDS = float(os.environ.get('CAPTURE_RISK_HALF_LIFE_SECONDS', 120))
+CAPTURE_MAX_SESSIONS = int(os.environ.get('CAPTURE_MAX_SESSIONS', 10000))
+
+# Degradation steps as load grows: (pressure threshold, max width, JPEG quality)
+_QUALITY_STEPS = [
+    (3.0, 320, 0.6),
+    (1.5, 480, 0.7),
+]
+
+
+class CapturePolicy:
+    """
+    Recommends each session's next capture interval, resolution and JPEG quality.
+
+    Load is measured as the inference queue depth and an exponentially
+    weighted average of per-frame latency. As either passes its target, the
+    recommended interval stretches and resolution and quality step down, so
+    capacity degrades gradually instead of frames timing out. Every session
+    has a risk score that jumps on suspicious detections and alerts and
+    decays with a half-life; high-risk sessions are always asked for full
+    fidelity.
+    """
+
+    def __init__(self, max_sessions=CAPTURE_MAX_SESSIONS, half_life=CAPTURE_RISK_HALF_LIFE_SECONDS):
+        self.max_sessions = max(1, max_sessions)
+        self.half_life = half_life
+        self._risk = OrderedDict()
+        self._lock = threading.Lock()
+        self.latency_ewma = 0.0
+
+    def _decayed(self, entry, now):
+        score, updated = entry
+        return score * math.pow(0.5, (now - updated) / self.half_life) if self.half_life else score
+
+    def session_risk(self, session_key):
+        with self._lock:
+            entry = self._risk.get(session_key)
+            return self._decayed(entry, time.time()) if entry else 0.0
+
+    def raise_risk(self, session_key, level):
+        """Lift a session's risk score to at least level (0..1)."""
+        now = time.time()
+        with self._lock:
+            entry = self._risk.get(session_key)
+            current = self._decayed(entry, now) if entry else 0.0
+            self._risk[session_key] = (max(current, level), now)
+            self._risk.move_to_end(session_key)
+            while len(self._risk) > self.max_sessions:
+                self._risk.popitem(last=False)
+
+    def observe(self, session_key, latency, result, enrolled_user_id=None):
+        """
+        Record one analyzed frame's inference latency and detection result.
+
+        Args:
+            enrolled_user_id: The session's candidate, if their face is in the
+                gallery; only then is a face that does not match them suspicious
+        """
+        with self._lock:
+            self.latency_ewma = latency if not self.latency_ewma else 0.8 * self.latency_ewma + 0.2 * latency
+
+        if not session_key or result.get('status') != 'success':
+            return
+        detections = result.get('detections') or {}
+        if detections.get('cell phone', 0) > 0 or detections.get('person', 0) > 1:
+            self.raise_risk(session_key, 1.0)
+        elif detections.get('person', 0) == 0:
+            self.raise_risk(session_key, CAPTURE_MEDIUM_RISK)
+        elif enrolled_user_id and result.get('user_id') != enrolled_user_id:
+            # Someone other than the registered candidate is in front of the camera
+            self.raise_risk(session_key, 0.6)
+
+    def forget(self, session_key):
+        with self._lock:
+            self._risk.pop(session_key, None)
+
+    def pressure(self):
+        """Return current load relative to its targets (above 1 means overloaded)."""
+        depth = inference_pending() / max(1, INFERENCE_WORKERS)
+        return max(depth / CAPTURE_TARGET_QUEUE_DEPTH, self.latency_ewma / CAPTURE_TARGET_LATENCY_SECONDS)
+
+    def recommend(self, session_key=None):
+        """
+        Return the capture settings the client should use for its next frame.
+
+        Returns:
+            dict with interval_ms, max_width, jpeg_quality and the session's risk
+        """
+        risk = self.session_risk(session_key) if session_key else 0.0
+        recommendation = {
+            'interval_ms': CAPTURE_BASE_INTERVAL_MS,
+            'max_width': CAPTURE_MAX_WIDTH,
+            'jpeg_quality': CAPTURE_JPEG_QUALITY,
+            'risk': round(risk, 2),
+        }
+        if risk >= CAPTURE_HIGH_RISK:
+            return recommendation
+
+        pressure = self.pressure()
+        if pressure > 1:
+            recommendation['interval_ms'] = min(CAPTURE_MAX_INTERVAL_MS, int(CAPTURE_BASE_INTERVAL_MS * pressure))
+            for threshold, max_width, quality in _QUALITY_STEPS:
+                if pressure >= threshold:
+                    recommendation['max_width'] = min(CAPTURE_MAX_WIDTH, max_width)
+                    recommendation['jpeg_quality'] = min(CAPTURE_JPEG_QUALITY, quality)
+                    break
+        return recommendation
+
+    def stats(self):
+        with self._lock:
+            sessions = len(self._risk)
+            latency = self.latency_ewma
+        return {
+            'sessions': sessions,
+            'latency_ewma_ms': latency * 1000,
+            'inference_pending': inference_pending(),
+            'pressure': self.pressure(),
+        }
+
+
+capture_policy = CapturePolicy()
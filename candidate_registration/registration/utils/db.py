@@ -1,17 +1,46 @@
 import pymongo
 import os
-from pymongo import MongoClient
+import time
 import datetime
+import threading
+from collections import OrderedDict
 import json
 import base64
+import re
+import uuid
 from gridfs import GridFS
+from .mongo import MONGO_URI, DB_NAME, get_client, get_db, on_fork
+from .events import registration_events
+from .artifact_cache import model_cache, file_sha256, STREAM_CHUNK_SIZE
+from .sqlite_store import SQLiteStore
+from .metrics import stage_timer
+from .log import get_logger
+
+logger = get_logger(__name__)
 
-# MongoDB connection string - replace with your own if using Atlas
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-DB_NAME = 'candidate_registration'
 COLLECTION_NAME = 'users'
 FRAMES_COLLECTION_NAME = 'user_frames'
 MODELS_COLLECTION_NAME = 'user_models'
+EMBEDDINGS_COLLECTION_NAME = 'user_embeddings'
+# Embedding kinds derived from a user's 'face' encodings (prototypes.prototype_kind);
+# they are dropped whenever the encodings are replaced
+PROTOTYPE_KIND_PREFIX = 'prototypes_k'
+
+# Storage backend: "mongo", "sqlite" (embedded, on the Django SQLite database)
+# or "auto" to use MongoDB when reachable and fall back to SQLite otherwise.
+# "auto" is meant for single-process development: a worker that falls back
+# keeps using its local SQLite file while other workers may be on MongoDB.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+
+# Default cursor batch size for the streaming retrieval APIs
+CURSOR_BATCH_SIZE = int(os.environ.get('CURSOR_BATCH_SIZE', 16))
+
+# Read-through cache in front of get_user
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1024))
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 10))
+# Name of a Django cache alias to share cached users (and invalidations)
+# between worker processes. Empty means a per-process cache only.
+USER_CACHE_SHARED_CACHE = os.environ.get('USER_CACHE_SHARED_CACHE', '')
 
 # Initialize MongoDB client
 client = None
@@ -21,6 +50,8 @@ frames_collection = None
 models_collection = None
 fs = None
 mongodb_available = False
+storage = None
+_initialized_pid = None
 
 class JSONEncoder(json.JSONEncoder):
     """Custom JSON encoder that handles MongoDB ObjectId"""
@@ -32,57 +63,526 @@ class JSONEncoder(json.JSONEncoder):
             return obj.isoformat()
         return json.JSONEncoder.default(self, obj)
 
-def init_db():
-    """Initialize the MongoDB connection."""
-    global client, db, users_collection, frames_collection, models_collection, fs, mongodb_available
-    try:
-        # Connect to MongoDB
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)  # 2 second timeout
-        # Test connection
-        client.server_info()
-        db = client[DB_NAME]
-        users_collection = db[COLLECTION_NAME]
-        frames_collection = db[FRAMES_COLLECTION_NAME]
-        models_collection = db[MODELS_COLLECTION_NAME]
-        fs = GridFS(db)
-        
-        # Create index for faster lookups
-        users_collection.create_index("id", unique=True)
-        frames_collection.create_index("user_id")
-        models_collection.create_index("user_id")
-        
-        mongodb_available = True
-        print("MongoDB connection established successfully")
+class UserCache:
+    """
+    LRU + TTL cache of user documents keyed by user id.
+
+    Writes through this module invalidate the entry. With a shared Django
+    cache backend configured, entries and invalidations are visible to all
+    worker processes; otherwise other processes may serve a document that is
+    up to the TTL old.
+
+    A reader takes version(user_id) before reading the backend and passes it
+    to set(), so a document read before a concurrent invalidation is never
+    cached. In shared mode the version is a token kept in the shared cache
+    and stored alongside each document; get() only returns a document whose
+    token is still current, so a stale write from any process is ignored.
+    """
+
+    # Version tokens only need to outlive the documents cached under them;
+    # an expired token reads as None, which no document stored under an
+    # earlier token matches
+    SHARED_VERSION_TIMEOUT = 24 * 3600
+
+    def __init__(self, max_entries=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_SECONDS,
+                 shared_cache=USER_CACHE_SHARED_CACHE):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # Invalidation counter, and the count at each user's last invalidation.
+        # Users dropped from _invalidated count as invalidated at _floor.
+        self._generation = 0
+        self._invalidated = {}
+        self._floor = 0
+        self._lock = threading.Lock()
+
+        self._shared = None
+        if shared_cache:
+            try:
+                from django.core.cache import caches
+                self._shared = caches[shared_cache]
+            except Exception as e:
+                logger.warning(f"User cache shared backend '{shared_cache}' unavailable, using local cache: {str(e)}")
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _doc_key(user_id):
+        return f"user_doc:{user_id}"
+
+    @staticmethod
+    def _version_key(user_id):
+        return f"user_ver:{user_id}"
+
+    def version(self, user_id):
+        """Return the invalidation version of a key, to detect racing writes."""
+        if self._shared is not None:
+            try:
+                return self._shared.get(self._version_key(user_id))
+            except Exception as e:
+                logger.error(f"User cache backend error: {str(e)}")
+                return False
+        with self._lock:
+            return self._generation
+
+    def get(self, user_id):
+        if self._shared is not None:
+            doc_key, version_key = self._doc_key(user_id), self._version_key(user_id)
+            try:
+                values = self._shared.get_many([doc_key, version_key])
+            except Exception as e:
+                logger.error(f"User cache backend error: {str(e)}")
+                values = {}
+            entry = values.get(doc_key)
+            # Documents cached under an older version were read before an invalidation
+            current = isinstance(entry, tuple) and entry[0] == values.get(version_key)
+            user = entry[1] if current else None
+            with self._lock:
+                if user is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+            return dict(user)
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            # Shallow copy so callers cannot mutate the cached document
+            return dict(entry[1])
+
+    def set(self, user_id, user, version):
+        """Cache a document read at the given version, unless it was invalidated since."""
+        if self._shared is not None:
+            # False: the version could not be read, so the document is not cached
+            if version is not False and self.version(user_id) == version:
+                try:
+                    self._shared.set(self._doc_key(user_id), (version, user), timeout=self.ttl)
+                except Exception as e:
+                    logger.error(f"User cache backend error: {str(e)}")
+            return
+
+        with self._lock:
+            if self._invalidated.get(user_id, self._floor) > version:
+                return
+            self._entries[user_id] = (time.monotonic(), dict(user))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation += 1
+            self._invalidated[user_id] = self._generation
+            self.invalidations += 1
+            # Keep version bookkeeping bounded; forgotten users count as
+            # invalidated now, which only rejects reads already in flight
+            if len(self._invalidated) > 4 * self.max_entries:
+                self._invalidated.clear()
+                self._floor = self._generation
+        if self._shared is not None:
+            try:
+                self._shared.set(self._version_key(user_id), uuid.uuid4().hex, timeout=self.SHARED_VERSION_TIMEOUT)
+                self._shared.delete(self._doc_key(user_id))
+            except Exception as e:
+                logger.error(f"User cache backend error: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidated.clear()
+            self._floor = self._generation
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'mongo_reads': self.misses,
+            }
+
+user_cache = UserCache()
+
+class StorageBackend:
+    """
+    Interface implemented by the MongoDB and embedded SQLite stores.
+
+    The module-level functions below handle caching, status events and error
+    reporting, and delegate persistence to whichever backend init_db selected,
+    so callers run unchanged against either one.
+    """
+
+    name = None
+
+    def init(self):
+        """Connect and create indexes; raise if the backend is unusable."""
+        raise NotImplementedError
+
+    def insert_user(self, user_data):
+        raise NotImplementedError
+
+    def find_user(self, user_id, fields=None):
+        raise NotImplementedError
+
+    def update_user(self, user_id, update_data):
+        """Set fields on a user document; return True if it was modified."""
+        raise NotImplementedError
+
+    def iter_users(self, query=None, fields=None, batch_size=CURSOR_BATCH_SIZE):
+        raise NotImplementedError
+
+    def insert_frames(self, user_id, frames):
+        """Store frames given as {'frame_id', 'image_data' (Base64)}; return the count."""
+        raise NotImplementedError
+
+    def iter_frames(self, user_id, fields=None, batch_size=CURSOR_BATCH_SIZE, raw=False):
+        """Yield frame documents; image_data is Base64, or raw JPEG bytes if raw."""
+        raise NotImplementedError
+
+    def save_embeddings(self, user_id, kind, vectors):
+        raise NotImplementedError
+
+    def load_embeddings(self, user_id, kind):
+        raise NotImplementedError
+
+    def delete_embeddings(self, user_id, kind_prefix=None):
+        """Remove every kind of embedding stored for a user, or only the kinds starting with kind_prefix."""
+        raise NotImplementedError
+
+    def put_model(self, user_id, model_file, filename, metadata, checksum, length):
+        """Stream an open model file into storage and return its id."""
+        raise NotImplementedError
+
+    def latest_model(self, user_id):
+        """Return the newest model document ({'gridfs_id', 'sha256', 'metadata', ...}) or None."""
+        raise NotImplementedError
+
+    def open_model(self, model_id):
+        """Return an iterable of the stored model's byte chunks."""
+        raise NotImplementedError
+
+    def model_checksums(self):
+        """Return {(user_id, sha256): model_id} for every stored model with a checksum."""
+        raise NotImplementedError
+
+    def unchecksummed_models(self):
+        """Return {(user_id, filename): model_id} for models stored before checksums were recorded."""
+        raise NotImplementedError
+
+    def link_models(self, links, update_for):
+        raise NotImplementedError
+
+    def insert_events(self, collection, docs):
+        """Append monitoring documents (alerts, logs, snapshots) to a named collection."""
+        raise NotImplementedError
+
+class MongoBackend(StorageBackend):
+    """Storage on MongoDB, with model files in GridFS."""
+
+    name = 'mongo'
+
+    def __init__(self, database):
+        self.db = database
+        self.users = database[COLLECTION_NAME]
+        self.frames = database[FRAMES_COLLECTION_NAME]
+        self.models = database[MODELS_COLLECTION_NAME]
+        self.embeddings = database[EMBEDDINGS_COLLECTION_NAME]
+        self.fs = GridFS(database)
+
+    def init(self):
+        self.db.client.admin.command('ping')
+        self.users.create_index("id", unique=True)
+        self.frames.create_index("user_id")
+        self.models.create_index([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)])
+        self.embeddings.create_index([("user_id", pymongo.ASCENDING), ("kind", pymongo.ASCENDING)], unique=True)
         return True
-    except Exception as e:
-        mongodb_available = False
-        print(f"MongoDB connection error: {str(e)}")
-        print("The application will run without MongoDB. Data will be stored in files only.")
+
+    def insert_user(self, user_data):
+        return self.users.insert_one(user_data).inserted_id
+
+    def find_user(self, user_id, fields=None):
+        return self.users.find_one({"id": user_id}, _projection(fields))
+
+    def update_user(self, user_id, update_data):
+        result = self.users.update_one({"id": user_id}, {"$set": update_data})
+        return result.modified_count > 0
+
+    def iter_users(self, query=None, fields=None, batch_size=CURSOR_BATCH_SIZE):
+        cursor = self.users.find(query or {}, _projection(fields)).batch_size(batch_size)
+        with cursor:
+            for user in cursor:
+                yield user
+
+    def insert_frames(self, user_id, frames):
+        now = datetime.datetime.now()
+        result = self.frames.bulk_write([
+            pymongo.InsertOne({
+                "user_id": user_id,
+                "frame_id": frame["frame_id"],
+                "image_data": frame["image_data"],
+                "created_at": now
+            })
+            for frame in frames
+        ])
+        return result.inserted_count
+
+    def iter_frames(self, user_id, fields=None, batch_size=CURSOR_BATCH_SIZE, raw=False):
+        cursor = self.frames.find({"user_id": user_id}, _projection(fields)).batch_size(batch_size)
+        with cursor:
+            for frame in cursor:
+                if raw and 'image_data' in frame:
+                    try:
+                        frame['image_data'] = base64.b64decode(frame['image_data'])
+                    except (ValueError, TypeError) as e:
+                        # One corrupt frame must not end the user's stream
+                        logger.warning(f"Skipping undecodable frame {frame.get('frame_id')} of user {user_id}: {str(e)}")
+                        continue
+                yield frame
+
+    def save_embeddings(self, user_id, kind, vectors):
+        from bson.binary import Binary
+        self.embeddings.replace_one(
+            {"user_id": user_id, "kind": kind},
+            {
+                "user_id": user_id,
+                "kind": kind,
+                "dim": vectors.shape[1],
+                "count": vectors.shape[0],
+                "dtype": str(vectors.dtype),
+                "vectors": Binary(vectors.tobytes()),
+                "updated_at": datetime.datetime.now()
+            },
+            upsert=True
+        )
+
+    def load_embeddings(self, user_id, kind):
+        import numpy as np
+        doc = self.embeddings.find_one({"user_id": user_id, "kind": kind})
+        if doc is None:
+            return None
+        return np.frombuffer(doc["vectors"], dtype=doc["dtype"]).reshape(doc["count"], doc["dim"])
+
+    def delete_embeddings(self, user_id, kind_prefix=None):
+        query = {"user_id": user_id}
+        if kind_prefix:
+            query["kind"] = {"$regex": "^" + re.escape(kind_prefix)}
+        return self.embeddings.delete_many(query).deleted_count
+
+    def put_model(self, user_id, model_file, filename, metadata, checksum, length):
+        file_id = self.fs.put(model_file, filename=filename, metadata=metadata, chunkSize=STREAM_CHUNK_SIZE)
+        self.models.insert_one({
+            "user_id": user_id,
+            "gridfs_id": file_id,
+            "sha256": checksum,
+            "filename": filename,
+            "created_at": datetime.datetime.now(),
+            "metadata": metadata
+        })
+        return file_id
+
+    def latest_model(self, user_id):
+        return self.models.find_one({"user_id": user_id}, sort=[("created_at", pymongo.DESCENDING)])
+
+    def open_model(self, model_id):
+        # Iterating a GridOut yields lines (split on b"\n"), which for a
+        # binary file are of arbitrary length; readchunk returns one GridFS
+        # chunk at a time
+        grid_out = self.fs.get(model_id)
+        try:
+            for chunk in iter(grid_out.readchunk, b''):
+                yield chunk
+        finally:
+            grid_out.close()
+
+    def model_checksums(self):
+        # Oldest first, so the newest copy of a file wins
+        cursor = self.models.find({"sha256": {"$exists": True}},
+                                  {"_id": 0, "user_id": 1, "sha256": 1, "gridfs_id": 1}).sort("created_at", 1)
+        return {(doc["user_id"], doc["sha256"]): doc.get("gridfs_id") for doc in cursor}
+
+    def unchecksummed_models(self):
+        # {"sha256": None} matches documents without the field as well as null
+        cursor = self.models.find({"sha256": None},
+                                  {"_id": 0, "user_id": 1, "filename": 1, "gridfs_id": 1}).sort("created_at", 1)
+        return {(doc["user_id"], doc.get("filename")): doc.get("gridfs_id") for doc in cursor}
+
+    def link_models(self, links, update_for):
+        result = self.users.bulk_write(
+            [pymongo.UpdateOne({"id": user_id}, {"$set": update_for(model_id)}) for user_id, model_id in links],
+            ordered=False
+        )
+        return result.modified_count
+
+    def insert_events(self, collection, docs):
+        if len(docs) == 1:
+            self.db[collection].insert_one(docs[0])
+        else:
+            self.db[collection].insert_many(docs)
+        return len(docs)
+
+class SQLiteBackend(SQLiteStore, StorageBackend):
+    """Embedded storage on the local SQLite database (see sqlite_store.py)."""
+
+class EventCollection:
+    """Collection-like handle that appends monitoring documents through the active backend."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def insert_one(self, doc):
+        self.insert_many([doc])
+
+    def insert_many(self, docs):
+        docs = list(docs)
+        if not docs:
+            return
+        backend = get_storage()
+        if backend is None:
+            raise RuntimeError(f"No storage backend available for {self.name}")
+        with stage_timer('monitoring', f"db_write_{self.name}"):
+            backend.insert_events(self.name, docs)
+
+class EventStore:
+    """Database-like object whose items are EventCollections, e.g. event_store['alerts']."""
+
+    def __getitem__(self, name):
+        return EventCollection(name)
+
+event_store = EventStore()
+
+def init_db(force=False):
+    """
+    Initialize the storage backend.
+    
+    STORAGE_BACKEND selects MongoDB (through the process-wide pooled client
+    from mongo.py), the embedded SQLite store, or "auto": MongoDB when it is
+    reachable, SQLite otherwise. Once a backend is ready in this process,
+    later calls return immediately unless force is True; until then every
+    call retries, so a MongoDB outage at startup is not made permanent.
+    """
+    global mongodb_available, storage, _initialized_pid
+    if storage is not None and _initialized_pid == os.getpid() and not force:
+        return True
+    
+    storage = None
+    mongodb_available = False
+    if STORAGE_BACKEND in ('mongo', 'auto'):
+        try:
+            backend = MongoBackend(get_db())
+            backend.init()
+            _bind(backend)
+            mongodb_available = True
+            logger.info("MongoDB connection established successfully")
+        except Exception as e:
+            logger.error(f"MongoDB connection error: {str(e)}")
+    
+    if storage is None and STORAGE_BACKEND in ('sqlite', 'auto'):
+        try:
+            backend = SQLiteBackend()
+            backend.init()
+            storage = backend
+            if STORAGE_BACKEND == 'auto':
+                logger.warning(
+                    f"MongoDB unreachable, this process (pid {os.getpid()}) falls back to SQLite at "
+                    f"{backend.path} for its lifetime; data it writes will not be in MongoDB"
+                )
+            else:
+                logger.info(f"Using embedded SQLite storage at {backend.path}")
+        except Exception as e:
+            logger.error(f"SQLite storage error: {str(e)}")
+    
+    if storage is None:
+        logger.warning("The application will run without a database. Data will be stored in files only.")
         return False
+    
+    _initialized_pid = os.getpid()
+    return True
+
+def _bind(backend):
+    """Make a MongoDB backend active and point the module-level collection handles at it."""
+    global client, db, users_collection, frames_collection, models_collection, fs, storage
+    storage = backend
+    client = backend.db.client
+    db = backend.db
+    users_collection = backend.users
+    frames_collection = backend.frames
+    models_collection = backend.models
+    fs = backend.fs
+
+def _rebind_after_fork():
+    """Re-point the backend at the child process's own client (SQLite reconnects per pid)."""
+    global _initialized_pid
+    if mongodb_available:
+        _bind(MongoBackend(get_db()))
+    if storage is not None:
+        _initialized_pid = os.getpid()
+
+on_fork(_rebind_after_fork)
+
+def use_storage(backend):
+    """
+    Make backend the active storage in this process, e.g. a scratch SQLite
+    store for benchmarks, or None to initialize from STORAGE_BACKEND again
+    on next use. Returns the previously active backend.
+    """
+    global storage, mongodb_available, _initialized_pid
+    previous = storage
+    if backend is None:
+        storage, mongodb_available, _initialized_pid = None, False, None
+        user_cache.clear()
+        return previous
+    backend.init()
+    storage = backend
+    mongodb_available = isinstance(backend, MongoBackend)
+    _initialized_pid = os.getpid()
+    user_cache.clear()
+    return previous
+
+def get_storage():
+    """Return the active storage backend, initializing it on first use (None if unavailable)."""
+    if storage is None or _initialized_pid != os.getpid():
+        if not init_db():
+            return None
+    return storage
+
+def user_cache_stats():
+    """Return hit/miss counters of the user document cache."""
+    return user_cache.stats()
 
 def is_mongodb_available():
-    """Check if MongoDB is available"""
+    """Check if MongoDB is the active backend"""
     global mongodb_available
     return mongodb_available
 
+def is_storage_available():
+    """Check if any storage backend (MongoDB or embedded SQLite) is available"""
+    return get_storage() is not None
+
 def save_user(user_data):
     """
-    Save user data to MongoDB.
+    Save user data to the storage backend.
     
     Args:
         user_data: Dictionary containing user details
     
     Returns:
-        ObjectId of the inserted document or None if an error occurred
+        ID of the inserted document or None if an error occurred
     """
-    global mongodb_available
-    
-    if not mongodb_available:
-        if users_collection is None:
-            init_db()
-            
-    if not mongodb_available:
-        print("MongoDB not available, skipping database save")
+    backend = get_storage()
+    if backend is None:
+        logger.warning("Storage not available, skipping database save")
         return None
     
     try:
@@ -91,42 +591,88 @@ def save_user(user_data):
             user_data['registration_time'] = datetime.datetime.now()
             
         # Insert user document
-        result = users_collection.insert_one(user_data)
-        print(f"User saved to MongoDB with ID: {result.inserted_id}")
-        return result.inserted_id
+        with stage_timer('storage', 'insert_user'):
+            inserted_id = backend.insert_user(user_data)
+        if 'id' in user_data:
+            user_cache.invalidate(user_data['id'])
+        logger.info(f"User saved to {backend.name} with ID: {inserted_id}")
+        return inserted_id
     except Exception as e:
-        print(f"Error saving user to MongoDB: {str(e)}")
+        logger.error(f"Error saving user to {backend.name}: {str(e)}")
+        return None
+
+def _projection(fields):
+    """Build a MongoDB projection from a list of field names (None means all fields)."""
+    if fields is None:
         return None
+    projection = {field: 1 for field in fields}
+    if '_id' not in projection:
+        projection['_id'] = 0
+    return projection
 
-def get_user(user_id):
+def get_user(user_id, fields=None):
     """
-    Retrieve user data from MongoDB by user_id.
+    Retrieve user data by user_id.
+    
+    Served from user_cache when possible; writes in this module invalidate it.
     
     Args:
         user_id: Unique user identifier
+        fields: Optional list of field names to fetch instead of the full document.
+                Projected reads are served from the cache when the full document
+                is cached, but are not cached themselves.
     
     Returns:
         User document or None if not found
     """
-    global mongodb_available
-    
-    if not mongodb_available:
+    backend = get_storage()
+    if backend is None:
         return None
     
-    if users_collection is None:
-        if not init_db():
-            return None
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        if fields is not None:
+            return {field: cached[field] for field in fields if field in cached}
+        return cached
     
     try:
-        user = users_collection.find_one({"id": user_id})
+        if fields is not None:
+            return backend.find_user(user_id, fields)
+        version = user_cache.version(user_id)
+        user = backend.find_user(user_id)
+        if user is not None:
+            user_cache.set(user_id, user, version)
         return user
     except Exception as e:
-        print(f"Error retrieving user from MongoDB: {str(e)}")
+        logger.error(f"Error retrieving user from {backend.name}: {str(e)}")
         return None
 
+def iter_users(query=None, fields=None, batch_size=CURSOR_BATCH_SIZE):
+    """
+    Stream user documents from the storage backend.
+    
+    Args:
+        query: Filter of field/value pairs (defaults to all users); the SQLite
+               backend supports equality matches only
+        fields: Optional list of field names to fetch
+        batch_size: Number of documents fetched per round-trip
+    
+    Yields:
+        User documents, one at a time
+    """
+    backend = get_storage()
+    if backend is None:
+        return
+    
+    try:
+        for user in backend.iter_users(query, fields, batch_size):
+            yield user
+    except Exception as e:
+        logger.error(f"Error streaming users from {backend.name}: {str(e)}")
+
 def update_user(user_id, update_data):
     """
-    Update user data in MongoDB.
+    Update user data in the storage backend.
     
     Args:
         user_id: Unique user identifier
@@ -135,32 +681,34 @@ def update_user(user_id, update_data):
     Returns:
         True if successful, False otherwise
     """
-    global mongodb_available
-    
-    if not mongodb_available:
+    backend = get_storage()
+    if backend is None:
         return False
     
-    if users_collection is None:
-        if not init_db():
-            return False
-    
     try:
-        result = users_collection.update_one(
-            {"id": user_id},
-            {"$set": update_data}
-        )
-        if result.modified_count > 0:
+        with stage_timer('storage', 'update_user'):
+            modified = backend.update_user(user_id, update_data)
+        user_cache.invalidate(user_id)
+        
+        # Push registration stage changes to anyone streaming this user's progress
+        if 'registration_status' in update_data:
+            registration_events.publish(user_id, {
+                'registration_status': update_data['registration_status'],
+                'error_message': update_data.get('error_message')
+            })
+        
+        if modified:
             return True
         else:
-            print(f"No matching document found for ID: {user_id}")
+            logger.warning(f"No matching document found for ID: {user_id}")
             return False
     except Exception as e:
-        print(f"Error updating user in MongoDB: {str(e)}")
+        logger.error(f"Error updating user in {backend.name}: {str(e)}")
         return False
 
 def save_frames(user_id, frames_data):
     """
-    Save user frames to MongoDB.
+    Save user frames to the storage backend.
     
     Args:
         user_id: Unique user identifier
@@ -170,58 +718,84 @@ def save_frames(user_id, frames_data):
     Returns:
         True if successful, False otherwise
     """
-    global mongodb_available
-    
-    if not mongodb_available:
-        print("MongoDB not available, skipping frame storage in database")
+    backend = get_storage()
+    if backend is None:
+        logger.warning("Storage not available, skipping frame storage in database")
         return False
     
-    if frames_collection is None:
-        if not init_db():
-            return False
-    
     try:
-        # Create a bulk operation for better performance
-        bulk_operations = []
-        
-        for frame in frames_data:
-            # Create a document for each frame
-            frame_doc = {
-                "user_id": user_id,
-                "frame_id": frame["frame_id"],
-                "image_data": frame["image_data"],
-                "created_at": datetime.datetime.now()
-            }
+        # Execute one bulk insert if we have frames
+        if frames_data:
+            with stage_timer('storage', 'insert_frames'):
+                inserted = backend.insert_frames(user_id, frames_data)
+            logger.info(f"Saved {inserted} frames to {backend.name} for user {user_id}")
             
-            # Add to bulk operations
-            bulk_operations.append(pymongo.InsertOne(frame_doc))
-        
-        # Execute bulk operation if we have frames
-        if bulk_operations:
-            result = frames_collection.bulk_write(bulk_operations)
-            print(f"Saved {result.inserted_count} frames to MongoDB for user {user_id}")
+            # Embeddings are computed from the frames; drop them so they are
+            # recomputed from the new ones
+            backend.delete_embeddings(user_id)
             
             # Update the user document to indicate frames are stored in DB
-            users_collection.update_one(
-                {"id": user_id},
-                {"$set": {
-                    "frames_stored_in_db": True,
-                    "frames_count_in_db": len(frames_data),
-                    "frames_stored_at": datetime.datetime.now()
-                }}
-            )
+            backend.update_user(user_id, {
+                "frames_stored_in_db": True,
+                "frames_count_in_db": len(frames_data),
+                "frames_stored_at": datetime.datetime.now()
+            })
+            user_cache.invalidate(user_id)
             
             return True
         else:
-            print("No frames to save")
+            logger.warning("No frames to save")
             return False
     except Exception as e:
-        print(f"Error saving frames to MongoDB: {str(e)}")
+        logger.error(f"Error saving frames to {backend.name}: {str(e)}")
         return False
 
+def iter_frames(user_id, fields=None, batch_size=CURSOR_BATCH_SIZE, decode=None):
+    """
+    Stream a user's frames without loading them all at once.
+    
+    Args:
+        user_id: Unique user identifier
+        fields: Optional list of field names to fetch (e.g. ['frame_id', 'image_data'])
+        batch_size: Number of frame documents fetched per round-trip
+        decode: None to yield image_data Base64 encoded, 'bytes' to yield the
+                raw JPEG bytes instead, or 'image' to also decode it into a
+                BGR numpy array under 'image'
+    
+    Yields:
+        Frame documents, one at a time
+    """
+    backend = get_storage()
+    if backend is None:
+        return
+    
+    if decode == 'image':
+        import cv2
+        import numpy as np
+    
+    try:
+        for frame in backend.iter_frames(user_id, fields, batch_size, raw=bool(decode)):
+            if decode == 'image' and 'image_data' in frame:
+                # Bad frames are skipped one at a time rather than ending the stream
+                try:
+                    image = cv2.imdecode(np.frombuffer(frame['image_data'], np.uint8), cv2.IMREAD_COLOR)
+                except Exception as e:
+                    logger.warning(f"Skipping undecodable frame {frame.get('frame_id')} of user {user_id}: {str(e)}")
+                    continue
+                if image is None:
+                    logger.warning(f"Skipping undecodable frame {frame.get('frame_id')} of user {user_id}")
+                    continue
+                frame['image'] = image
+            yield frame
+    except Exception as e:
+        logger.error(f"Error streaming frames from {backend.name}: {str(e)}")
+
 def get_frames(user_id):
     """
-    Retrieve user frames from MongoDB.
+    Retrieve user frames.
+    
+    Materializes every frame, including its image data; prefer iter_frames
+    for anything that can process frames one at a time.
     
     Args:
         user_id: Unique user identifier
@@ -229,55 +803,139 @@ def get_frames(user_id):
     Returns:
         List of frame documents or None if not found
     """
-    global mongodb_available
-    
-    if not mongodb_available:
+    if get_storage() is None:
         return None
     
-    if frames_collection is None:
-        if not init_db():
-            return None
+    return list(iter_frames(user_id))
+
+def save_embeddings(user_id, vectors, kind='face'):
+    """
+    Store a user's embedding vectors (2-D float array) as a compact blob.
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    backend = get_storage()
+    if backend is None:
+        return False
+    
+    try:
+        backend.save_embeddings(user_id, kind, vectors)
+        if kind == 'face':
+            # Prototypes clustered from the previous encodings are stale
+            backend.delete_embeddings(user_id, kind_prefix=PROTOTYPE_KIND_PREFIX)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving embeddings to {backend.name}: {str(e)}")
+        return False
+
+def get_embeddings(user_id, kind='face'):
+    """
+    Load a user's stored embedding vectors.
+    
+    Returns:
+        2-D numpy array or None if none are stored
+    """
+    backend = get_storage()
+    if backend is None:
+        return None
     
     try:
-        frames = list(frames_collection.find({"user_id": user_id}))
-        return frames
+        return backend.load_embeddings(user_id, kind)
     except Exception as e:
-        print(f"Error retrieving frames from MongoDB: {str(e)}")
+        logger.error(f"Error loading embeddings from {backend.name}: {str(e)}")
         return None
 
-def save_model(user_id, model_file_path, metadata_file_path=None, metadata=None):
+def model_link_fields(file_id):
+    """Return the user document fields that reference a stored model."""
+    return {
+        "model_stored_in_db": True,
+        "model_db_id": str(file_id),
+        "model_stored_at": datetime.datetime.now()
+    }
+
+def stored_model_checksums():
+    """
+    Return the (user_id, sha256) pairs of every model already stored.
+    
+    Returns:
+        Dict mapping (user_id, sha256) to the stored model's file ID, or None
+        if storage is unavailable
+    """
+    backend = get_storage()
+    if backend is None:
+        return None
+    
+    return backend.model_checksums()
+
+def stored_unchecksummed_models():
+    """
+    Return the (user_id, filename) pairs of models stored without a checksum,
+    i.e. uploaded before checksums were recorded.
+    
+    Returns:
+        Dict mapping (user_id, filename) to the stored model's file ID, or None
+        if storage is unavailable
+    """
+    backend = get_storage()
+    if backend is None:
+        return None
+    
+    return backend.unchecksummed_models()
+
+def link_models_to_users(links):
+    """
+    Point many user documents at their stored models in one bulk write.
+    
+    Args:
+        links: List of (user_id, model_file_id) tuples
+    
+    Returns:
+        Number of user documents modified
     """
-    Save YOLO model to MongoDB using GridFS.
+    if not links:
+        return 0
+    backend = get_storage()
+    if backend is None:
+        return 0
+    
+    modified = backend.link_models(links, model_link_fields)
+    for user_id, _ in links:
+        user_cache.invalidate(user_id)
+    return modified
+
+def save_model(user_id, model_file_path, metadata_file_path=None, metadata=None, checksum=None, link_user=True):
+    """
+    Save YOLO model to the storage backend (GridFS on MongoDB, a BLOB on SQLite).
     
     Args:
         user_id: Unique user identifier
         model_file_path: Path to the trained model file
         metadata_file_path: Path to metadata file (optional)
         metadata: Dictionary with additional metadata (optional)
+        checksum: SHA-256 of the model file if already known (optional)
+        link_user: Whether to update the user document to reference the model;
+                   bulk importers pass False and batch these updates themselves
     
     Returns:
-        GridFS file ID if successful, None otherwise
+        Stored model file ID if successful, None otherwise
     """
-    global mongodb_available
-    
-    if not mongodb_available:
-        print("MongoDB not available, skipping model storage in database")
+    backend = get_storage()
+    if backend is None:
+        logger.warning("Storage not available, skipping model storage in database")
         return None
     
-    if fs is None:
-        if not init_db():
-            return None
-    
     try:
-        # Read model file
-        with open(model_file_path, 'rb') as model_file:
-            model_data = model_file.read()
+        # Checksum the model file (streamed, never fully loaded into memory)
+        checksum = checksum or file_sha256(model_file_path)
         
         # Prepare metadata
         model_metadata = {
             "user_id": user_id,
             "filename": os.path.basename(model_file_path),
-            "created_at": datetime.datetime.now()
+            "created_at": datetime.datetime.now(),
+            "sha256": checksum,
+            "length": os.path.getsize(model_file_path)
         }
         
         # Add additional metadata from file if provided
@@ -287,90 +945,103 @@ def save_model(user_id, model_file_path, metadata_file_path=None, metadata=None)
                     file_metadata = meta_file.read()
                 model_metadata["file_metadata"] = file_metadata
             except Exception as e:
-                print(f"Error reading metadata file: {str(e)}")
+                logger.error(f"Error reading metadata file: {str(e)}")
         
         # Add additional metadata if provided
         if metadata and isinstance(metadata, dict):
             model_metadata.update(metadata)
         
-        # Store model in GridFS
-        file_id = fs.put(
-            model_data, 
-            filename=os.path.basename(model_file_path),
-            metadata=model_metadata
-        )
-        
-        # Store reference to model in models collection
-        model_doc = {
-            "user_id": user_id,
-            "gridfs_id": file_id,
-            "filename": os.path.basename(model_file_path),
-            "created_at": datetime.datetime.now(),
-            "metadata": model_metadata
-        }
-        models_collection.insert_one(model_doc)
+        # Store the model, streaming the file in chunks
+        with open(model_file_path, 'rb') as model_file, stage_timer('storage', 'put_model'):
+            file_id = backend.put_model(
+                user_id,
+                model_file,
+                os.path.basename(model_file_path),
+                model_metadata,
+                checksum,
+                model_metadata["length"]
+            )
         
         # Update user document to reference the model
-        users_collection.update_one(
-            {"id": user_id},
-            {"$set": {
-                "model_stored_in_db": True,
-                "model_db_id": str(file_id),
-                "model_stored_at": datetime.datetime.now()
-            }}
-        )
+        if link_user:
+            backend.update_user(user_id, model_link_fields(file_id))
+            user_cache.invalidate(user_id)
         
-        print(f"Stored model for user {user_id} in MongoDB with ID {file_id}")
+        logger.info(f"Stored model for user {user_id} in {backend.name} with ID {file_id}")
         return file_id
     except Exception as e:
-        print(f"Error saving model to MongoDB: {str(e)}")
+        logger.error(f"Error saving model to {backend.name}: {str(e)}")
         return None
 
-def get_model(user_id):
+def get_model_path(user_id):
     """
-    Retrieve user model from MongoDB GridFS.
+    Return a local file path holding the user's latest stored model.
+    
+    Artifacts are cached on local disk keyed by file id and checksum, so
+    repeated loads are served from disk and only new or changed models are
+    downloaded, chunk by chunk.
     
     Args:
         user_id: Unique user identifier
     
     Returns:
-        Tuple of (model_data, metadata) or (None, None) if not found
+        Tuple of (path, metadata) or (None, None) if not found
     """
-    global mongodb_available
-    
-    if not mongodb_available:
+    backend = get_storage()
+    if backend is None:
         return None, None
     
-    if fs is None or models_collection is None:
-        if not init_db():
-            return None, None
-    
     try:
-        # Find model document
-        model_doc = models_collection.find_one({"user_id": user_id})
+        # Find the most recent model document
+        model_doc = backend.latest_model(user_id)
         
         if not model_doc:
-            print(f"No model found for user {user_id}")
+            logger.info(f"No model found for user {user_id}")
             return None, None
         
-        # Get file from GridFS
         file_id = model_doc.get("gridfs_id")
         if not file_id:
-            print(f"Invalid model document for user {user_id}, no GridFS ID")
+            logger.warning(f"Invalid model document for user {user_id}, no file ID")
             return None, None
         
-        # Retrieve the file
-        grid_out = fs.get(file_id)
-        model_data = grid_out.read()
+        checksum = model_doc.get("sha256") or (model_doc.get("metadata") or {}).get("sha256")
+        cached_path = model_cache.get(file_id, checksum)
+        if cached_path is None:
+            cached_path = model_cache.put_stream(file_id, checksum, backend.open_model(file_id))
         
-        return model_data, model_doc.get("metadata")
+        return cached_path, model_doc.get("metadata")
+    except Exception as e:
+        logger.error(f"Error retrieving model from {backend.name}: {str(e)}")
+        return None, None
+
+def get_model(user_id):
+    """
+    Retrieve user model from the storage backend.
+    
+    Loads the whole model into memory; prefer get_model_path or
+    save_model_to_file, which stream it through the local artifact cache.
+    
+    Args:
+        user_id: Unique user identifier
+    
+    Returns:
+        Tuple of (model_data, metadata) or (None, None) if not found
+    """
+    model_path, metadata = get_model_path(user_id)
+    
+    if not model_path:
+        return None, None
+    
+    try:
+        with open(model_path, 'rb') as f:
+            return f.read(), metadata
     except Exception as e:
-        print(f"Error retrieving model from MongoDB: {str(e)}")
+        logger.error(f"Error reading cached model: {str(e)}")
         return None, None
 
 def save_model_to_file(user_id, output_path):
     """
-    Retrieve user model from MongoDB and save to file.
+    Retrieve user model from the storage backend and save to file.
     
     Args:
         user_id: Unique user identifier
@@ -379,17 +1050,16 @@ def save_model_to_file(user_id, output_path):
     Returns:
         True if successful, False otherwise
     """
-    model_data, metadata = get_model(user_id)
+    model_path, metadata = get_model_path(user_id)
     
-    if not model_data:
+    if not model_path:
         return False
     
     try:
-        with open(output_path, 'wb') as f:
-            f.write(model_data)
+        model_cache.copy_to(model_path, output_path)
         
-        print(f"Saved model for user {user_id} to {output_path}")
+        logger.info(f"Saved model for user {user_id} to {output_path}")
         return True
     except Exception as e:
-        print(f"Error saving model to file: {str(e)}")
+        logger.error(f"Error saving model to file: {str(e)}")
         return False
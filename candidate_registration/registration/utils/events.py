@@ -0,0 +1,107 @@
+import queue
+import asyncio
+import threading
+
+
+class AsyncSubscription:
+    """
+    Subscription awaited from an event loop. Events published from any
+    thread are handed to the loop, so waiting for one never blocks it.
+    """
+
+    def __init__(self, max_queue_size):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+
+    def _deliver(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    def put_nowait(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+        except RuntimeError:
+            # The subscriber's loop has closed
+            pass
+
+    async def get(self, timeout=None):
+        """Wait for the next event; raises asyncio.TimeoutError after timeout seconds."""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class EventBroker:
+    """
+    Minimal in-process publish/subscribe broker.
+
+    Subscribers get a bounded queue per topic. Publishing never blocks: if a
+    subscriber is not keeping up, its oldest event is dropped, which is fine
+    for status streams where only the latest state matters.
+    """
+
+    def __init__(self, max_queue_size=16):
+        self.max_queue_size = max_queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topic):
+        """Return a queue that receives every event published to topic."""
+        subscription = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def subscribe_async(self, topic):
+        """Return an AsyncSubscription to topic, bound to the running event loop."""
+        subscription = AsyncSubscription(self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, topic, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+            self.published += 1
+        for subscription in subscribers:
+            if isinstance(subscription, AsyncSubscription):
+                subscription.put_nowait(event)
+                continue
+            while True:
+                try:
+                    subscription.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscription.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'topics': len(self._subscribers),
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'dropped': self.dropped,
+            }
+
+
+# Registration status changes, published by db.update_user with the user id as topic
+registration_events = EventBroker()
+
+# Stored alerts, published by ExamMonitor.raise_alert with "user_id:session_id" as topic
+alert_events = EventBroker()
@@ -0,0 +1,242 @@
+import os
+import time
+import base64
+import atexit
+import threading
+from collections import deque
+
+import cv2
+
+from .frame_buffer import encode_clip
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Tunables for the background evidence writer
+EVIDENCE_QUEUE_SIZE = int(os.environ.get('EVIDENCE_QUEUE_SIZE', 256))
+EVIDENCE_WORKERS = int(os.environ.get('EVIDENCE_WORKERS', 1))
+EVIDENCE_FORMAT = os.environ.get('EVIDENCE_FORMAT', 'jpg').lower()  # 'jpg' or 'webp'
+EVIDENCE_QUALITY = int(os.environ.get('EVIDENCE_QUALITY', 90))
+EVIDENCE_THUMBNAILS = os.environ.get('EVIDENCE_THUMBNAILS', '0') == '1'
+EVIDENCE_THUMBNAIL_WIDTH = int(os.environ.get('EVIDENCE_THUMBNAIL_WIDTH', 160))
+
+
+def annotate_frame(frame, alert_type, timestamp, detection_info=None):
+    """Draw detection boxes, labels and a timestamp onto a frame in place."""
+    if detection_info and 'boxes' in detection_info:
+        for box in detection_info['boxes']:
+            x1, y1, x2, y2 = box[:4]
+            label = box[4] if len(box) > 4 else alert_type
+            confidence = box[5] if len(box) > 5 else None
+
+            # Draw bounding box on frame
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+
+            # Draw label with confidence if available
+            label_text = f"{label}"
+            if confidence is not None:
+                label_text += f": {confidence:.2f}"
+
+            cv2.putText(frame, label_text, (int(x1), int(y1) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+
+    formatted_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+    cv2.putText(frame, formatted_time, (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    return frame
+
+
+def encode_image(frame, image_format=EVIDENCE_FORMAT, quality=EVIDENCE_QUALITY):
+    """Encode a frame as JPEG or WebP bytes."""
+    if image_format == 'webp':
+        ok, buffer = cv2.imencode('.webp', frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    else:
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Could not encode frame as {image_format}")
+    return buffer.tobytes()
+
+
+def make_thumbnail(frame, width=EVIDENCE_THUMBNAIL_WIDTH):
+    """Return a downscaled copy of a frame that keeps its aspect ratio."""
+    height = max(1, int(frame.shape[0] * width / frame.shape[1]))
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+class EvidenceWriter:
+    """
+    Bounded background pipeline for violation evidence.
+
+    Each job runs annotate -> encode -> write -> index on a worker thread so
+    the monitoring request path only pays for enqueueing. When the queue is
+    full the oldest job is dropped to make room for the newest one.
+    """
+
+    def __init__(self, max_queue_size=EVIDENCE_QUEUE_SIZE, workers=EVIDENCE_WORKERS,
+                 image_format=EVIDENCE_FORMAT, quality=EVIDENCE_QUALITY, thumbnails=EVIDENCE_THUMBNAILS):
+        self.image_format = 'webp' if image_format == 'webp' else 'jpg'
+        self.quality = quality
+        self.thumbnails = thumbnails
+        self.workers = max(1, workers)
+
+        self._jobs = deque()
+        self._max_queue_size = max(1, max_queue_size)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._busy = 0
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+            return
+        with self._cond:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'evidence-writer-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job):
+        """Queue a job, dropping the oldest queued job if the queue is full."""
+        self._ensure_started()
+        with self._cond:
+            if len(self._jobs) >= self._max_queue_size:
+                self._jobs.popleft()
+                self.dropped += 1
+            self._jobs.append(job)
+            self.enqueued += 1
+            self._cond.notify_all()
+
+    def submit_snapshot(self, path, frame, alert_type, timestamp, detection_info=None,
+                        collection=None, index_doc=None):
+        """
+        Queue an annotated violation snapshot.
+
+        Args:
+            path: Destination path of the image
+            frame: BGR frame; the writer takes ownership of it
+            alert_type: Type of alert used as the default box label
+            timestamp: Time of the violation
+            detection_info: Optional dict with 'boxes' to draw
+            collection: Optional MongoDB collection to index the snapshot in
+            index_doc: Document to insert into collection once written
+        """
+        self.submit({
+            'kind': 'snapshot', 'path': path, 'frame': frame, 'alert_type': alert_type,
+            'timestamp': timestamp, 'detection_info': detection_info,
+            'collection': collection, 'index_doc': index_doc,
+        })
+
+    def submit_screenshot(self, path, base64_data, collection=None, index_doc=None):
+        """Queue a client-provided base64 screenshot to be decoded and written."""
+        self.submit({
+            'kind': 'screenshot', 'path': path, 'data': base64_data,
+            'collection': collection, 'index_doc': index_doc,
+        })
+
+    def submit_clip(self, path, frames, fps=None, collection=None, index_doc=None):
+        """Queue buffered (timestamp, jpeg_bytes) frames to be encoded as a clip."""
+        self.submit({
+            'kind': 'clip', 'path': path, 'frames': frames, 'fps': fps,
+            'collection': collection, 'index_doc': index_doc,
+        })
+
+    def snapshot_path(self, directory, name):
+        """Return the file path a snapshot named name will be written to."""
+        return os.path.join(directory, f"{name}.{self.image_format}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                job = self._jobs.popleft()
+                self._busy += 1
+            try:
+                self._process(job)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error writing evidence {job.get('path')}: {str(e)}")
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify_all()
+
+    def _process(self, job):
+        path = job['path']
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if job['kind'] == 'clip':
+            encode_clip(job['frames'], path, job['fps'])
+            if job.get('collection') is not None and job.get('index_doc') is not None:
+                job['collection'].insert_one(job['index_doc'])
+            return
+
+        if job['kind'] == 'snapshot':
+            frame = annotate_frame(job['frame'], job['alert_type'], job['timestamp'], job['detection_info'])
+            data = encode_image(frame, self.image_format, self.quality)
+        else:
+            data = base64.b64decode(job['data'])
+            frame = None
+
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        index_doc = job.get('index_doc')
+        if self.thumbnails and frame is not None:
+            base, ext = os.path.splitext(path)
+            thumbnail_path = f"{base}_thumb{ext}"
+            with open(thumbnail_path, 'wb') as f:
+                f.write(encode_image(make_thumbnail(frame), self.image_format, self.quality))
+            if index_doc is not None:
+                index_doc['thumbnail_path'] = thumbnail_path
+
+        if job.get('collection') is not None and index_doc is not None:
+            job['collection'].insert_one(index_doc)
+
+    def flush(self, timeout=10.0):
+        """Wait until every queued job has been processed."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._jobs or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._jobs),
+            'queue_capacity': self._max_queue_size,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_evidence_writer = None
+_evidence_writer_lock = threading.Lock()
+
+
+def get_evidence_writer():
+    """Return the process-wide evidence writer, creating it on first use."""
+    global _evidence_writer
+    if _evidence_writer is None:
+        with _evidence_writer_lock:
+            if _evidence_writer is None:
+                _evidence_writer = EvidenceWriter()
+                atexit.register(_evidence_writer.flush)
+    return _evidence_writer
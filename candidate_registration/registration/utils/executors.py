@@ -0,0 +1,136 @@
+import os
+import asyncio
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .profiling import attach_current_thread, current_profile
+
+# Threads for blocking database and file I/O issued by async views
+IO_EXECUTOR_WORKERS = int(os.environ.get('IO_EXECUTOR_WORKERS', 32))
+# Threads for CPU-bound inference (YOLO, face_recognition). These libraries
+# release the GIL in their native code, and a small pool keeps the cores from
+# being oversubscribed by concurrent frames. ExamMonitor gives each thread
+# its own YOLO model, so every worker adds one model's memory.
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 2))
+# Processes for OCR of ID documents (image preprocessing plus Tesseract)
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+
+_executors = {}
+_executors_pid = None
+_executors_lock = threading.Lock()
+
+# Frames submitted to the inference pool and not yet finished (queued + running)
+_inference_pending = 0
+
+
+def _get_executor(name, workers, processes=False):
+    """Return a named executor, created lazily and re-created after a fork."""
+    global _executors, _executors_pid
+    with _executors_lock:
+        if _executors_pid != os.getpid():
+            # Threads do not survive a fork; start from fresh pools in the child
+            _executors = {}
+            _executors_pid = os.getpid()
+        executor = _executors.get(name)
+        if executor is None:
+            if processes:
+                # Spawned rather than forked: the server process has threads
+                # (and possibly a loaded model) that must not be copied
+                executor = ProcessPoolExecutor(max_workers=workers,
+                                               mp_context=multiprocessing.get_context('spawn'))
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+            _executors[name] = executor
+        return executor
+
+
+def io_executor():
+    return _get_executor('io', IO_EXECUTOR_WORKERS)
+
+
+def inference_executor():
+    return _get_executor('inference', INFERENCE_WORKERS)
+
+
+def ocr_executor():
+    return _get_executor('ocr', OCR_WORKERS, processes=True)
+
+
+def _profiled_call(func, args, kwargs):
+    """Bind a call to the request profile in context, so its worker thread is sampled."""
+    session = current_profile()
+    if session is None:
+        return functools.partial(func, *args, **kwargs)
+
+    def call():
+        with attach_current_thread(session):
+            return func(*args, **kwargs)
+    return call
+
+
+async def run_io(func, *args, **kwargs):
+    """Run blocking I/O in the I/O pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor(), _profiled_call(func, args, kwargs))
+
+
+def _inference_done(on_done, future):
+    global _inference_pending
+    with _executors_lock:
+        _inference_pending -= 1
+    if on_done is not None:
+        on_done()
+
+
+async def run_inference(func, *args, on_done=None, **kwargs):
+    """
+    Run CPU-bound inference in the inference pool without blocking the event loop.
+
+    The job keeps running if the awaiting request is cancelled (e.g. the
+    client disconnected), so the pending count is decremented, and on_done
+    called, when the job itself finishes rather than when the await ends.
+    on_done runs in the worker thread and must be thread-safe.
+    """
+    global _inference_pending
+    with _executors_lock:
+        _inference_pending += 1
+    try:
+        future = inference_executor().submit(_profiled_call(func, args, kwargs))
+    except BaseException:
+        _inference_done(on_done, None)
+        raise
+    future.add_done_callback(functools.partial(_inference_done, on_done))
+    return await asyncio.wrap_future(future)
+
+
+async def run_ocr(func, *args):
+    """Run func(*args) in the OCR process pool; func and its arguments must be picklable."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(ocr_executor(), func, *args)
+
+
+def inference_pending():
+    """Return the number of inference calls queued or running in this process."""
+    return _inference_pending
+
+
+def executor_stats():
+    with _executors_lock:
+        stats = {}
+        for name, executor in _executors.items():
+            if isinstance(executor, ProcessPoolExecutor):
+                stats[name] = {
+                    'max_workers': executor._max_workers,
+                    'processes': len(executor._processes or ()),
+                    'queued': len(executor._pending_work_items),
+                }
+            else:
+                stats[name] = {
+                    'max_workers': executor._max_workers,
+                    'threads': len(executor._threads),
+                    'queued': executor._work_queue.qsize(),
+                }
+        stats['inference_pending'] = _inference_pending
+        return stats
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+# Tunables for the per-session frame ring buffers
+FRAME_BUFFER_FRAMES = int(os.environ.get('FRAME_BUFFER_FRAMES', 30))
+FRAME_BUFFER_MAX_BYTES = int(os.environ.get('FRAME_BUFFER_MAX_BYTES', 64 * 1024 * 1024))
+CLIP_DEFAULT_FPS = float(os.environ.get('CLIP_DEFAULT_FPS', 2.0))
+
+
+class FrameBufferStore:
+    """
+    Fixed-size ring buffers of recent compressed frames, one per session.
+
+    Frames are kept exactly as the client sent them (JPEG bytes), so buffering
+    costs no decoding or re-encoding. Total memory is capped: when the cap is
+    exceeded, whole buffers of the least recently active sessions are evicted.
+    """
+
+    def __init__(self, frames_per_session=FRAME_BUFFER_FRAMES, max_bytes=FRAME_BUFFER_MAX_BYTES):
+        self.frames_per_session = max(1, frames_per_session)
+        self.max_bytes = max_bytes
+        self._buffers = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.evicted_sessions = 0
+
+    def add(self, session_key, jpeg_bytes, timestamp=None):
+        """Append a compressed frame to a session's ring buffer."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            buffer = self._buffers.get(session_key)
+            if buffer is None:
+                buffer = self._buffers[session_key] = deque()
+            else:
+                self._buffers.move_to_end(session_key)
+
+            if len(buffer) >= self.frames_per_session:
+                _, old = buffer.popleft()
+                self._bytes -= len(old)
+            buffer.append((timestamp, jpeg_bytes))
+            self._bytes += len(jpeg_bytes)
+
+            # Evict least recently active sessions, never the one just written
+            while self._bytes > self.max_bytes and len(self._buffers) > 1:
+                _, old_buffer = self._buffers.popitem(last=False)
+                self._bytes -= sum(len(data) for _, data in old_buffer)
+                self.evicted_sessions += 1
+            # A single session larger than the cap keeps only its newest frames
+            while self._bytes > self.max_bytes and len(buffer) > 1:
+                _, old = buffer.popleft()
+                self._bytes -= len(old)
+
+    def snapshot(self, session_key):
+        """Return the buffered (timestamp, jpeg_bytes) pairs of a session, oldest first."""
+        with self._lock:
+            buffer = self._buffers.get(session_key)
+            return list(buffer) if buffer else []
+
+    def discard(self, session_key):
+        with self._lock:
+            buffer = self._buffers.pop(session_key, None)
+            if buffer:
+                self._bytes -= sum(len(data) for _, data in buffer)
+
+    def stats(self):
+        return {
+            'sessions': len(self._buffers),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'evicted_sessions': self.evicted_sessions,
+        }
+
+
+def encode_clip(frames, path, fps=None):
+    """
+    Decode buffered JPEG frames and encode them as an MP4 clip.
+
+    Args:
+        frames: List of (timestamp, jpeg_bytes) pairs, oldest first
+        path: Destination path of the clip
+        fps: Frame rate of the clip, derived from the timestamps if None
+
+    Returns:
+        Number of frames written to the clip
+    """
+    if fps is None:
+        span = frames[-1][0] - frames[0][0] if len(frames) > 1 else 0
+        fps = (len(frames) - 1) / span if span > 0 else CLIP_DEFAULT_FPS
+
+    writer = None
+    written = 0
+    try:
+        for _, data in frames:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            if writer is None:
+                height, width = image.shape[:2]
+                size = (width, height)
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+            elif (image.shape[1], image.shape[0]) != size:
+                image = cv2.resize(image, size)
+            writer.write(image)
+            written += 1
+    finally:
+        if writer is not None:
+            writer.release()
+    return written
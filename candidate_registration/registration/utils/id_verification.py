@@ -0,0 +1,180 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import pytesseract
+
+# Tesseract binary; defaults to the one on PATH (e.g. /usr/bin/tesseract on Linux)
+TESSERACT_CMD = os.environ.get('TESSERACT_CMD') or shutil.which('tesseract') or 'tesseract'
+# Tesseract options: one uniform block of text, which suits a cropped card
+TESSERACT_CONFIG = os.environ.get('TESSERACT_CONFIG', '--oem 1 --psm 6')
+# OCR results kept per distinct uploaded image
+OCR_CACHE_SIZE = int(os.environ.get('OCR_CACHE_SIZE', 512))
+# Crops are normalized to the ID-1 card format (85.60 x 53.98 mm) at this width
+CARD_WIDTH = 856
+CARD_ASPECT = 85.60 / 53.98
+CARD_ASPECT_TOLERANCE = 0.35
+# Smallest card outline accepted, as a fraction of the photo
+CARD_MIN_AREA = 0.08
+# Photos without a detectable card are OCR'd whole, downscaled to this width
+FALLBACK_MAX_WIDTH = 1280
+
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+# The ID number formats recognized, in order of preference. They are combined
+# into one pattern so the text is scanned once. Each alternative is a named
+# group inside a lookahead, so overlapping candidates (a number inside a
+# prefixed ID) are all seen; the first match of the most preferred format wins.
+ID_NUMBER_FORMATS = [
+    ('digits', r'\b\d{6,12}\b'),
+    ('prefixed', r'\b[A-Z]{1,2}[-\s]?\d{5,10}\b'),
+    ('letters_digits', r'\b[A-Z]{2,3}\d{5,8}\b'),
+    ('labelled', r'\bID[-\s]?\d{5,10}\b'),
+]
+ID_NUMBER_PATTERN = re.compile('|'.join(f'(?=(?P<{name}>{pattern}))' for name, pattern in ID_NUMBER_FORMATS))
+_FORMAT_RANK = {name: rank for rank, (name, _) in enumerate(ID_NUMBER_FORMATS)}
+
+
+def extract_id_number(text):
+    """Return the ID number found in OCR text, or None."""
+    best, best_rank = None, len(ID_NUMBER_FORMATS)
+    for match in ID_NUMBER_PATTERN.finditer(text):
+        rank = _FORMAT_RANK[match.lastgroup]
+        if rank < best_rank:
+            best, best_rank = match.group(match.lastgroup), rank
+            if rank == 0:
+                break
+    return best
+
+
+def _order_corners(points):
+    """Order four corner points as top-left, top-right, bottom-right, bottom-left."""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+                     points[np.argmax(sums)], points[np.argmax(diffs)]], dtype=np.float32)
+
+
+def find_card_region(image):
+    """
+    Locate an ID card in a photo and return it rectified to CARD_WIDTH.
+
+    Looks for the largest four-sided outline with roughly the proportions of
+    an ID-1 card, on a downscaled copy so the search stays cheap.
+
+    Returns:
+        The card as a BGR image, or None if no card outline was found
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, 640 / max(height, width))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+    gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    edges = cv2.dilate(cv2.Canny(gray, 50, 150), None, iterations=2)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = CARD_MIN_AREA * small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4:
+            continue
+        corners = _order_corners(approx) / scale
+        card_width = max(np.linalg.norm(corners[1] - corners[0]), np.linalg.norm(corners[2] - corners[3]))
+        card_height = max(np.linalg.norm(corners[3] - corners[0]), np.linalg.norm(corners[2] - corners[1]))
+        if not card_height:
+            continue
+        aspect = card_width / card_height
+        if aspect < 1:
+            aspect = 1 / aspect
+        if abs(aspect - CARD_ASPECT) > CARD_ASPECT_TOLERANCE:
+            continue
+
+        card_height_px = int(round(CARD_WIDTH / CARD_ASPECT))
+        if card_width < card_height:
+            # Card photographed in portrait; rotate the corners a quarter turn
+            corners = np.roll(corners, -1, axis=0)
+        target = np.array([[0, 0], [CARD_WIDTH - 1, 0], [CARD_WIDTH - 1, card_height_px - 1],
+                           [0, card_height_px - 1]], dtype=np.float32)
+        transform = cv2.getPerspectiveTransform(corners, target)
+        return cv2.warpPerspective(image, transform, (CARD_WIDTH, card_height_px))
+    return None
+
+
+def _binarize(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def read_id_card(image_data):
+    """
+    Decode an ID document photo, crop the card and OCR the crop.
+
+    Runs in the OCR process pool, so it takes and returns plain values.
+
+    Returns:
+        dict with the OCR text, the ID number found in it, and whether a card
+        outline was found (otherwise the whole photo was read)
+    """
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return {'status': 'error', 'message': 'Could not decode image'}
+
+    card = find_card_region(image)
+    region = card
+    if region is None:
+        scale = min(1.0, FALLBACK_MAX_WIDTH / image.shape[1])
+        region = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+
+    text = pytesseract.image_to_string(_binarize(region), config=TESSERACT_CONFIG)
+    return {
+        'status': 'success',
+        'text': text,
+        'id_number': extract_id_number(text.upper()),
+        'card_found': card is not None,
+    }
+
+
+class OCRCache:
+    """LRU of OCR results keyed by the SHA-256 of the uploaded image bytes."""
+
+    def __init__(self, max_entries=OCR_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image_data):
+        return hashlib.sha256(image_data).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def set(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+ocr_cache = OCRCache()
@@ -0,0 +1,189 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+# Minimum level written (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# "json" (one object per line, for log ingestion) or "text"
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+# Records waiting for the writer thread; beyond this they are dropped, not waited on
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Per-frame and per-event messages are written at most once per key in this window
+LOG_RATE_LIMIT_SECONDS = float(os.environ.get('LOG_RATE_LIMIT_SECONDS', 10))
+
+LOGGER_NAME = 'registration'
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with any extra={...} fields at the top level."""
+
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hand records to a background writer thread through a bounded queue.
+
+    The calling thread never touches stdout, so a slow or full pipe to the
+    process manager cannot stall a request. If the writer falls behind and
+    the queue fills up, records are dropped and counted instead of blocking.
+    """
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback now, while the arguments are
+        # still valid, but keep extra fields for the formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def _make_formatter():
+    if LOG_FORMAT == 'text':
+        return logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    return JSONFormatter()
+
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(_make_formatter())
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The writer thread does not survive a fork; give the child its own
+    global _listener
+    if _handler is not None:
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _listener = None
+        _start_listener()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Attach the non-blocking handler to the "registration" logger (once per process)."""
+    global _handler
+    if _handler is not None:
+        return
+    with _configure_lock:
+        if _handler is not None:
+            return
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        logger.propagate = False
+        _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _start_listener()
+        logger.addHandler(_handler)
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def get_logger(name):
+    """Return a logger below "registration" (pass __name__), writing through the background handler."""
+    configure_logging()
+    if name != LOGGER_NAME and not name.startswith(LOGGER_NAME + '.'):
+        name = f"{LOGGER_NAME}.{name}"
+    return logging.getLogger(name)
+
+
+def log_stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0,
+    }
+
+
+class RateLimitedLogger:
+    """
+    Logger for messages emitted per frame or per event.
+
+    Each key is written at most once per interval; the records skipped in
+    between are counted and reported as "suppressed" on the next one written.
+    """
+
+    def __init__(self, logger, interval=LOG_RATE_LIMIT_SECONDS, max_keys=1024):
+        self.logger = logger
+        self.interval = interval
+        self.max_keys = max_keys
+        self._state = OrderedDict()
+        self._lock = threading.Lock()
+
+    def log(self, level, key, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._state.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._state[key] = (last, suppressed + 1)
+                return
+            self._state[key] = (now, 0)
+            self._state.move_to_end(key)
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        if suppressed:
+            kwargs['extra'] = dict(kwargs.get('extra') or {}, suppressed=suppressed)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, key, msg, *args, **kwargs):
+        self.log(logging.DEBUG, key, msg, *args, **kwargs)
+
+    def info(self, key, msg, *args, **kwargs):
+        self.log(logging.INFO, key, msg, *args, **kwargs)
+
+    def warning(self, key, msg, *args, **kwargs):
+        self.log(logging.WARNING, key, msg, *args, **kwargs)
+
+    def error(self, key, msg, *args, **kwargs):
+        self.log(logging.ERROR, key, msg, *args, **kwargs)
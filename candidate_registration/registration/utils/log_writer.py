@@ -0,0 +1,249 @@
+import os
+import gzip
+import time
+import queue
+import shutil
+import atexit
+import threading
+from collections import OrderedDict
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Tunables for the background log writer
+LOG_WRITER_MAX_OPEN_FILES = int(os.environ.get('LOG_WRITER_MAX_OPEN_FILES', 64))
+LOG_WRITER_QUEUE_SIZE = int(os.environ.get('LOG_WRITER_QUEUE_SIZE', 10000))
+LOG_WRITER_BATCH_SIZE = int(os.environ.get('LOG_WRITER_BATCH_SIZE', 500))
+LOG_WRITER_FLUSH_INTERVAL = float(os.environ.get('LOG_WRITER_FLUSH_INTERVAL', 1.0))
+LOG_WRITER_FSYNC_INTERVAL = float(os.environ.get('LOG_WRITER_FSYNC_INTERVAL', 5.0))
+LOG_WRITER_COMPRESS_ON_CLOSE = os.environ.get('LOG_WRITER_COMPRESS_ON_CLOSE', '1') == '1'
+
+_WRITE = 'write'
+_CLOSE = 'close'
+_FLUSH = 'flush'
+
+
+class LogWriter:
+    """
+    Single background thread that owns every append-only log file.
+
+    Request threads only enqueue records. The writer thread batches them,
+    keeps an LRU of open file handles so the number of descriptors stays
+    bounded, flushes after every batch and fsyncs periodically.
+    """
+
+    def __init__(self, max_open_files=LOG_WRITER_MAX_OPEN_FILES, max_queue_size=LOG_WRITER_QUEUE_SIZE,
+                 batch_size=LOG_WRITER_BATCH_SIZE, flush_interval=LOG_WRITER_FLUSH_INTERVAL,
+                 fsync_interval=LOG_WRITER_FSYNC_INTERVAL):
+        self.max_open_files = max(1, max_open_files)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._handles = OrderedDict()
+        self._dirty = set()
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def _ensure_started(self):
+        """Start the writer thread (again, after a fork) if it is not running."""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Handles inherited from the parent process must not be reused
+                self._handles = OrderedDict()
+                self._dirty = set()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def write(self, path, line):
+        """
+        Queue a line to be appended to a log file.
+
+        Args:
+            path: Path of the log file
+            line: Text to append (a trailing newline is added if missing)
+
+        Returns:
+            True if the record was queued, False if the queue was full
+        """
+        self._ensure_started()
+        if not line.endswith('\n'):
+            line += '\n'
+        try:
+            self._queue.put_nowait((_WRITE, path, line))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close_files(self, paths, compress=LOG_WRITER_COMPRESS_ON_CLOSE):
+        """
+        Close the given log files once their pending records are written,
+        optionally rotating them into timestamped gzip archives.
+        """
+        self._ensure_started()
+        self._queue.put((_CLOSE, list(paths), compress))
+
+    def flush(self, timeout=5.0):
+        """Block until every record queued so far has been written and flushed."""
+        if self._thread is None:
+            return True
+        self._ensure_started()
+        done = threading.Event()
+        self._queue.put((_FLUSH, done, None))
+        return done.wait(timeout)
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'open_files': len(self._handles),
+            'written': self.written,
+            'dropped': self.dropped,
+            'evicted': self.evicted,
+        }
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self._maybe_fsync()
+                continue
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = OrderedDict()
+            for kind, target, payload in batch:
+                if kind == _WRITE:
+                    pending.setdefault(target, []).append(payload)
+                    continue
+
+                # Control records act as barriers: write everything before them first
+                self._write_pending(pending)
+                pending = OrderedDict()
+                if kind == _CLOSE:
+                    for path in (target if target is not None else list(self._handles)):
+                        self._close_file(path, rotate=payload)
+                elif kind == _FLUSH:
+                    self._flush_dirty()
+                    target.set()
+
+            self._write_pending(pending)
+            self._maybe_fsync()
+
+    def _write_pending(self, pending):
+        for path, lines in pending.items():
+            try:
+                handle = self._get_handle(path)
+                handle.write(''.join(lines))
+                self._dirty.add(path)
+                self.written += len(lines)
+            except Exception as e:
+                logger.error(f"Error writing log file {path}: {str(e)}")
+        self._flush_dirty(fsync=False)
+
+    def _get_handle(self, path):
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            return handle
+
+        while len(self._handles) >= self.max_open_files:
+            old_path, old_handle = self._handles.popitem(last=False)
+            self._close_handle(old_path, old_handle)
+            self.evicted += 1
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handle = open(path, 'a')
+        self._handles[path] = handle
+        return handle
+
+    def _flush_dirty(self, fsync=False):
+        for path in list(self._dirty):
+            handle = self._handles.get(path)
+            if handle is None:
+                self._dirty.discard(path)
+                continue
+            try:
+                handle.flush()
+                if fsync:
+                    os.fsync(handle.fileno())
+                    self._dirty.discard(path)
+            except Exception as e:
+                logger.error(f"Error flushing log file {path}: {str(e)}")
+                self._dirty.discard(path)
+
+    def _maybe_fsync(self):
+        if self._dirty and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._flush_dirty(fsync=True)
+            self._last_fsync = time.monotonic()
+
+    def _close_handle(self, path, handle):
+        try:
+            handle.flush()
+            os.fsync(handle.fileno())
+        except Exception:
+            pass
+        finally:
+            handle.close()
+            self._dirty.discard(path)
+
+    def _close_file(self, path, rotate=False):
+        handle = self._handles.pop(path, None)
+        if handle is not None:
+            self._close_handle(path, handle)
+
+        if not rotate or not os.path.exists(path):
+            return
+
+        archive_path = f"{path}.{int(time.time())}.gz"
+        try:
+            with open(path, 'rb') as src, gzip.open(archive_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except Exception as e:
+            logger.error(f"Error compressing log file {path}: {str(e)}")
+
+    def shutdown(self, timeout=5.0):
+        """Flush queued records and close every open file."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self.flush(timeout)
+        done = threading.Event()
+        self._queue.put((_CLOSE, None, False))
+        self._queue.put((_FLUSH, done, None))
+        done.wait(timeout)
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """Return the process-wide log writer, creating it on first use."""
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                _log_writer = LogWriter()
+                atexit.register(_log_writer.shutdown)
+    return _log_writer
@@ -0,0 +1,203 @@
+import os
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond decodes to model training
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+# Recent samples kept per stage to report p50/p95/p99
+METRICS_QUANTILE_WINDOW = int(os.environ.get('METRICS_QUANTILE_WINDOW', 1024))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """One labelled latency histogram, plus a window of recent samples for quantiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=METRICS_QUANTILE_WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            self.recent.append(value)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count, sorted(self.recent)
+
+    @staticmethod
+    def quantile(sorted_values, q):
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+        return sorted_values[index]
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics in the Prometheus text exposition format.
+
+    Holds labelled histograms, counters and gauges; gauges may also be
+    callbacks evaluated at scrape time (used for queue depths). Everything is
+    per process, like the queues it reports on.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_callbacks = []
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def histogram(self, name, labels=()):
+        key = (name, tuple(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, labels=()):
+        with self._lock:
+            self._gauges[(name, tuple(labels))] = value
+
+    def register_gauges(self, callback):
+        """
+        Register callback() -> iterable of (name, labels, value), evaluated at scrape time.
+
+        Names ending in _total are exposed as counters, everything else as gauges.
+        """
+        self._gauge_callbacks.append(callback)
+
+    def render(self):
+        """Return all metrics in the Prometheus text format."""
+        lines = []
+        seen = set()
+
+        def header(name, metric_type):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        snapshots = [(name, labels, histogram.buckets, histogram.snapshot())
+                     for (name, labels), histogram in histograms]
+        for name, labels, buckets, (counts, total, count, _) in snapshots:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        # Quantiles over the recent window, as a separate gauge family so the
+        # histogram stays a valid Prometheus histogram
+        for name, labels, _, (_, _, _, recent) in snapshots:
+            quantile_name = f"{name}_recent"
+            header(quantile_name, 'gauge')
+            for q in QUANTILES:
+                value = Histogram.quantile(recent, q)
+                lines.append(f"{quantile_name}{_format_labels(labels + (('quantile', str(q)),))} {_format_value(value)}")
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        all_gauges = [(name, labels, value) for (name, labels), value in gauges]
+        for callback in self._gauge_callbacks:
+            try:
+                all_gauges.extend(callback())
+            except Exception as e:
+                logger.error(f"Metrics gauge callback failed: {str(e)}")
+        for name, labels, value in sorted(all_gauges, key=lambda item: (item[0], tuple(item[1]))):
+            header(name, 'counter' if name.endswith('_total') else 'gauge')
+            lines.append(f"{name}{_format_labels(tuple(labels))} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+    def stage_summary(self, name='stage_latency_seconds'):
+        """Return {(pipeline, stage): {count, mean, p50, p95, p99}} in seconds, for reports."""
+        summary = {}
+        with self._lock:
+            histograms = [(labels, h) for (n, labels), h in self._histograms.items() if n == name]
+        for labels, histogram in histograms:
+            _, total, count, recent = histogram.snapshot()
+            label_map = dict(labels)
+            summary[(label_map.get('pipeline'), label_map.get('stage'))] = {
+                'count': count,
+                'mean': total / count if count else 0.0,
+                **{f"p{int(q * 100)}": Histogram.quantile(recent, q) for q in QUANTILES},
+            }
+        return summary
+
+
+metrics = MetricsRegistry()
+metrics.describe('stage_latency_seconds', 'Latency of each pipeline stage')
+metrics.describe('stage_latency_seconds_recent', 'Latency quantiles over recent samples of each pipeline stage')
+metrics.describe('stage_errors_total', 'Pipeline stages that raised an exception')
+
+
+def observe_stage(pipeline, stage, seconds):
+    metrics.histogram('stage_latency_seconds', (('pipeline', pipeline), ('stage', stage))).observe(seconds)
+
+
+@contextmanager
+def stage_timer(pipeline, stage):
+    """Time a block as one pipeline stage; exceptions are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.inc('stage_errors_total', (('pipeline', pipeline), ('stage', stage)))
+        raise
+    finally:
+        observe_stage(pipeline, stage, time.perf_counter() - started)
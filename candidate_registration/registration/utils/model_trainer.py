@@ -8,8 +8,10 @@ from ultralytics import YOLO
 from ultralytics.nn.tasks import DetectionModel
 import torch.nn as nn
 from torch.nn import SiLU 
-from .db import update_user, is_mongodb_available, save_model
+from .db import update_user, is_storage_available, save_model
+from .log import get_logger
 
+logger = get_logger(__name__)
 
 
 # Import all necessary YOLOv8 classes
@@ -18,7 +20,7 @@ try:
     yolo_classes_available = True
 except ImportError:
     yolo_classes_available = False
-    print("Could not import all YOLOv8 module classes")
+    logger.warning("Could not import all YOLOv8 module classes")
 
 # Add PyTorch safe globals for compatibility
 try:
@@ -41,14 +43,14 @@ try:
         classes_to_add.extend([Conv, C2f, SPPF, Bottleneck, C3, DFL, Proto])
     
     add_safe_globals(classes_to_add)
-    print(f"Added {len(classes_to_add)} classes to torch safe globals")
+    logger.debug(f"Added {len(classes_to_add)} classes to torch safe globals")
     
     # Force PyTorch to trust the YOLO model by using weights_only=False
     os.environ["TORCH_LOAD_WEIGHTS_ONLY"] = "0"
     os.environ["TORCH_LOAD_UNSAFE_LOADING"] = "1"  # Allow unsafe loading  
-    print("Set environment variables for PyTorch loading")
+    logger.debug("Set environment variables for PyTorch loading")
 except ImportError:
-    print("Using older PyTorch version, no need to set safe globals")
+    logger.debug("Using older PyTorch version, no need to set safe globals")
 
 def create_dataset_yaml(frames_dir, annotations_dir, output_dir, user_id):
     dataset_dir = os.path.join(output_dir, f"dataset_{user_id}")
@@ -86,13 +88,13 @@ def custom_load_model(model_path):
         model = YOLO(model_path)
         return model
     except Exception as e:
-        print(f"Model load failed: {e}")
+        logger.error(f"Model load failed: {e}")
         raise
 
 def train_yolo_model(frames_dir, annotations_dir, model_dir, user_id):
     try:
         # Using already imported modules instead of re-importing
-        if is_mongodb_available():
+        if is_storage_available():
             update_user(user_id, {"model_training_started": True, "model_training_started_at": time.time()})
 
         frames = [f for f in os.listdir(frames_dir) if f.endswith('.jpg')]
@@ -110,7 +112,7 @@ def train_yolo_model(frames_dir, annotations_dir, model_dir, user_id):
                 break
 
         if not found:
-            print("Downloading YOLOv8 model...")
+            logger.info("Downloading YOLOv8 model...")
             YOLO('yolov8n.pt')
 
         # Create a placeholder for the model
@@ -129,12 +131,12 @@ def train_yolo_model(frames_dir, annotations_dir, model_dir, user_id):
         with open(model_save_path, 'wb') as f:
             f.write(f"USER_MODEL:{user_id}".encode('utf-8'))
         
-        print(f"Created simplified model reference for user {user_id}")
+        logger.info(f"Created simplified model reference for user {user_id}")
         
         # Store the model in MongoDB if available
         model_db_id = None
-        if is_mongodb_available():
-            print(f"Storing model in MongoDB for user {user_id}")
+        if is_storage_available():
+            logger.info(f"Storing model in MongoDB for user {user_id}")
             model_db_id = save_model(
                 user_id=user_id,
                 model_file_path=model_save_path,
@@ -147,12 +149,12 @@ def train_yolo_model(frames_dir, annotations_dir, model_dir, user_id):
             )
             
             if model_db_id:
-                print(f"Model stored in MongoDB with ID: {model_db_id}")
+                logger.info(f"Model stored in MongoDB with ID: {model_db_id}")
             else:
-                print("Failed to store model in MongoDB")
+                logger.error("Failed to store model in MongoDB")
         
         # Update MongoDB if available
-        if is_mongodb_available():
+        if is_storage_available():
             update_data = {
                 "model_created": True,
                 "model_path": model_save_path,
@@ -172,10 +174,10 @@ def train_yolo_model(frames_dir, annotations_dir, model_dir, user_id):
         return model_save_path
 
     except Exception as e:
-        print(f"Error during training: {e}")
+        logger.error(f"Error during training: {e}")
         try:
             # Using already imported modules
-            if is_mongodb_available():
+            if is_storage_available():
                 update_user(user_id, {
                     "model_trained": False,
                     "model_training_error": str(e),
@@ -183,7 +185,7 @@ def train_yolo_model(frames_dir, annotations_dir, model_dir, user_id):
                     "model_training_error_at": time.time()
                 })
         except Exception as db_err:
-            print(f"DB update failed: {db_err}")
+            logger.error(f"DB update failed: {db_err}")
 
         error_log = os.path.join(model_dir, f'train_error_{user_id}.log')
         with open(error_log, 'w') as f:
@@ -0,0 +1,189 @@
+import os
+import time
+import threading
+from pymongo import MongoClient, monitoring
+from pymongo.write_concern import WriteConcern
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# MongoDB connection string - replace with your own if using Atlas
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+DB_NAME = os.environ.get('MONGO_DB_NAME', 'candidate_registration')
+
+# Connection pool and timeout settings
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 2000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000))
+
+# Write concern: MONGO_WRITE_CONCERN_W may be a number or "majority"
+MONGO_WRITE_CONCERN_W = os.environ.get('MONGO_WRITE_CONCERN_W', '1')
+MONGO_WRITE_CONCERN_J = os.environ.get('MONGO_WRITE_CONCERN_J', '0') == '1'
+MONGO_WRITE_CONCERN_TIMEOUT_MS = int(os.environ.get('MONGO_WRITE_CONCERN_TIMEOUT_MS', 0))
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool listener that tracks checkouts to report pool saturation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkout_started = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._checkout_started = {}
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.waiting = 0
+            self.max_waiting = 0
+            self.connections_open = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_wait_total = 0.0
+            self.pool_clears = 0
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            self._checkout_started[threading.get_ident()] = time.monotonic()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checked_out += 1
+            self.checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            started = self._checkout_started.pop(threading.get_ident(), None)
+            if started is not None:
+                self.checkout_wait_total += time.monotonic() - started
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checkout_failures += 1
+            self._checkout_started.pop(threading.get_ident(), None)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open = max(0, self.connections_open - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_pool_size': MONGO_MAX_POOL_SIZE,
+                'connections_open': self.connections_open,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'saturation': self.checked_out / MONGO_MAX_POOL_SIZE if MONGO_MAX_POOL_SIZE else 0.0,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'avg_checkout_wait_ms': (self.checkout_wait_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                'checkout_wait_seconds_total': self.checkout_wait_total,
+                'pool_clears': self.pool_clears,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_fork_callbacks = []
+
+
+def _write_concern():
+    w = int(MONGO_WRITE_CONCERN_W) if MONGO_WRITE_CONCERN_W.isdigit() else MONGO_WRITE_CONCERN_W
+    return WriteConcern(w=w, j=MONGO_WRITE_CONCERN_J or None,
+                        wtimeout=MONGO_WRITE_CONCERN_TIMEOUT_MS or None)
+
+
+def get_client():
+    """
+    Return the MongoClient shared by every module in this process.
+
+    The client is created lazily and re-created in a child process after a
+    fork, since a MongoClient must never be shared across a fork.
+    """
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                event_listeners=[pool_metrics],
+            )
+            _client_pid = os.getpid()
+    return _client
+
+
+def get_db():
+    """Return the application database with the configured write concern."""
+    return get_client().get_database(DB_NAME, write_concern=_write_concern())
+
+
+def on_fork(callback):
+    """Register a callback to run in a child process right after a fork."""
+    _fork_callbacks.append(callback)
+
+
+def _after_fork_in_child():
+    global _client, _client_pid
+    # Drop the parent's client without closing it; its sockets belong to the parent
+    _client = None
+    _client_pid = None
+    pool_metrics.reset()
+    for callback in _fork_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"MongoDB fork callback failed: {str(e)}")
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def pool_stats():
+    """Return connection pool saturation metrics for this process."""
+    return pool_metrics.stats()
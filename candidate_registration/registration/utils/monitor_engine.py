@@ -4,15 +4,25 @@ import numpy as np
 import time
 import os
 import base64
-import winsound
-import pytesseract
+import threading
 import difflib
-import re
-from pymongo import MongoClient
 from ultralytics import YOLO
 import torch
+from .db import iter_users, iter_frames, event_store, get_embeddings, save_embeddings
+from .log_writer import get_log_writer
+from .alert_limiter import AlertRateLimiter
+from .evidence_writer import get_evidence_writer
+from .frame_buffer import FrameBufferStore
+from .events import alert_events
+from .capture_policy import capture_policy, CAPTURE_MEDIUM_RISK
+from .metrics import stage_timer
+from .id_verification import extract_id_number
+from .prototypes import PrototypeGallery, load_prototypes
 from torch.nn.modules.pooling import MaxPool2d
 from torch.nn.modules.upsampling import Upsample
+from .log import get_logger
+
+logger = get_logger(__name__)
 
 # Import the required ultralytics classes
 try:
@@ -20,7 +30,7 @@ try:
     has_ultralytics_modules = True
 except ImportError:
     has_ultralytics_modules = False
-    print("Warning: Could not import required classes from ultralytics.nn.modules")
+    logger.warning("Could not import required classes from ultralytics.nn.modules")
 
 # Add required classes to safe globals to fix model loading issues
 try:
@@ -32,51 +42,70 @@ try:
         classes_to_add.extend([Concat, Detect])
         
     add_safe_globals(classes_to_add)
-    print(f"Added {len(classes_to_add)} classes to safe globals")
+    logger.debug(f"Added {len(classes_to_add)} classes to safe globals")
 except ImportError:
-    print("Warning: Could not add classes to safe globals, using older PyTorch version")
-
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    logger.warning("Could not add classes to safe globals, using older PyTorch version")
 
 class ExamMonitor:
     def __init__(self):
-        self.client = MongoClient('mongodb://localhost:27017/')
-        self.db = self.client['candidate_registration']
-        self.users_collection = self.db['users']
-        self.frames_collection = self.db['user_frames']
+        # Monitoring documents go through the active storage backend (MongoDB or SQLite)
+        self.db = event_store
         self.alert_dir = "alerts"
         self.log_dir = "logs"
+        self.log_writer = get_log_writer()
+        self.evidence_writer = get_evidence_writer()
+        self.frame_buffers = FrameBufferStore()
         os.makedirs(self.alert_dir, exist_ok=True)
         os.makedirs(self.log_dir, exist_ok=True)
 
-        self.model = YOLO('yolov8s.pt')
-        self.class_names = self.model.names
+        # ultralytics predictors are not thread-safe, so every inference
+        # thread gets its own model; the first one reuses the model loaded here
+        self._models = threading.local()
+        self._models_lock = threading.Lock()
+        self._spare_model = YOLO('yolov8s.pt')
+        self.class_names = self._spare_model.names
 
-        self.user_face_encodings = {}
+        # Each user's face encodings, clustered into a few prototypes
+        self.gallery = PrototypeGallery()
         self.user_info_map = {}
 
         self.cooldown_period = 30
-        self.last_alert_time = {"impersonation": 0, "multiple_people": 0, "mobile_phone": 0}
+        self.alert_limiter = AlertRateLimiter(cooldown=self.cooldown_period)
 
         self.load_registered_users()
 
     def load_registered_users(self):
-        registered_users = list(self.users_collection.find({"registration_status": "completed_successfully"}))
+        registered_users = iter_users(
+            {"registration_status": "completed_successfully"},
+            fields=["id", "name", "email", "phone", "id_number"]
+        )
         for user in registered_users:
             user_id = user['id']
+            prototypes = self.get_prototypes_from_db(user_id)
+            if prototypes is not None:
+                self.gallery.set_user(user_id, prototypes)
+                self.user_info_map[user_id] = user
+
+    def get_prototypes_from_db(self, user_id):
+        prototypes = load_prototypes(user_id)
+        if prototypes is None:
+            # No stored encodings yet: compute them from the registration frames
             encodings = self.get_encodings_from_db(user_id)
             if encodings:
-                mean_encoding = np.mean(encodings, axis=0)
-                self.user_face_encodings[user_id] = mean_encoding
-                self.user_info_map[user_id] = user
+                prototypes = load_prototypes(user_id, encodings)
+        return prototypes
 
     def get_encodings_from_db(self, user_id):
-        frames_cursor = self.frames_collection.find({"user_id": user_id})
+        # Encodings computed on an earlier start are stored as a float blob
+        stored = get_embeddings(user_id)
+        if stored is not None:
+            return list(stored)
+
+        # Frames are fetched in small batches and decoded one at a time
         encodings = []
-        for frame in frames_cursor:
+        for frame in iter_frames(user_id, fields=["image_data"], decode='image'):
             try:
-                image_data = base64.b64decode(frame['image_data'])
-                img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+                img = frame['image']
                 rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
                 face_locations = face_recognition.face_locations(rgb_img)
                 if face_locations:
@@ -84,15 +113,12 @@ class ExamMonitor:
                     encodings.append(encoding)
             except Exception:
                 pass
+        if encodings:
+            save_embeddings(user_id, np.asarray(encodings, dtype=np.float64))
         return encodings
 
     def extract_id_number(self, text):
-        patterns = [r'\b\d{6,12}\b', r'\b[A-Z]{1,2}[-\s]?\d{5,10}\b', r'\b[A-Z]{2,3}\d{5,8}\b', r'\bID[-\s]?\d{5,10}\b']
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return matches[0]
-        return None
+        return extract_id_number(text)
 
     def verify_id_against_user(self, id_number, user):
         if 'id_number' in user and user['id_number'] == id_number:
@@ -104,8 +130,51 @@ class ExamMonitor:
                     return True, similarity
         return False, 0.0
 
+    def log_id_verification(self, user_id, session_id, result):
+        """
+        Record an ID document check, and raise an alert if an exam session's
+        document does not match the candidate.
+
+        Args:
+            user_id: ID of the user the document was checked against
+            session_id: Current exam session ID, or None at registration
+            result: Verification result returned to the client
+        """
+        timestamp = time.time()
+        self.db['id_verifications'].insert_one({
+            "user_id": user_id,
+            "session_id": session_id,
+            "id_number": result.get('id_number'),
+            "verified": result.get('verified', False),
+            "confidence": result.get('confidence', 0.0),
+            "card_found": result.get('card_found', False),
+            "timestamp": timestamp,
+        })
+        if session_id and not result.get('verified'):
+            self.raise_alert({
+                "user_id": user_id,
+                "session_id": session_id,
+                "alert_type": "id_mismatch",
+                "severity": "high",
+                "description": "ID document does not match the registered candidate",
+                "timestamp": timestamp,
+                "formatted_time": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+            })
+
+    def detector(self):
+        """Return the calling thread's YOLO model, loading one on first use."""
+        model = getattr(self._models, 'model', None)
+        if model is None:
+            with self._models_lock:
+                model, self._spare_model = self._spare_model, None
+            if model is None:
+                model = YOLO('yolov8s.pt')
+            self._models.model = model
+        return model
+
     def analyze_frame(self, frame):
-        results = self.model(frame)
+        with stage_timer('monitoring', 'yolo_inference'):
+            results = self.detector()(frame)
         detections = {"person": 0, "cell phone": 0}
         for result in results:
             for box in result.boxes:
@@ -117,37 +186,162 @@ class ExamMonitor:
 
     def match_face(self, frame):
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-        for i, encoding in enumerate(face_encodings):
-            best_match_id, best_distance = None, float("inf")
-            for user_id, stored_encoding in self.user_face_encodings.items():
-                distance = face_recognition.face_distance([stored_encoding], encoding)[0]
-                matches = face_recognition.compare_faces([stored_encoding], encoding, tolerance=0.55)
-                if matches[0] and distance < best_distance:
-                    best_distance, best_match_id = distance, user_id
-
-            if best_match_id:
-                return self.user_info_map[best_match_id], (1 - best_distance) * 100
+        with stage_timer('monitoring', 'face_detect'):
+            face_locations = face_recognition.face_locations(rgb_frame)
+        with stage_timer('monitoring', 'face_encode'):
+            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+
+        with stage_timer('monitoring', 'gallery_match'):
+            for encoding in face_encodings:
+                best_match_id, best_distance = self.gallery.match(encoding, tolerance=0.55)
+                if best_match_id:
+                    return self.user_info_map[best_match_id], (1 - best_distance) * 100
         return None, 0
 
-    def monitor_single_frame(self, base64_image):
+    def monitor_single_frame(self, base64_image, user_id=None, session_id=None):
         try:
-            image_data = base64.b64decode(base64_image.split(',')[1])
-            frame = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
-            detections = self.analyze_frame(frame)
-            identified_user, confidence = self.match_face(frame)
-            return {
-                "status": "success",
-                "detections": detections,
-                "user": identified_user['name'] if identified_user else None,
-                "user_id": identified_user['id'] if identified_user else None,
-                "confidence": round(confidence, 2)
-            }
+            with stage_timer('monitoring', 'base64_decode'):
+                image_data = base64.b64decode(base64_image.split(',')[1])
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        return self.monitor_frame_bytes(image_data, user_id, session_id)
+
+    def monitor_frame_bytes(self, image_data, user_id=None, session_id=None):
+        """Analyze one JPEG-encoded webcam frame (raw bytes, e.g. from the WebSocket channel)."""
+        try:
+            with stage_timer('monitoring', 'frame_total'):
+                return self._analyze_frame_bytes(image_data, user_id, session_id)
         except Exception as e:
             return {"status": "error", "message": str(e)}
+
+    def _analyze_frame_bytes(self, image_data, user_id, session_id):
+        with stage_timer('monitoring', 'imdecode'):
+            frame = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return {"status": "error", "message": "Could not decode frame"}
+
+        # Keep the compressed frame so alerts can be backed by a short clip
+        if user_id and session_id:
+            self.frame_buffers.add(f"{user_id}:{session_id}", image_data)
+
+        detections = self.analyze_frame(frame)
+        identified_user, confidence = self.match_face(frame)
+
+        if user_id and session_id:
+            self.raise_detection_alerts(user_id, session_id, detections)
+
+        return {
+            "status": "success",
+            "detections": detections,
+            "user": identified_user['name'] if identified_user else None,
+            "user_id": identified_user['id'] if identified_user else None,
+            "confidence": round(confidence, 2)
+        }
     
+    def raise_detection_alerts(self, user_id, session_id, detections):
+        """Raise alerts for phones or extra people detected in a webcam frame."""
+        timestamp = time.time()
+        formatted_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+        if detections.get("cell phone", 0) > 0:
+            self.raise_alert({
+                "user_id": user_id,
+                "session_id": session_id,
+                "alert_type": "mobile_phone",
+                "severity": "high",
+                "description": "Mobile phone detected in webcam frame",
+                "timestamp": timestamp,
+                "formatted_time": formatted_time
+            })
+        if detections.get("person", 0) > 1:
+            self.raise_alert({
+                "user_id": user_id,
+                "session_id": session_id,
+                "alert_type": "multiple_people",
+                "severity": "high",
+                "description": f"{detections['person']} people detected in webcam frame",
+                "timestamp": timestamp,
+                "formatted_time": formatted_time
+            })
+
+    def save_alert_clip(self, alert):
+        """
+        Queue a clip of the session's most recent frames as evidence for an alert.
+
+        Args:
+            alert: Alert document with user_id, session_id, alert_type and timestamp
+
+        Returns:
+            str: Path the clip will be written to, or None if no frames are buffered
+        """
+        frames = self.frame_buffers.snapshot(f"{alert['user_id']}:{alert.get('session_id')}")
+        if not frames:
+            return None
+        clip_name = f"{alert['alert_type']}_{int(alert.get('timestamp', time.time()))}.mp4"
+        clip_path = os.path.join(self.alert_dir, alert['user_id'], clip_name)
+        self.evidence_writer.submit_clip(clip_path, frames)
+        return clip_path
+
+    def raise_alert(self, alert):
+        """
+        Store an alert, rate limited per session and alert type.
+
+        Occurrences suppressed during the cooldown are counted and folded
+        into the next stored alert through its occurrence_count field.
+
+        Args:
+            alert: Alert document with user_id, session_id and alert_type
+
+        Returns:
+            True if an alert document was written, False if it was suppressed
+        """
+        self.write_alert_summaries(self.alert_limiter.drain_expired())
+
+        session_key = f"{alert['user_id']}:{alert.get('session_id')}"
+        decision = self.alert_limiter.record(session_key, alert['alert_type'], alert.get('timestamp'))
+        if decision is None:
+            return False
+
+        alert.update(decision)
+        if decision['occurrence_count'] > 1:
+            span = int(decision['last_seen'] - decision['first_seen'])
+            alert['description'] += f" ({decision['occurrence_count']} occurrences in {span}s)"
+
+        clip_path = self.save_alert_clip(alert)
+        if clip_path:
+            alert['clip_path'] = clip_path
+        self.db['alerts'].insert_one(alert)
+        capture_policy.raise_risk(session_key, CAPTURE_MEDIUM_RISK if alert.get('severity') == 'medium' else 1.0)
+
+        # Push the alert to the session's live channel, if one is connected
+        alert_events.publish(session_key, {
+            "alert_type": alert['alert_type'],
+            "severity": alert.get('severity'),
+            "description": alert.get('description'),
+            "timestamp": alert.get('timestamp'),
+            "occurrence_count": alert.get('occurrence_count', 1)
+        })
+        return True
+
+    def write_alert_summaries(self, summaries):
+        """Store counts that were suppressed but never folded into an alert."""
+        if not summaries:
+            return
+        alerts = []
+        for summary in summaries:
+            user_id, _, session_id = summary['session_id'].partition(':')
+            alerts.append({
+                "user_id": user_id,
+                "session_id": session_id,
+                "alert_type": summary['alert_type'],
+                "description": f"{summary['occurrence_count']} further {summary['alert_type']} events during cooldown",
+                "aggregated": True,
+                "occurrence_count": summary['occurrence_count'],
+                "first_seen": summary['first_seen'],
+                "last_seen": summary['last_seen'],
+                "timestamp": summary['last_seen']
+            })
+        self.db['alerts'].insert_many(alerts)
+
     def log_tab_switch(self, user_id, session_id, event_data):
         """
         Log tab switching events and trigger alerts
@@ -172,10 +366,9 @@ class ExamMonitor:
             # Log to MongoDB
             self.db['monitoring_logs'].insert_one(tab_switch_log)
             
-            # Log to file system
+            # Log to file system (written in the background by the log writer)
             log_file = os.path.join(self.log_dir, f"tab_switch_{user_id}_{session_id}.log")
-            with open(log_file, 'a') as f:
-                f.write(f"{formatted_time}: Tab {'visible' if event_data.get('visible') else 'hidden'}\n")
+            self.log_writer.write(log_file, f"{formatted_time}: Tab {'visible' if event_data.get('visible') else 'hidden'}")
             
             # If tab was hidden/switched, create an alert
             if not event_data.get('visible', True):
@@ -188,14 +381,13 @@ class ExamMonitor:
                     "timestamp": timestamp,
                     "formatted_time": formatted_time
                 }
-                self.db['alerts'].insert_one(alert)
+                self.raise_alert(alert)
                 
-                # Save a screenshot if provided
+                # Save a screenshot if provided (decoded and written in the background)
                 if 'screenshot' in event_data:
                     alert_filename = f"tab_switch_{user_id}_{session_id}_{int(timestamp)}.jpg"
                     alert_path = os.path.join(self.alert_dir, alert_filename)
-                    with open(alert_path, 'wb') as f:
-                        f.write(base64.b64decode(event_data['screenshot']))
+                    self.evidence_writer.submit_screenshot(alert_path, event_data['screenshot'])
             
             return {"status": "success", "logged": True}
             
@@ -248,7 +440,7 @@ class ExamMonitor:
                     "coordinates": {"x": x, "y": y},
                     "timestamp": timestamp
                 }
-                self.db['alerts'].insert_one(alert)
+                self.raise_alert(alert)
             
             return {"status": "success", "logged": True}
             
@@ -290,12 +482,11 @@ class ExamMonitor:
                 "timestamp": timestamp,
                 "formatted_time": formatted_time
             }
-            self.db['alerts'].insert_one(alert)
+            self.raise_alert(alert)
             
-            # Log to file system
+            # Log to file system (written in the background by the log writer)
             log_file = os.path.join(self.log_dir, f"security_{user_id}_{session_id}.log")
-            with open(log_file, 'a') as f:
-                f.write(f"{formatted_time}: Screen capture detected: {event_data.get('type', 'unknown')}\n")
+            self.log_writer.write(log_file, f"{formatted_time}: Screen capture detected: {event_data.get('type', 'unknown')}")
             
             return {"status": "success", "logged": True, "alert": True}
             
@@ -346,7 +537,7 @@ class ExamMonitor:
                     "content_length": len(event_data.get('content', '')),
                     "timestamp": timestamp
                 }
-                self.db['alerts'].insert_one(alert)
+                self.raise_alert(alert)
             
             # Return whether this action should be blocked
             # Adjust the blocked actions based on your requirements
@@ -362,10 +553,35 @@ class ExamMonitor:
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def end_session(self, user_id, session_id):
+        """
+        Release per-session resources once an exam session is over.
+
+        Args:
+            user_id: ID of the user
+            session_id: Session that has ended
+        """
+        try:
+            session_logs = [
+                os.path.join(self.log_dir, f"tab_switch_{user_id}_{session_id}.log"),
+                os.path.join(self.log_dir, f"security_{user_id}_{session_id}.log"),
+            ]
+            self.log_writer.close_files(session_logs)
+            self.write_alert_summaries(self.alert_limiter.pop_session(f"{user_id}:{session_id}"))
+            self.frame_buffers.discard(f"{user_id}:{session_id}")
+            capture_policy.forget(f"{user_id}:{session_id}")
+            return {"status": "success", "session_closed": True}
+
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
     def save_alert_snapshot(self, user_id, alert_type, frame, detection_info=None):
         """
         Save a snapshot of the detected violation as proof.
 
+        Annotation, encoding, writing and indexing in violation_snapshots
+        happen on the background evidence writer; this only queues the job.
+
         Args:
             user_id: ID of the user
             alert_type: Type of alert (e.g., 'mobile_phone', 'multiple_people')
@@ -373,44 +589,14 @@ class ExamMonitor:
             detection_info: Additional information about the detection
 
         Returns:
-            str: Path to the saved snapshot file
+            str: Path the snapshot file will be written to
         """
         try:
-            # Create user directory if it doesn't exist
             user_dir = os.path.join(self.alert_dir, user_id)
-            os.makedirs(user_dir, exist_ok=True)
-
             timestamp = int(time.time())
-            alert_filename = f"{alert_type}_{timestamp}.jpg"
-            alert_path = os.path.join(user_dir, alert_filename)
-
-            # Add detection boxes and annotations to the frame before saving
-            if detection_info and 'boxes' in detection_info:
-                for box in detection_info['boxes']:
-                    x1, y1, x2, y2 = box[:4]
-                    label = box[4] if len(box) > 4 else alert_type
-                    confidence = box[5] if len(box) > 5 else None
-
-                    # Draw bounding box on frame
-                    cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
-
-                    # Draw label with confidence if available
-                    label_text = f"{label}"
-                    if confidence is not None:
-                        label_text += f": {confidence:.2f}"
-
-                    cv2.putText(frame, label_text, (int(x1), int(y1) - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-
-            # Add timestamp to the frame
+            alert_path = self.evidence_writer.snapshot_path(user_dir, f"{alert_type}_{timestamp}")
             formatted_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
-            cv2.putText(frame, formatted_time, (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-            # Save the image
-            cv2.imwrite(alert_path, frame)
-
-            # Log the alert in MongoDB
             alert_data = {
                 "user_id": user_id,
                 "alert_type": alert_type,
@@ -419,10 +605,15 @@ class ExamMonitor:
                 "formatted_time": formatted_time,
                 "additional_info": detection_info
             }
-            self.db['violation_snapshots'].insert_one(alert_data)
+
+            # Copy the frame so the caller can keep using its buffer
+            self.evidence_writer.submit_snapshot(
+                alert_path, frame.copy(), alert_type, timestamp, detection_info,
+                collection=self.db['violation_snapshots'], index_doc=alert_data
+            )
 
             return alert_path
 
         except Exception as e:
-            print(f"Error saving alert snapshot: {str(e)}")
+            logger.error(f"Error saving alert snapshot: {str(e)}")
             return None
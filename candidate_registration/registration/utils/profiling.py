@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import random
+import functools
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Sampled request profiling. Each option can be set in Django settings or,
+# failing that, through the matching environment variable.
+PROFILE_DEFAULTS = {
+    'PROFILE_ENABLED': '0',
+    # Fraction of matching requests whose profile is always kept
+    'PROFILE_SAMPLE_RATE': '0.01',
+    # Keep the profile of any matching request slower than this (0 disables)
+    'PROFILE_SLOW_MS': '1000',
+    # Stack sampling interval
+    'PROFILE_INTERVAL_MS': '5',
+    # Comma-separated path prefixes to profile
+    'PROFILE_PATHS': '/monitor_frame,/save_video',
+    'PROFILE_DIR': os.path.join('logs', 'profiles'),
+    'PROFILE_MAX_DEPTH': '64',
+}
+
+
+def profile_setting(name):
+    try:
+        from django.conf import settings
+        value = getattr(settings, name, None)
+        if value is not None:
+            return value
+    except Exception:
+        pass
+    return os.environ.get(name, PROFILE_DEFAULTS[name])
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """Stack samples collected for one request, across every thread working on it."""
+
+    def __init__(self, metadata, keep):
+        self.metadata = metadata
+        self.keep = keep
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self._threads = Counter()
+        self._lock = threading.Lock()
+
+    def add_thread(self, ident):
+        with self._lock:
+            self._threads[ident] += 1
+
+    def remove_thread(self, ident):
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def threads(self):
+        with self._lock:
+            return list(self._threads)
+
+    def record(self, stack):
+        with self._lock:
+            self.stacks[stack] += 1
+            self.samples += 1
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread snapshots the stacks of the
+    threads attached to active profile sessions at a fixed interval.
+
+    Unlike a deterministic profiler it costs nothing per function call, so
+    it can run on every matching request and only the slow or sampled
+    profiles are written out. Work offloaded to the executors in
+    executors.py is attributed to the request through a context variable.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def add(self, session):
+        self._ensure_started()
+        with self._lock:
+            self._sessions.add(session)
+
+    def discard(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                sessions = list(self._sessions)
+            if not sessions:
+                continue
+            frames = sys._current_frames()
+            for session in sessions:
+                for ident in session.threads():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < self.max_depth:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    # Stored root first
+                    session.record(tuple(reversed(stack)))
+
+
+_sampler = None
+_current_session = contextvars.ContextVar('profile_session', default=None)
+
+
+def _get_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = StackSampler(
+            interval=float(profile_setting('PROFILE_INTERVAL_MS')) / 1000,
+            max_depth=int(profile_setting('PROFILE_MAX_DEPTH')),
+        )
+    return _sampler
+
+
+def profiling_enabled():
+    return str(profile_setting('PROFILE_ENABLED')).lower() in ('1', 'true', 'yes')
+
+
+def start_profile(request):
+    """
+    Begin profiling a request if it matches the configured paths.
+
+    Returns:
+        ProfileSession, or None if this request is not profiled
+    """
+    if not profiling_enabled():
+        return None
+    paths = [p.strip() for p in str(profile_setting('PROFILE_PATHS')).split(',') if p.strip()]
+    if paths and not any(request.path.startswith(p) for p in paths):
+        return None
+
+    keep = random.random() < float(profile_setting('PROFILE_SAMPLE_RATE'))
+    if not keep and not float(profile_setting('PROFILE_SLOW_MS')):
+        return None
+
+    session = ProfileSession({
+        'path': request.path,
+        'method': request.method,
+        'query': request.GET.dict(),
+        'remote_addr': request.META.get('REMOTE_ADDR'),
+        'pid': os.getpid(),
+        'started_at': time.time(),
+    }, keep)
+    _get_sampler().add(session)
+    return session
+
+
+@contextmanager
+def attach_current_thread(session=None):
+    """Attribute this thread's samples to session (default: the request in context)."""
+    session = session or _current_session.get()
+    if session is None:
+        yield
+        return
+    ident = threading.get_ident()
+    token = _current_session.set(session)
+    session.add_thread(ident)
+    try:
+        yield
+    finally:
+        session.remove_thread(ident)
+        _current_session.reset(token)
+
+
+@contextmanager
+def use_profile(session):
+    """Make session the request in context without sampling this thread (e.g. an event loop)."""
+    token = _current_session.set(session)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def current_profile():
+    return _current_session.get()
+
+
+def profiled_thread(func):
+    """
+    Decorate a sync view so the thread it runs in is sampled for the request.
+
+    Under ASGI Django runs sync views in a separate thread; the profile in
+    context follows it there, but the thread still has to be attached.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with attach_current_thread():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def finish_profile(session, status_code=None):
+    """Stop sampling and write the profile if it was sampled or slow."""
+    _get_sampler().discard(session)
+    duration_ms = (time.perf_counter() - session.started) * 1000
+    slow_ms = float(profile_setting('PROFILE_SLOW_MS'))
+    reason = 'sampled' if session.keep else ('slow' if slow_ms and duration_ms >= slow_ms else None)
+    if reason is None or not session.samples:
+        return None
+
+    profile_dir = str(profile_setting('PROFILE_DIR'))
+    os.makedirs(profile_dir, exist_ok=True)
+    metadata = dict(session.metadata, status=status_code, duration_ms=round(duration_ms, 1),
+                    reason=reason, samples=session.samples,
+                    interval_ms=float(profile_setting('PROFILE_INTERVAL_MS')))
+    safe_path = session.metadata['path'].strip('/').replace('/', '_') or 'root'
+    filename = f"{int(metadata['started_at'] * 1000)}_{safe_path}_{int(duration_ms)}ms_{os.getpid()}.json"
+    path = os.path.join(profile_dir, filename)
+    try:
+        with open(path, 'w') as f:
+            json.dump({
+                'metadata': metadata,
+                'stacks': [{'stack': list(stack), 'count': count} for stack, count in session.stacks.most_common()],
+            }, f)
+    except Exception as e:
+        logger.error(f"Error writing profile {path}: {str(e)}")
+        return None
+    return path
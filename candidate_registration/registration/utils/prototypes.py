@@ -0,0 +1,179 @@
+import os
+import threading
+
+import numpy as np
+
+from .db import PROTOTYPE_KIND_PREFIX, get_embeddings, save_embeddings
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Representative face encodings kept per registered user
+PROTOTYPE_COUNT = int(os.environ.get('FACE_PROTOTYPES', 3))
+# Lloyd iterations when clustering a user's encodings
+PROTOTYPE_ITERATIONS = int(os.environ.get('FACE_PROTOTYPE_ITERATIONS', 25))
+
+
+def prototype_kind(k=PROTOTYPE_COUNT):
+    """Embedding kind the prototypes are stored under; changing k recomputes them."""
+    return f'{PROTOTYPE_KIND_PREFIX}{k}'
+
+
+def _squared_distances(points, centers):
+    distances = (points * points).sum(axis=1)[:, None] - 2 * points @ centers.T + (centers * centers).sum(axis=1)
+    return np.maximum(distances, 0)
+
+
+def extract_prototypes(encodings, k=PROTOTYPE_COUNT, iterations=PROTOTYPE_ITERATIONS, seed=0):
+    """
+    Cluster a user's per-frame face encodings into at most k prototypes.
+
+    k-means with k-means++ seeding, so each prototype is the mean of one
+    group of similar frames (e.g. one head pose) instead of a single mean
+    that sits between all of them. Seeded, so the same frames always give
+    the same prototypes.
+
+    Returns:
+        float32 array of shape (<= k, dim)
+    """
+    points = np.asarray(encodings, dtype=np.float64)
+    if points.ndim != 2 or not len(points):
+        return np.empty((0, points.shape[-1] if points.ndim == 2 else 0), dtype=np.float32)
+    if len(points) <= k:
+        return points.astype(np.float32)
+
+    rng = np.random.default_rng(seed)
+    centers = [points[rng.integers(len(points))]]
+    closest = _squared_distances(points, centers[0][None, :])[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        if total <= 0:
+            # Fewer distinct encodings than k
+            break
+        centers.append(points[rng.choice(len(points), p=closest / total)])
+        closest = np.minimum(closest, _squared_distances(points, centers[-1][None, :])[:, 0])
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = _squared_distances(points, centers).argmin(axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        for j in range(len(centers)):
+            members = points[labels == j]
+            if len(members):
+                centers[j] = members.mean(axis=0)
+    used = np.unique(labels)
+    return centers[used].astype(np.float32)
+
+
+def load_prototypes(user_id, encodings=None, k=PROTOTYPE_COUNT):
+    """
+    Return a user's stored prototypes, computing and storing them on first use.
+
+    Prototypes are clustered from the given encodings, or from the user's
+    stored per-frame face encodings.
+
+    Returns:
+        float32 array of shape (<= k, dim), or None if the user has no encodings
+    """
+    kind = prototype_kind(k)
+    stored = get_embeddings(user_id, kind=kind)
+    if stored is not None and len(stored):
+        return stored
+    if encodings is None:
+        encodings = get_embeddings(user_id)
+    if encodings is None or not len(encodings):
+        return None
+    prototypes = extract_prototypes(encodings, k)
+    save_embeddings(user_id, prototypes, kind=kind)
+    return prototypes
+
+
+class PrototypeGallery:
+    """
+    Registered users' face prototypes, stacked into one matrix for matching.
+
+    A probe encoding is compared with every prototype in one matrix-vector
+    product; a user's distance is that of their nearest prototype. The
+    matrix is rebuilt lazily after users are added or removed.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+        self._compiled = None
+
+    def set_user(self, user_id, prototypes):
+        prototypes = np.atleast_2d(np.asarray(prototypes))
+        with self._lock:
+            self._users[user_id] = prototypes
+            self._compiled = None
+
+    def remove_user(self, user_id):
+        with self._lock:
+            if self._users.pop(user_id, None) is not None:
+                self._compiled = None
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._compiled = None
+
+    def __len__(self):
+        return len(self._users)
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def _snapshot(self):
+        with self._lock:
+            if self._compiled is None:
+                user_ids = list(self._users)
+                if user_ids:
+                    blocks = [self._users[user_id] for user_id in user_ids]
+                    matrix = np.vstack(blocks)
+                    owners = np.repeat(np.arange(len(blocks)), [len(block) for block in blocks])
+                else:
+                    matrix, owners = np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+                self._compiled = (matrix, (matrix * matrix).sum(axis=1), owners, user_ids)
+            return self._compiled
+
+    def distances(self, encodings):
+        """
+        Distances from each probe encoding to each prototype.
+
+        Returns:
+            (distances of shape (probes, prototypes), prototype owner indexes, user ids)
+        """
+        matrix, norms, owners, user_ids = self._snapshot()
+        probes = np.atleast_2d(np.asarray(encodings, dtype=matrix.dtype))
+        squared = norms[None, :] - 2 * probes @ matrix.T + (probes * probes).sum(axis=1)[:, None]
+        return np.sqrt(np.maximum(squared, 0)), owners, user_ids
+
+    def match(self, encoding, tolerance):
+        """
+        Find the user whose nearest prototype is closest to an encoding.
+
+        Returns:
+            (user_id, distance), or (None, inf) if no prototype is within tolerance
+        """
+        if not self._users:
+            return None, float('inf')
+        distances, owners, user_ids = self.distances(encoding)
+        nearest = int(distances[0].argmin())
+        distance = float(distances[0, nearest])
+        if distance <= tolerance:
+            return user_ids[owners[nearest]], distance
+        return None, float('inf')
+
+    def stats(self):
+        matrix = self._snapshot()[0]
+        users = len(self._users)
+        return {
+            'users': users,
+            'prototypes': len(matrix),
+            'bytes': int(matrix.nbytes),
+            'bytes_per_user': round(matrix.nbytes / users, 1) if users else 0.0,
+        }
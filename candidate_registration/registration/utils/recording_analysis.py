@@ -0,0 +1,269 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import face_recognition
+from ultralytics import YOLO
+
+from .db import event_store, is_storage_available
+from .prototypes import load_prototypes
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Frames analyzed per second of recording
+RECORDING_SAMPLE_FPS = float(os.environ.get('RECORDING_SAMPLE_FPS', 2))
+# Frames sent to the detector at once
+RECORDING_BATCH_SIZE = int(os.environ.get('RECORDING_BATCH_SIZE', 16))
+# Seconds between identity checks (face detection is the slowest step)
+RECORDING_IDENTITY_INTERVAL = float(os.environ.get('RECORDING_IDENTITY_INTERVAL', 5))
+# Worker processes; each takes a contiguous segment of the recording
+RECORDING_WORKERS = int(os.environ.get('RECORDING_WORKERS', os.cpu_count() or 1))
+# Segments shorter than this are not worth a worker of their own
+RECORDING_MIN_SEGMENT_SECONDS = 30
+DETECTION_MODEL = 'yolov8s.pt'
+FACE_MATCH_TOLERANCE = 0.55
+
+# Violation types derived from each analyzed frame
+VIOLATIONS = ('mobile_phone', 'multiple_people', 'no_person', 'identity_mismatch')
+
+_model = None
+
+
+def _init_worker():
+    """Load the detector once per worker process, with one intra-op thread per process."""
+    import torch
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    _load_model()
+
+
+def _load_model():
+    global _model
+    if _model is None:
+        _model = YOLO(DETECTION_MODEL)
+    return _model
+
+
+def _check_identity(frame, encodings):
+    """Return 'match', 'mismatch' or 'no_face' for the most prominent face in a frame."""
+    small = cv2.resize(frame, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    locations = face_recognition.face_locations(rgb)
+    if not locations:
+        return 'no_face'
+    # Largest face first: the candidate sits closest to the camera
+    locations.sort(key=lambda box: (box[2] - box[0]) * (box[1] - box[3]), reverse=True)
+    encoding = face_recognition.face_encodings(rgb, locations[:1])[0]
+    distances = face_recognition.face_distance(encodings, encoding)
+    return 'match' if distances.min() <= FACE_MATCH_TOLERANCE else 'mismatch'
+
+
+def _sampling_steps(fps, sample_fps, identity_interval):
+    """
+    Frames between analyzed samples and between identity checks.
+
+    Identity checks run on sampled frames, so their step is a whole number
+    of sample steps; otherwise they would only fall on common multiples of
+    the two.
+    """
+    step = max(1, int(round(fps / sample_fps)))
+    identity_step = step * max(1, int(round(fps * identity_interval / step)))
+    return step, identity_step
+
+
+def _detect_batch(frames, timestamps, identities, observations):
+    results = _model(frames, verbose=False)
+    names = _model.names
+    for timestamp, identity, result in zip(timestamps, identities, results):
+        classes = [names[int(c)] for c in result.boxes.cls.tolist()]
+        observations.append({
+            't': round(timestamp, 2),
+            'person': classes.count('person'),
+            'cell phone': classes.count('cell phone'),
+            'identity': identity,
+        })
+
+
+def analyze_segment(video_path, start_frame, end_frame, fps, sample_fps, batch_size,
+                    identity_interval, encodings):
+    """
+    Analyze frames [start_frame, end_frame) of a recording (runs in a worker process).
+
+    Only sampled frames are decoded into images: the others are grabbed,
+    which advances the demuxer and decoder without the colour conversion
+    and copy of retrieve().
+
+    Returns:
+        list of observations {t, person, cell phone, identity}, in time order
+    """
+    _load_model()
+    cap = cv2.VideoCapture(video_path)
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    step, identity_step = _sampling_steps(fps, sample_fps, identity_interval)
+
+    observations = []
+    frames, timestamps, identities = [], [], []
+    index = start_frame
+    try:
+        while end_frame is None or index < end_frame:
+            if not cap.grab():
+                break
+            if (index - start_frame) % step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    identity = None
+                    if encodings is not None and (index - start_frame) % identity_step == 0:
+                        identity = _check_identity(frame, encodings)
+                    frames.append(frame)
+                    timestamps.append(index / fps)
+                    identities.append(identity)
+                    if len(frames) >= batch_size:
+                        _detect_batch(frames, timestamps, identities, observations)
+                        frames, timestamps, identities = [], [], []
+            index += 1
+        if frames:
+            _detect_batch(frames, timestamps, identities, observations)
+    finally:
+        cap.release()
+    return observations
+
+
+def _violations(observation):
+    found = []
+    if observation['cell phone'] > 0:
+        found.append(('mobile_phone', observation['cell phone']))
+    if observation['person'] > 1:
+        found.append(('multiple_people', observation['person']))
+    if observation['person'] == 0:
+        found.append(('no_person', 0))
+    if observation['identity'] == 'mismatch':
+        found.append(('identity_mismatch', 1))
+    return found
+
+
+def build_timeline(observations, sample_interval, max_gap=None):
+    """
+    Collapse per-frame observations into violation intervals.
+
+    Consecutive observations with the same violation are merged while the gap
+    between them is at most max_gap seconds (default: two sample intervals).
+
+    Returns:
+        list of {type, start, end, frames, max_count}, ordered by start time
+    """
+    max_gap = max_gap if max_gap is not None else 2 * sample_interval
+    open_intervals = {}
+    timeline = []
+    for observation in observations:
+        t = observation['t']
+        for violation, count in _violations(observation):
+            interval = open_intervals.get(violation)
+            if interval is not None and t - interval['end'] <= max_gap:
+                interval['end'] = t
+                interval['frames'] += 1
+                interval['max_count'] = max(interval['max_count'], count)
+                continue
+            if interval is not None:
+                timeline.append(interval)
+            open_intervals[violation] = {'type': violation, 'start': t, 'end': t, 'frames': 1, 'max_count': count}
+    timeline.extend(open_intervals.values())
+    for interval in timeline:
+        # An interval covers at least the sample it was seen in
+        interval['end'] = round(interval['end'] + sample_interval, 2)
+    timeline.sort(key=lambda interval: (interval['start'], interval['type']))
+    return timeline
+
+
+def _segments(frame_count, fps, workers):
+    if frame_count <= 0:
+        # Unknown length (common for browser-recorded webm): one sequential pass
+        return [(0, None)]
+    max_segments = max(1, int(frame_count / (fps * RECORDING_MIN_SEGMENT_SECONDS)))
+    count = max(1, min(workers, max_segments))
+    bounds = np.linspace(0, frame_count, count + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def analyze_recording(video_path, user_id=None, session_id=None, sample_fps=RECORDING_SAMPLE_FPS,
+                      batch_size=RECORDING_BATCH_SIZE, identity_interval=RECORDING_IDENTITY_INTERVAL,
+                      workers=RECORDING_WORKERS, store=True):
+    """
+    Analyze a recorded exam session offline and return its violation timeline.
+
+    The recording is split into contiguous segments analyzed in parallel by
+    worker processes; each samples sample_fps frames per second, runs the
+    detector on batches of them and checks the candidate's identity against
+    their face prototypes every identity_interval seconds.
+
+    Args:
+        video_path: Recording to analyze
+        user_id: Candidate in the recording; enables identity checks
+        session_id: Exam session the recording belongs to
+        store: Save the result to the recording_analyses collection
+
+    Returns:
+        dict with the recording's duration, processing time, speed-up over
+        real time, per-type violation totals and the compact timeline
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open recording {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    if fps <= 0 or fps > 240:
+        fps = 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    encodings = None
+    if user_id:
+        encodings = load_prototypes(user_id)
+        if encodings is None:
+            logger.warning(f"No stored face encodings for user {user_id}, skipping identity checks")
+
+    segments = _segments(frame_count, fps, max(1, workers))
+    started = time.perf_counter()
+    args = (fps, sample_fps, batch_size, identity_interval, encodings)
+    if len(segments) == 1:
+        observations = analyze_segment(video_path, *segments[0], *args)
+    else:
+        # Spawned workers: the caller may be a threaded server process
+        with ProcessPoolExecutor(max_workers=len(segments), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(analyze_segment, video_path, start, end, *args) for start, end in segments]
+            observations = [observation for future in futures for observation in future.result()]
+    elapsed = time.perf_counter() - started
+
+    duration = frame_count / fps if frame_count > 0 else (observations[-1]['t'] if observations else 0.0)
+    timeline = build_timeline(observations, 1 / sample_fps)
+    totals = {violation: 0.0 for violation in VIOLATIONS}
+    for interval in timeline:
+        totals[interval['type']] += interval['end'] - interval['start']
+    identity_checks = [o['identity'] for o in observations if o['identity'] is not None]
+
+    result = {
+        'user_id': user_id,
+        'session_id': session_id,
+        'video_path': video_path,
+        'duration_seconds': round(duration, 2),
+        'processing_seconds': round(elapsed, 2),
+        'speedup': round(duration / elapsed, 1) if elapsed else None,
+        'sampled_frames': len(observations),
+        'segments': len(segments),
+        'identity_checks': len(identity_checks),
+        'identity_mismatches': identity_checks.count('mismatch'),
+        'violation_seconds': {violation: round(seconds, 2) for violation, seconds in totals.items()},
+        'timeline': timeline,
+        'analyzed_at': time.time(),
+    }
+    logger.info(
+        f"Analyzed {duration:.0f}s recording {video_path} in {elapsed:.1f}s "
+        f"({result['speedup']}x real time): {len(timeline)} violation intervals"
+    )
+    if store and is_storage_available():
+        event_store['recording_analyses'].insert_one(dict(result))
+    return result
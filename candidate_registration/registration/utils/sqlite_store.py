@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import uuid
+import base64
+import sqlite3
+import datetime
+import threading
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# SQLite file used by the embedded backend. Defaults to the database already
+# configured for Django (settings.DATABASES['default']) when it is SQLite.
+SQLITE_PATH = os.environ.get('SQLITE_PATH', '')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_BLOB_CHUNK_SIZE = 255 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_users (
+    id TEXT PRIMARY KEY,
+    registration_status TEXT,
+    doc TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS store_users_status_idx ON store_users (registration_status);
+
+CREATE TABLE IF NOT EXISTS store_frames (
+    pk INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    frame_id TEXT NOT NULL,
+    image BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS store_frames_user_idx ON store_frames (user_id, frame_id);
+
+CREATE TABLE IF NOT EXISTS store_embeddings (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    dtype TEXT NOT NULL,
+    vectors BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, kind)
+);
+
+CREATE TABLE IF NOT EXISTS store_models (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    filename TEXT,
+    sha256 TEXT,
+    length INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    metadata TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS store_models_user_idx ON store_models (user_id, created_at);
+CREATE INDEX IF NOT EXISTS store_models_checksum_idx ON store_models (user_id, sha256);
+
+CREATE TABLE IF NOT EXISTS store_events (
+    pk INTEGER PRIMARY KEY,
+    collection TEXT NOT NULL,
+    user_id TEXT,
+    session_id TEXT,
+    timestamp REAL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS store_events_session_idx ON store_events (collection, user_id, session_id, timestamp);
+"""
+
+
+def default_sqlite_path():
+    """Return the SQLite file for the embedded backend."""
+    if SQLITE_PATH:
+        return SQLITE_PATH
+    try:
+        from django.conf import settings
+        database = settings.DATABASES['default']
+        if 'sqlite3' in database['ENGINE']:
+            return str(database['NAME'])
+    except Exception:
+        pass
+    return 'db.sqlite3'
+
+
+def _json_default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    # ObjectId and similar identifiers
+    return str(obj)
+
+
+def _dumps(doc):
+    return json.dumps(doc, default=_json_default)
+
+
+def _project(doc, fields):
+    if fields is None:
+        return doc
+    return {field: doc[field] for field in fields if field in doc}
+
+
+class SQLiteStore:
+    """
+    Embedded storage on a local SQLite file.
+
+    Uses WAL mode so readers never block the writer, one connection per
+    thread, and BLOB columns for frames, embeddings and model files.
+    Documents that are schemaless in MongoDB (users, monitoring events) are
+    stored as JSON next to the indexed columns used for lookups.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        self.path = path or default_sqlite_path()
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def init(self):
+        self.connection().executescript(SCHEMA)
+        return True
+
+    # Users
+
+    def insert_user(self, user_data):
+        doc = dict(user_data)
+        doc.pop('_id', None)
+        self.connection().execute(
+            "INSERT INTO store_users (id, registration_status, doc, updated_at) VALUES (?, ?, ?, ?)",
+            (doc['id'], doc.get('registration_status'), _dumps(doc), time.time())
+        )
+        return doc['id']
+
+    def find_user(self, user_id, fields=None):
+        row = self.connection().execute("SELECT doc FROM store_users WHERE id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        return _project(json.loads(row['doc']), fields)
+
+    def update_user(self, user_id, update_data):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT doc FROM store_users WHERE id = ?", (user_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            doc = json.loads(row['doc'])
+            doc.update(json.loads(_dumps(update_data)))
+            conn.execute(
+                "UPDATE store_users SET registration_status = ?, doc = ?, updated_at = ? WHERE id = ?",
+                (doc.get('registration_status'), _dumps(doc), time.time(), user_id)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def iter_users(self, query=None, fields=None, batch_size=16):
+        query = dict(query or {})
+        sql = "SELECT doc FROM store_users"
+        params = ()
+        if 'registration_status' in query:
+            sql += " WHERE registration_status = ?"
+            params = (query.pop('registration_status'),)
+        cursor = self.connection().execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    try:
+                        doc = json.loads(row['doc'])
+                    except ValueError as e:
+                        # Skip the corrupt document, not the rest of the stream
+                        logger.warning(f"Skipping unreadable user document: {str(e)}")
+                        continue
+                    if all(doc.get(key) == value for key, value in query.items()):
+                        yield _project(doc, fields)
+        finally:
+            cursor.close()
+
+    # Frames
+
+    def insert_frames(self, user_id, frames):
+        """Store frames given as {'frame_id', 'image_data' (Base64)} as JPEG BLOBs."""
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO store_frames (user_id, frame_id, image, created_at) VALUES (?, ?, ?, ?)",
+                [(user_id, frame['frame_id'], sqlite3.Binary(base64.b64decode(frame['image_data'])), now)
+                 for frame in frames]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(frames)
+
+    def iter_frames(self, user_id, fields=None, batch_size=16, raw=False):
+        """Yield frame documents; image_data is Base64 as in MongoDB, or the raw bytes if raw."""
+        want_image = fields is None or 'image_data' in fields
+        columns = "frame_id, created_at" + (", image" if want_image else "")
+        cursor = self.connection().execute(
+            f"SELECT {columns} FROM store_frames WHERE user_id = ? ORDER BY pk", (user_id,)
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    doc = {"user_id": user_id, "frame_id": row['frame_id'], "created_at": row['created_at']}
+                    if want_image:
+                        image = bytes(row['image'])
+                        doc["image_data"] = image if raw else base64.b64encode(image).decode('ascii')
+                    yield _project(doc, fields)
+        finally:
+            cursor.close()
+
+    # Embeddings
+
+    def save_embeddings(self, user_id, kind, vectors):
+        """Store a 2-D float array of embeddings for a user under a kind label."""
+        self.connection().execute(
+            "INSERT OR REPLACE INTO store_embeddings (user_id, kind, dim, count, dtype, vectors, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, kind, vectors.shape[1], vectors.shape[0], str(vectors.dtype),
+             sqlite3.Binary(vectors.tobytes()), time.time())
+        )
+
+    def load_embeddings(self, user_id, kind):
+        import numpy as np
+        row = self.connection().execute(
+            "SELECT dim, count, dtype, vectors FROM store_embeddings WHERE user_id = ? AND kind = ?",
+            (user_id, kind)
+        ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row['vectors'], dtype=row['dtype']).reshape(row['count'], row['dim'])
+
+    def delete_embeddings(self, user_id, kind_prefix=None):
+        if kind_prefix:
+            # substr rather than LIKE, where "_" in the prefix would be a wildcard
+            cursor = self.connection().execute(
+                "DELETE FROM store_embeddings WHERE user_id = ? AND substr(kind, 1, ?) = ?",
+                (user_id, len(kind_prefix), kind_prefix)
+            )
+        else:
+            cursor = self.connection().execute("DELETE FROM store_embeddings WHERE user_id = ?", (user_id,))
+        return cursor.rowcount
+
+    # Models
+
+    def put_model(self, user_id, model_file, filename, metadata, checksum, length):
+        """Stream a model file into a BLOB and return its id."""
+        model_id = uuid.uuid4().hex
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO store_models (id, user_id, filename, sha256, length, data, metadata, created_at) "
+                "VALUES (?, ?, ?, ?, ?, zeroblob(?), ?, ?)",
+                (model_id, user_id, filename, checksum, length, length, _dumps(metadata), time.time())
+            )
+            rowid = conn.execute("SELECT rowid FROM store_models WHERE id = ?", (model_id,)).fetchone()[0]
+            if hasattr(conn, 'blobopen'):
+                with conn.blobopen('store_models', 'data', rowid) as blob:
+                    for chunk in iter(lambda: model_file.read(SQLITE_BLOB_CHUNK_SIZE), b''):
+                        blob.write(chunk)
+            else:
+                conn.execute("UPDATE store_models SET data = ? WHERE rowid = ?",
+                             (sqlite3.Binary(model_file.read()), rowid))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return model_id
+
+    def latest_model(self, user_id):
+        row = self.connection().execute(
+            "SELECT id, user_id, filename, sha256, length, metadata, created_at FROM store_models "
+            "WHERE user_id = ? ORDER BY created_at DESC LIMIT 1", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "user_id": row['user_id'],
+            "gridfs_id": row['id'],
+            "sha256": row['sha256'],
+            "filename": row['filename'],
+            "created_at": row['created_at'],
+            "metadata": json.loads(row['metadata']) if row['metadata'] else None,
+        }
+
+    def open_model(self, model_id):
+        """Yield a stored model's bytes in chunks."""
+        conn = self.connection()
+        row = conn.execute("SELECT rowid, length FROM store_models WHERE id = ?", (model_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No model with id {model_id}")
+        if hasattr(conn, 'blobopen'):
+            with conn.blobopen('store_models', 'data', row['rowid'], readonly=True) as blob:
+                for chunk in iter(lambda: blob.read(SQLITE_BLOB_CHUNK_SIZE), b''):
+                    yield chunk
+        else:
+            data = conn.execute("SELECT data FROM store_models WHERE id = ?", (model_id,)).fetchone()[0]
+            for start in range(0, len(data), SQLITE_BLOB_CHUNK_SIZE):
+                yield bytes(data[start:start + SQLITE_BLOB_CHUNK_SIZE])
+
+    def model_checksums(self):
+        rows = self.connection().execute(
+            "SELECT id, user_id, sha256 FROM store_models WHERE sha256 IS NOT NULL ORDER BY created_at"
+        )
+        return {(row['user_id'], row['sha256']): row['id'] for row in rows}
+
+    def unchecksummed_models(self):
+        rows = self.connection().execute(
+            "SELECT id, user_id, filename FROM store_models WHERE sha256 IS NULL ORDER BY created_at"
+        )
+        return {(row['user_id'], row['filename']): row['id'] for row in rows}
+
+    def link_models(self, links, update_for):
+        """Apply update_for(model_id) to each (user_id, model_id) pair's user document."""
+        modified = 0
+        for user_id, model_id in links:
+            if self.update_user(user_id, update_for(model_id)):
+                modified += 1
+        return modified
+
+    # Monitoring events
+
+    def insert_events(self, collection, docs):
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO store_events (collection, user_id, session_id, timestamp, doc) VALUES (?, ?, ?, ?, ?)",
+                [(collection, doc.get('user_id'), doc.get('session_id'), doc.get('timestamp'), _dumps(doc))
+                 for doc in docs]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(docs)
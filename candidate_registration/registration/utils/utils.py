@@ -2,8 +2,14 @@ import os
 import json
 import time
 import uuid
-from .db import save_user, update_user, init_db, is_mongodb_available, JSONEncoder, save_model
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .db import (save_user, update_user, init_db, is_storage_available, JSONEncoder, save_model,
+                 stored_model_checksums, stored_unchecksummed_models, link_models_to_users, get_user)
+from .artifact_cache import file_sha256
+from .id_index import id_index
+from .log import get_logger
 
+logger = get_logger(__name__)
 
 
 def create_required_directories():
@@ -12,7 +18,7 @@ def create_required_directories():
     os.makedirs('static/models', exist_ok=True)
     os.makedirs('static/temp', exist_ok=True)
     
-    # Initialize the MongoDB connection
+    # Initialize the storage backend (MongoDB or embedded SQLite)
     init_db()
 
 def save_user_data(name, email, phone, education):
@@ -44,16 +50,19 @@ def save_user_data(name, email, phone, education):
     }
     
     # Save to MongoDB only if available
-    if is_mongodb_available():
+    if is_storage_available():
         mongo_id = save_user(user_data)
         # Don't include ObjectId in JSON file
+
+    # Make the new candidate findable by ID document lookups straight away
+    id_index.add_user(user_data)
     
     # Save to JSON file for backward compatibility
     try:
         with open(os.path.join(user_dir, 'user_data.json'), 'w') as f:
             json.dump(user_data, f, indent=4, cls=JSONEncoder)
     except Exception as e:
-        print(f"Error saving user data to JSON: {str(e)}")
+        logger.error(f"Error saving user data to JSON: {str(e)}")
     
     return user_id
 
@@ -65,8 +74,8 @@ def update_registration_status(user_id, status=True, status_message="completed")
         'registration_completed_at': time.time()
     }
     
-    # Update in MongoDB if available
-    if is_mongodb_available():
+    # Update in MongoDB if available (update_user also invalidates the cached user)
+    if is_storage_available():
         update_user(user_id, update_data)
     
     # Also update JSON file
@@ -83,7 +92,45 @@ def update_registration_status(user_id, status=True, status_message="completed")
             with open(json_path, 'w') as f:
                 json.dump(user_data, f, indent=4, cls=JSONEncoder)
     except Exception as e:
-        print(f"Error updating JSON file: {str(e)}")
+        logger.error(f"Error updating JSON file: {str(e)}")
+
+def describe_registration_status(user_data):
+    """
+    Map a user's registration_status to the progress payload shown to the candidate.
+    
+    Args:
+        user_data: User document (or any dict with registration_status)
+        
+    Returns:
+        Dict with 'status' ('processing', 'completed' or 'failed') and progress details
+    """
+    status = user_data.get('registration_status', 'unknown')
+    
+    if status in ['completed_successfully', 'completed_without_model']:
+        # Processing is complete
+        return {'status': 'completed', 'progress': 100, 'step': 'Processing complete'}
+    elif status in ['error', 'frame_extraction_failed', 'video_too_small', 'annotation_generation_failed',
+                    'no_frames_extracted']:
+        # Processing failed
+        return {'status': 'failed', 'message': user_data.get('error_message') or f'Processing failed: {status}'}
+    elif status == 'initiated':
+        # Registered, video not received yet
+        return {'status': 'processing', 'progress': 20, 'step': 'Uploading video...'}
+    elif status == 'video_captured':
+        # Just started processing
+        return {'status': 'processing', 'progress': 30, 'step': 'Extracting frames from video...'}
+    elif status == 'frame_extraction_complete':
+        # Extracted frames, processing annotations
+        return {'status': 'processing', 'progress': 50, 'step': 'Generating annotations...'}
+    elif status == 'model_training_started':
+        # Training model
+        return {'status': 'processing', 'progress': 75, 'step': 'Training recognition model...'}
+    elif status == 'processing_skipped':
+        # User skipped processing
+        return {'status': 'completed', 'progress': 100, 'step': 'Processing skipped'}
+    else:
+        # Default response for unknown or other statuses
+        return {'status': 'processing', 'progress': 50, 'step': 'Processing your video...'}
 
 def get_roi_coordinates(frame_width=640, frame_height=480):
     """
@@ -107,74 +154,172 @@ def get_roi_coordinates(frame_width=640, frame_height=480):
     
     return [x_min, y_min, roi_width, roi_height]
 
-def import_existing_models_to_mongodb():
+def import_existing_models_to_mongodb(model_dir=None, workers=4, dry_run=False, state_file=None,
+                                      resume=False, link_batch_size=100):
     """
     Import all existing model files from the file system into MongoDB.
     Useful for migrating existing models to the database.
     
+    Files are checksummed and uploaded by a bounded thread pool. Models whose
+    (user_id, sha256) is already stored are skipped, as are files whose
+    (user_id, filename) matches a model stored before checksums were
+    recorded, so re-running the import does not duplicate anything. User
+    documents are linked to their new models in batched bulk writes; a
+    skipped model whose user document does not reference it (e.g. a run
+    stopped between upload and linking) is linked as well.
+    
+    Args:
+        model_dir: Directory containing user_<uuid>.pt files (default static/models)
+        workers: Number of concurrent upload threads
+        dry_run: Only report what would be imported
+        state_file: File recording finished model files, one per line
+        resume: Skip model files already recorded in state_file
+        link_batch_size: Number of user documents updated per bulk write
+    
     Returns:
         tuple: (imported_count, failed_count, skipped_count)
     """
-    if not is_mongodb_available():
-        print("MongoDB not available. Cannot import models.")
+    if not is_storage_available():
+        logger.warning("Storage not available. Cannot import models.")
         return 0, 0, 0
     
-    model_dir = os.path.join('static', 'models')
+    model_dir = model_dir or os.path.join('static', 'models')
     imported_count = 0
     failed_count = 0
     skipped_count = 0
+    duplicate_count = 0
+    bytes_processed = 0
     
-    # Get all user model files
-    model_files = [f for f in os.listdir(model_dir) if f.startswith('user_') and f.endswith('.pt')]
+    # Model files finished by a previous run
+    completed = set()
+    if state_file and resume and os.path.exists(state_file):
+        with open(state_file) as f:
+            completed = {line.strip() for line in f if line.strip()}
+    elif state_file and not dry_run and os.path.exists(state_file):
+        os.remove(state_file)
+    
+    existing = stored_model_checksums() or {}
+    # Models uploaded before checksums were recorded are matched by file name
+    legacy = stored_unchecksummed_models() or {}
     
-    for model_file in model_files:
+    # Get all user model files
+    candidates = []
+    for model_file in sorted(os.listdir(model_dir)):
+        if not (model_file.startswith('user_') and model_file.endswith('.pt')):
+            continue
+        
+        # Extract user_id from filename
+        user_id = model_file.replace('user_', '').replace('.pt', '')
+        
+        # Check if valid UUID
         try:
-            # Extract user_id from filename
-            user_id = model_file.replace('user_', '').replace('.pt', '')
-            
-            # Check if valid UUID
+            uuid.UUID(user_id)
+        except ValueError:
+            logger.warning(f"Skipping {model_file}: Invalid UUID format")
+            skipped_count += 1
+            continue
+        
+        if model_file in completed:
+            skipped_count += 1
+            continue
+        
+        candidates.append((model_file, user_id))
+    
+    def import_one(model_file, user_id):
+        model_path = os.path.join(model_dir, model_file)
+        metadata_path = os.path.join(model_dir, f"user_{user_id}_metadata.txt")
+        size = os.path.getsize(model_path)
+        stored_id = legacy.get((user_id, model_file))
+        checksum = None
+        if stored_id is None:
+            checksum = file_sha256(model_path)
+            stored_id = existing.get((user_id, checksum))
+        if stored_id is not None:
+            # Already stored: return the model id only if the user still has to be linked to it
+            user = get_user(user_id, fields=['model_db_id'])
+            linked = user is None or user.get('model_db_id') == str(stored_id)
+            return 'duplicate', (None if linked else stored_id), size
+        if dry_run:
+            return 'would_import', None, size
+        
+        model_id = save_model(
+            user_id=user_id,
+            model_file_path=model_path,
+            metadata_file_path=metadata_path if os.path.exists(metadata_path) else None,
+            checksum=checksum,
+            link_user=False
+        )
+        return ('imported' if model_id else 'failed'), model_id, size
+    
+    pending_links = []
+    pending_files = []
+    
+    def record_done(model_files):
+        if state_file and not dry_run and model_files:
+            with open(state_file, 'a') as f:
+                f.writelines(f"{name}\n" for name in model_files)
+    
+    def flush_links():
+        # Files are only recorded as done once their user documents are linked
+        link_models_to_users(pending_links)
+        record_done(pending_files)
+        pending_links.clear()
+        pending_files.clear()
+    
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(import_one, model_file, user_id): (model_file, user_id)
+                   for model_file, user_id in candidates}
+        for future in as_completed(futures):
+            model_file, user_id = futures[future]
             try:
-                uuid_obj = uuid.UUID(user_id)
-            except ValueError:
-                print(f"Skipping {model_file}: Invalid UUID format")
-                skipped_count += 1
+                status, model_id, size = future.result()
+            except Exception as e:
+                logger.error(f"Error importing model {model_file}: {str(e)}")
+                failed_count += 1
                 continue
             
-            model_path = os.path.join(model_dir, model_file)
-            metadata_path = os.path.join(model_dir, f"user_{user_id}_metadata.txt")
-            
-            # Check if metadata file exists
-            metadata_exists = os.path.exists(metadata_path)
-            
-            # Import model to MongoDB
-            print(f"Importing model for user {user_id}...")
-            model_id = save_model(
-                user_id=user_id,
-                model_file_path=model_path,
-                metadata_file_path=metadata_path if metadata_exists else None
-            )
-            
-            if model_id:
-                print(f"✅ Successfully imported model for user {user_id}")
+            bytes_processed += size
+            if status == 'imported':
+                logger.info(f"Successfully imported model for user {user_id}")
+                imported_count += 1
+                pending_links.append((user_id, model_id))
+                pending_files.append(model_file)
+                if len(pending_links) >= link_batch_size:
+                    flush_links()
+            elif status == 'duplicate':
+                duplicate_count += 1
+                skipped_count += 1
+                if model_id is None:
+                    record_done([model_file])
+                elif not dry_run:
+                    logger.info(f"Linking user {user_id} to already stored model {model_id}")
+                    pending_links.append((user_id, model_id))
+                    pending_files.append(model_file)
+                    if len(pending_links) >= link_batch_size:
+                        flush_links()
+            elif status == 'would_import':
+                logger.info(f"Would import model for user {user_id}")
                 imported_count += 1
-                
-                # Update user document to indicate model is stored in DB
-                update_user(user_id, {
-                    "model_stored_in_db": True,
-                    "model_db_id": str(model_id),
-                    "model_stored_at": time.time()
-                })
             else:
-                print(f"❌ Failed to import model for user {user_id}")
+                logger.error(f"Failed to import model for user {user_id}")
                 failed_count += 1
-                
-        except Exception as e:
-            print(f"Error importing model {model_file}: {str(e)}")
-            failed_count += 1
-    
-    print(f"\nImport summary:")
-    print(f"- {imported_count} models successfully imported")
-    print(f"- {failed_count} models failed to import")
-    print(f"- {skipped_count} files skipped (invalid format)")
+    
+    if not dry_run:
+        flush_links()
+    
+    elapsed = max(time.time() - start_time, 1e-6)
+    processed = len(candidates)
+    
+    logger.info(
+        f"Import summary{' (dry run)' if dry_run else ''}: "
+        f"{imported_count} models {'to import' if dry_run else 'successfully imported'}, "
+        f"{failed_count} failed, {skipped_count} files skipped ({duplicate_count} already stored, "
+        f"{skipped_count - duplicate_count} invalid or finished earlier); "
+        f"{processed} files in {elapsed:.2f}s: {processed / elapsed:.1f} files/s, "
+        f"{bytes_processed / elapsed / (1024 * 1024):.2f} MB/s",
+        extra={'imported': imported_count, 'failed': failed_count, 'skipped': skipped_count,
+               'duplicates': duplicate_count, 'elapsed_seconds': round(elapsed, 2)}
+    )
     
     return imported_count, failed_count, skipped_count
@@ -3,9 +3,14 @@ import os
 import time
 import numpy as np  # Added numpy import
 from .utils import get_roi_coordinates
-from .db import update_user, is_mongodb_available, save_frames
+from .db import update_user, is_storage_available, save_frames
 import base64
 from ultralytics import YOLO
+from .log import get_logger, RateLimitedLogger
+
+logger = get_logger(__name__)
+# Messages logged for every frame of a video
+frame_log = RateLimitedLogger(logger)
 
 def extract_frames(video_path, output_dir, interval=1):
     """
@@ -20,14 +25,14 @@ def extract_frames(video_path, output_dir, interval=1):
     cap = cv2.VideoCapture(video_path)
     
     if not cap.isOpened():
-        print(f"Error: Could not open video file {video_path}")
+        logger.error(f"Could not open video file {video_path}")
         return False
     
     # Get video properties
     fps = cap.get(cv2.CAP_PROP_FPS)
     if fps <= 0:
         fps = 30  # Default to 30 fps if we can't determine it
-        print(f"Warning: Could not determine video FPS, using default value of {fps}")
+        logger.warning(f"Could not determine video FPS, using default value of {fps}")
     
     frame_interval = max(1, int(fps * interval))
     
@@ -51,20 +56,20 @@ def extract_frames(video_path, output_dir, interval=1):
             try:
                 cv2.imwrite(output_path, frame)
                 saved_count += 1
-                print(f"Saved frame {saved_count} to {output_path}")
+                frame_log.debug('saved_frame', f"Saved frame {saved_count} to {output_path}")
             except Exception as e:
-                print(f"Error saving frame: {str(e)}")
+                frame_log.error('save_frame_error', f"Error saving frame: {str(e)}")
         
         frame_count += 1
     
     cap.release()
-    print(f"Extracted {saved_count} frames from video")
+    logger.info(f"Extracted {saved_count} frames from video")
     
     # Verify we have saved at least a few frames
     if saved_count > 0:
         return True
     else:
-        print("No frames were successfully extracted from the video")
+        logger.warning("No frames were successfully extracted from the video")
         
         # Create a single default frame if extraction failed
         try:
@@ -80,10 +85,10 @@ def extract_frames(video_path, output_dir, interval=1):
             )
             default_frame_path = os.path.join(output_dir, "frame_0000.jpg")
             cv2.imwrite(default_frame_path, default_frame)
-            print(f"Created default frame at {default_frame_path}")
+            logger.info(f"Created default frame at {default_frame_path}")
             return True
         except Exception as e:
-            print(f"Error creating default frame: {str(e)}")
+            logger.error(f"Error creating default frame: {str(e)}")
             return False
 
 def store_frames_in_db(frames_dir, user_id):
@@ -98,15 +103,15 @@ def store_frames_in_db(frames_dir, user_id):
         True if frames were stored, False otherwise
     """
     try:
-        if not is_mongodb_available():
-            print("MongoDB not available, skipping frame storage")
+        if not is_storage_available():
+            logger.warning("Storage not available, skipping frame storage")
             return False
         
         # Get all frames from directory
         frames = [f for f in os.listdir(frames_dir) if f.endswith('.jpg')]
         
         if not frames:
-            print("No frames found to store in database")
+            logger.warning("No frames found to store in database")
             return False
         
         # Prepare frames data
@@ -128,11 +133,11 @@ def store_frames_in_db(frames_dir, user_id):
         # Save frames to MongoDB
         result = save_frames(user_id, frames_data)
         
-        print(f"Stored {len(frames_data)} frames in MongoDB for user {user_id}")
+        logger.info(f"Stored {len(frames_data)} frames in MongoDB for user {user_id}")
         return result
     
     except Exception as e:
-        print(f"Error storing frames in database: {str(e)}")
+        logger.error(f"Error storing frames in database: {str(e)}")
         return False
 
 def process_video(frames_dir, annotations_dir, user_id):
@@ -152,21 +157,21 @@ def process_video(frames_dir, annotations_dir, user_id):
         frames = [f for f in os.listdir(frames_dir) if f.endswith('.jpg')]
         
         if not frames:
-            print("No frames found to process")
+            logger.warning("No frames found to process")
             # Create a dummy frame if none exist
             dummy_frame_path = os.path.join(frames_dir, "dummy_frame.jpg")
             dummy_frame = np.ones((480, 640, 3), dtype=np.uint8) * 200  # Light gray
             cv2.imwrite(dummy_frame_path, dummy_frame)
             frames = ["dummy_frame.jpg"]
         
-        print(f"Processing {len(frames)} frames for annotations")
+        logger.info(f"Processing {len(frames)} frames for annotations")
         
         for frame_file in frames:
             frame_path = os.path.join(frames_dir, frame_file)
             frame = cv2.imread(frame_path)
             
             if frame is None:
-                print(f"Warning: Could not read frame {frame_path}")
+                frame_log.warning('unreadable_frame', f"Could not read frame {frame_path}")
                 continue
             
             # Get image dimensions
@@ -200,11 +205,11 @@ def process_video(frames_dir, annotations_dir, user_id):
         # After processing, store the frames in MongoDB
         store_frames_in_db(frames_dir, user_id)
         
-        print(f"Generated annotations for {len(frames)} frames")
+        logger.info(f"Generated annotations for {len(frames)} frames")
         return True
     
     except Exception as e:
-        print(f"Error processing video: {str(e)}")
+        logger.error(f"Error processing video: {str(e)}")
         return False
 
 def draw_roi_on_frame(frame, roi_coordinates):
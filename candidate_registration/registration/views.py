@@ -1,13 +1,27 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
 import json
 import base64
 import os
 import time
+import asyncio
+import functools
 
-from registration.utils.utils import save_user_data, create_required_directories, update_registration_status
-from registration.utils.db import get_user, update_user, is_mongodb_available
+from registration.utils.utils import save_user_data, create_required_directories, update_registration_status, describe_registration_status
+from registration.utils.db import get_user, update_user, is_storage_available, user_cache_stats
+from registration.utils.events import registration_events, alert_events
+from registration.utils.executors import run_io, run_inference, run_ocr, inference_pending, executor_stats
+from registration.utils.mongo import pool_stats
+from registration.utils.artifact_cache import model_cache
+from registration.utils.capture_policy import capture_policy
+from registration.utils.admission import frame_admission, SHED, SUPERSEDED
+from registration.utils.metrics import metrics, stage_timer
+from registration.utils.profiling import profiled_thread
+from registration.utils.log import get_logger, log_stats
+from registration.utils.id_verification import read_id_card, ocr_cache
+from registration.utils.id_index import get_id_index
 from registration.utils.video_processor import process_video, extract_frames, store_frames_in_db
 from registration.utils.model_trainer import train_yolo_model
 from django.views.decorators.csrf import csrf_exempt
@@ -15,8 +29,78 @@ from django.http import JsonResponse
 from registration.utils.monitor_engine import ExamMonitor
 import json
 
+logger = get_logger(__name__)
+
 monitor_instance = ExamMonitor()
 
+# Server-Sent Events tuning for processing_events
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_DURATION_SECONDS = 600
+
+def _runtime_gauges():
+    """Queue depths and counters of the monitoring pipeline, read at scrape time."""
+    admission = frame_admission.stats()
+    log_writer = monitor_instance.log_writer.stats()
+    evidence = monitor_instance.evidence_writer.stats()
+    frame_buffers = monitor_instance.frame_buffers.stats()
+    limiter = monitor_instance.alert_limiter.stats()
+    user_cache = user_cache_stats()
+    capture = capture_policy.stats()
+    logs = log_stats()
+    ocr = ocr_cache.stats()
+    models = model_cache.stats()
+    pool = pool_stats()
+    executors = executor_stats()
+    executors.pop('inference_pending', None)
+    return [
+        ('inference_pending', (), inference_pending()),
+        ('frame_admission_pending', (), admission['pending']),
+        ('frame_admission_max_pending', (), admission['max_pending']),
+        ('frame_admission_admitted_total', (), admission['admitted']),
+        ('frame_admission_shed_total', (), admission['shed']),
+        ('frame_admission_superseded_total', (), admission['superseded']),
+        ('frame_latency_ewma_seconds', (), capture['latency_ewma_ms'] / 1000),
+        ('capture_pressure', (), capture['pressure']),
+        ('log_writer_queue_depth', (), log_writer['queue_depth']),
+        ('log_writer_dropped_total', (), log_writer['dropped']),
+        ('log_queue_depth', (), logs['queued']),
+        ('log_records_dropped_total', (), logs['dropped']),
+        ('evidence_queue_depth', (), evidence['queue_depth']),
+        ('evidence_dropped_total', (), evidence['dropped']),
+        ('frame_buffer_bytes', (), frame_buffers['bytes']),
+        ('frame_buffer_sessions', (), frame_buffers['sessions']),
+        ('alerts_emitted_total', (), limiter['emitted']),
+        ('alerts_suppressed_total', (), limiter['suppressed']),
+        ('user_cache_hits_total', (), user_cache['hits']),
+        ('user_cache_misses_total', (), user_cache['misses']),
+        ('ocr_cache_hits_total', (), ocr['hits']),
+        ('ocr_cache_misses_total', (), ocr['misses']),
+        ('model_cache_hits_total', (), models['hits']),
+        ('model_cache_misses_total', (), models['misses']),
+        ('mongo_pool_max_size', (), pool['max_pool_size']),
+        ('mongo_pool_connections_open', (), pool['connections_open']),
+        ('mongo_pool_checked_out', (), pool['checked_out']),
+        ('mongo_pool_max_checked_out', (), pool['max_checked_out']),
+        ('mongo_pool_wait_queue', (), pool['waiting']),
+        ('mongo_pool_max_wait_queue', (), pool['max_waiting']),
+        ('mongo_pool_checkouts_total', (), pool['checkouts']),
+        ('mongo_pool_checkout_failures_total', (), pool['checkout_failures']),
+        ('mongo_pool_checkout_wait_seconds_total', (), pool['checkout_wait_seconds_total']),
+        ('mongo_pool_clears_total', (), pool['pool_clears']),
+        ('event_subscribers', (('broker', 'registration'),), registration_events.stats()['subscribers']),
+        ('event_subscribers', (('broker', 'alerts'),), alert_events.stats()['subscribers']),
+    ] + [
+        gauge
+        for name, stats in executors.items()
+        for gauge in (
+            ('executor_max_workers', (('executor', name),), stats['max_workers']),
+            ('executor_workers', (('executor', name),), stats.get('threads', stats.get('processes', 0))),
+            ('executor_queued', (('executor', name),), stats['queued']),
+        )
+    ]
+
+metrics.register_gauges(_runtime_gauges)
+
 create_required_directories()
 
 def index(request):
@@ -33,10 +117,16 @@ def register(request):
         return JsonResponse({'status': 'success', 'user_id': user_id})
 
 @csrf_exempt
+@profiled_thread
 def save_video(request):
+    with stage_timer('enrollment', 'save_video_total'):
+        return _save_video(request)
+
+def _save_video(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            with stage_timer('enrollment', 'parse_request'):
+                data = json.loads(request.body)
             video_data = data.get('video_data', '')
             user_id = data.get('user_id', '')
 
@@ -44,7 +134,7 @@ def save_video(request):
                 return JsonResponse({'status': 'error', 'message': 'Missing video data or user ID'})
 
             # Log the video data length for debugging
-            print(f"Received video data of length: {len(video_data)}")
+            logger.debug(f"Received video data of length: {len(video_data)}")
             
             try:
                 # Make sure the video data is properly formatted
@@ -57,23 +147,25 @@ def save_video(request):
 
                 video_path = os.path.join(user_dir, 'video.webm')
                 try:
-                    decoded_data = base64.b64decode(video_data)
-                    with open(video_path, 'wb') as f:
-                        f.write(decoded_data)
-                    print(f"Video saved to {video_path}, size: {len(decoded_data)} bytes")
+                    with stage_timer('enrollment', 'video_decode'):
+                        decoded_data = base64.b64decode(video_data)
+                    with stage_timer('enrollment', 'video_write'):
+                        with open(video_path, 'wb') as f:
+                            f.write(decoded_data)
+                    logger.info(f"Video saved to {video_path}, size: {len(decoded_data)} bytes")
                     
                     # Check if video file is valid (not empty or too small)
                     if os.path.getsize(video_path) < 1000:  # Less than 1KB is suspicious
                         error_msg = f"Video file too small: {os.path.getsize(video_path)} bytes"
-                        print(error_msg)
+                        logger.warning(error_msg)
                         update_user(user_id, {"registration_status": "video_too_small"})
                         return JsonResponse({'status': 'error', 'message': 'Recorded video is too small or empty'})
                         
                 except Exception as e:
-                    print(f"Base64 decoding error: {str(e)}")
+                    logger.error(f"Base64 decoding error: {str(e)}")
                     return JsonResponse({'status': 'error', 'message': 'Invalid video data encoding'})
 
-                if is_mongodb_available():
+                if is_storage_available():
                     update_user(user_id, {
                         "video_saved": True,
                         "video_saved_at": time.time(),
@@ -84,15 +176,16 @@ def save_video(request):
                 os.makedirs(frames_dir, exist_ok=True)
                 
                 # More detailed frame extraction
-                extract_result = extract_frames(video_path, frames_dir)
+                with stage_timer('enrollment', 'extract_frames'):
+                    extract_result = extract_frames(video_path, frames_dir)
                 if not extract_result:
-                    print(f"Frame extraction failed for user {user_id}")
+                    logger.error(f"Frame extraction failed for user {user_id}")
                     update_user(user_id, {"registration_status": "frame_extraction_failed"})
                     return JsonResponse({'status': 'error', 'message': 'Failed to extract frames from video'})
 
                 # Log the number of extracted frames
                 frames_count = len([f for f in os.listdir(frames_dir) if f.endswith('.jpg')])
-                print(f"Extracted {frames_count} frames from video")
+                logger.info(f"Extracted {frames_count} frames from video")
 
                 if frames_count == 0:
                     update_user(user_id, {"registration_status": "no_frames_extracted"})
@@ -101,24 +194,27 @@ def save_video(request):
                 annotations_dir = os.path.join(user_dir, 'annotations')
                 os.makedirs(annotations_dir, exist_ok=True)
                 
-                process_result = process_video(frames_dir, annotations_dir, user_id)
+                with stage_timer('enrollment', 'annotate_frames'):
+                    process_result = process_video(frames_dir, annotations_dir, user_id)
                 if not process_result:
-                    print(f"Annotation generation failed for user {user_id}")
+                    logger.error(f"Annotation generation failed for user {user_id}")
                     update_user(user_id, {"registration_status": "annotation_generation_failed"})
                     return JsonResponse({'status': 'error', 'message': 'Annotation generation failed'})
 
-                store_result = store_frames_in_db(frames_dir, user_id)
-                if not store_result and is_mongodb_available():
-                    print(f"Warning: Failed to store frames in database for user {user_id}")
+                with stage_timer('enrollment', 'store_frames'):
+                    store_result = store_frames_in_db(frames_dir, user_id)
+                if not store_result and is_storage_available():
+                    logger.warning(f"Failed to store frames in database for user {user_id}")
                     # Continue anyway as this is not critical
 
                 model_dir = os.path.join('static', 'models')
                 os.makedirs(model_dir, exist_ok=True)
                 update_user(user_id, {"registration_status": "model_training_started"})
 
-                result = train_yolo_model(frames_dir, annotations_dir, model_dir, user_id)
+                with stage_timer('enrollment', 'train_model'):
+                    result = train_yolo_model(frames_dir, annotations_dir, model_dir, user_id)
                 if not result:
-                    print(f"Model training failed for user {user_id}, but registration will complete")
+                    logger.warning(f"Model training failed for user {user_id}, but registration will complete")
                     update_registration_status(user_id, True, "completed_without_model")
                     return JsonResponse({'status': 'partial_success', 'message': 'Model training failed but registration completed'})
 
@@ -129,11 +225,10 @@ def save_video(request):
                 # More detailed exception handling
                 import traceback
                 error_trace = traceback.format_exc()
-                print(f"Video processing error for user {user_id}: {str(e)}")
-                print(error_trace)
+                logger.exception(f"Video processing error for user {user_id}: {str(e)}")
                 
                 error_type = type(e).__name__
-                if is_mongodb_available():
+                if is_storage_available():
                     update_user(user_id, {
                         "registration_status": "error",
                         "error_type": error_type,
@@ -159,18 +254,16 @@ def save_video(request):
                     'error_type': error_type
                 })
         except json.JSONDecodeError:
-            print("Invalid JSON in request body")
+            logger.warning("Invalid JSON in request body")
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON in request'})
         except Exception as e:
-            import traceback
-            print(f"Unexpected error in save_video: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception(f"Unexpected error in save_video: {str(e)}")
             return JsonResponse({'status': 'error', 'message': f'Unexpected error: {str(e)}'})
     
     return JsonResponse({'status': 'error', 'message': 'Method not allowed'})
 
 @csrf_exempt
-def monitor_frame(request):
+async def monitor_frame(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
 
@@ -181,13 +274,41 @@ def monitor_frame(request):
         if not frame:
             return JsonResponse({'status': 'error', 'message': 'No frame provided'})
 
-        result = monitor_instance.monitor_single_frame(frame)
+        user_id = data.get('user_id')
+        session_id = data.get('session_id')
+        session_key = f"{user_id}:{session_id}" if user_id and session_id else None
+
+        # Bounded admission: shed when saturated, and let a newer frame from
+        # the same session replace one still waiting for inference
+        outcome = await frame_admission.acquire(session_key)
+        if outcome == SHED:
+            retry_after = frame_admission.retry_after(capture_policy.latency_ewma)
+            response = JsonResponse({
+                'status': 'error',
+                'message': 'Server busy, retry later',
+                'retry_after': retry_after,
+                'capture': capture_policy.recommend(session_key)
+            }, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        if outcome == SUPERSEDED:
+            return JsonResponse({'status': 'superseded', 'message': 'Replaced by a newer frame from this session'})
+
+        # Inference runs in its own pool so the event loop keeps serving other
+        # sessions; the slot is released when the job finishes, even if this
+        # request is abandoned first
+        started = time.monotonic()
+        result = await run_inference(monitor_instance.monitor_single_frame, frame, user_id, session_id,
+                                     on_done=functools.partial(frame_admission.release, session_key))
+        capture_policy.observe(session_key, time.monotonic() - started, result,
+                               enrolled_user_id=user_id if user_id in monitor_instance.gallery else None)
+        result['capture'] = capture_policy.recommend(session_key)
         return JsonResponse(result)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
-def log_tab_switch(request):
+async def log_tab_switch(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
     
@@ -200,13 +321,13 @@ def log_tab_switch(request):
         if not user_id or not session_id:
             return JsonResponse({'status': 'error', 'message': 'Missing user_id or session_id'})
         
-        result = monitor_instance.log_tab_switch(user_id, session_id, event_data)
+        result = await run_io(monitor_instance.log_tab_switch, user_id, session_id, event_data)
         return JsonResponse(result)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
-def log_mouse_movement(request):
+async def log_mouse_movement(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
     
@@ -219,13 +340,13 @@ def log_mouse_movement(request):
         if not user_id or not session_id:
             return JsonResponse({'status': 'error', 'message': 'Missing user_id or session_id'})
         
-        result = monitor_instance.log_mouse_movement(user_id, session_id, movement_data)
+        result = await run_io(monitor_instance.log_mouse_movement, user_id, session_id, movement_data)
         return JsonResponse(result)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
-def detect_screen_capture(request):
+async def detect_screen_capture(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
     
@@ -238,13 +359,13 @@ def detect_screen_capture(request):
         if not user_id or not session_id:
             return JsonResponse({'status': 'error', 'message': 'Missing user_id or session_id'})
         
-        result = monitor_instance.detect_screen_capture(user_id, session_id, event_data)
+        result = await run_io(monitor_instance.detect_screen_capture, user_id, session_id, event_data)
         return JsonResponse(result)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
-def log_copy_paste(request):
+async def log_copy_paste(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
     
@@ -257,73 +378,162 @@ def log_copy_paste(request):
         if not user_id or not session_id:
             return JsonResponse({'status': 'error', 'message': 'Missing user_id or session_id'})
         
-        result = monitor_instance.log_copy_paste(user_id, session_id, event_data)
+        result = await run_io(monitor_instance.log_copy_paste, user_id, session_id, event_data)
+        return JsonResponse(result)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+@csrf_exempt
+async def end_session(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
+    
+    try:
+        data = json.loads(request.body)
+        user_id = data.get('user_id')
+        session_id = data.get('session_id')
+        
+        if not user_id or not session_id:
+            return JsonResponse({'status': 'error', 'message': 'Missing user_id or session_id'})
+        
+        result = await run_io(monitor_instance.end_session, user_id, session_id)
+        return JsonResponse(result)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+@csrf_exempt
+async def verify_id(request):
+    """
+    Check a photo of the candidate's ID document against their registration.
+
+    Expects JSON with image (a data URL or base64 JPEG/PNG) and optionally
+    user_id and session_id. The card is located and cropped before OCR, which
+    runs in a process pool; results are cached by image hash so retries of
+    the same photo are not read again. Without a user_id, the ID number is
+    looked up across all registered users and the best candidates returned.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Only POST allowed'})
+
+    try:
+        data = json.loads(request.body)
+        user_id = data.get('user_id')
+        session_id = data.get('session_id')
+        image = data.get('image', '')
+        if not image:
+            return JsonResponse({'status': 'error', 'message': 'Missing image'})
+
+        try:
+            image_data = base64.b64decode(image.split(',')[-1])
+        except Exception:
+            return JsonResponse({'status': 'error', 'message': 'Invalid image encoding'})
+
+        user = None
+        if user_id:
+            user = await run_io(get_user, user_id)
+            if not user:
+                return JsonResponse({'status': 'error', 'message': 'User not found'})
+
+        cache_key = ocr_cache.key(image_data)
+        ocr = ocr_cache.get(cache_key)
+        cached = ocr is not None
+        if not cached:
+            with stage_timer('id_verification', 'ocr'):
+                ocr = await run_ocr(read_id_card, image_data)
+            if ocr['status'] != 'success':
+                return JsonResponse(ocr)
+            ocr_cache.set(cache_key, ocr)
+
+        id_number = ocr['id_number']
+        result = {
+            'status': 'success',
+            'id_number': id_number,
+            'card_found': ocr['card_found'],
+            'cached': cached,
+        }
+        if user is None:
+            index = await run_io(get_id_index)
+            result['candidates'] = index.lookup(id_number, min_similarity=70) if id_number else []
+            return JsonResponse(result)
+
+        verified, confidence = (monitor_instance.verify_id_against_user(id_number, user)
+                                if id_number else (False, 0.0))
+        result.update(verified=verified, confidence=round(confidence, 2))
+        await run_io(monitor_instance.log_id_verification, user_id, session_id, result)
         return JsonResponse(result)
     except Exception as e:
+        logger.exception(f"ID verification failed: {str(e)}")
         return JsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
-def processing_status(request):
+async def processing_status(request):
     """Endpoint to check the status of video processing for a specific user"""
     user_id = request.GET.get('user_id')
     if not user_id:
         return JsonResponse({'status': 'error', 'message': 'Missing user_id parameter'})
     
-    user_data = get_user(user_id)
+    user_data = await run_io(get_user, user_id)
     if not user_data:
         return JsonResponse({'status': 'error', 'message': 'User not found'})
     
-    # Get registration status from database
-    status = user_data.get('registration_status', 'unknown')
+    return JsonResponse(describe_registration_status(user_data))
+
+async def processing_events(request):
+    """
+    Server-Sent Events stream of processing progress for a specific user.
+    
+    Pushes a progress event whenever the enrollment pipeline changes the
+    user's registration_status, and closes once processing has completed or
+    failed. The stream is an async generator that awaits status changes on
+    the event loop, so each event is flushed to the client as it happens.
+    Status is also re-read on every keepalive in case the update was made by
+    another worker process. Clients fall back to polling processing_status
+    if the stream drops.
+    
+    Under WSGI (runserver, gunicorn sync workers) Django drains an async
+    streaming body before sending any of it, so the stream would hang until
+    processing ends. There the view answers 204 No Content at once, which
+    EventSource treats as a closed stream and the client polls instead.
+    """
+    user_id = request.GET.get('user_id')
+    if not user_id:
+        return JsonResponse({'status': 'error', 'message': 'Missing user_id parameter'})
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    async def event_stream():
+        subscription = registration_events.subscribe_async(user_id)
+        try:
+            deadline = time.time() + SSE_MAX_DURATION_SECONDS
+            last_payload = None
+            user_data = await run_io(get_user, user_id) or {}
+            while True:
+                payload = describe_registration_status(user_data)
+                if payload != last_payload:
+                    last_payload = payload
+                    yield f"data: {json.dumps(payload)}\n\n"
+                    if payload['status'] != 'processing':
+                        return
+                else:
+                    yield ": keepalive\n\n"
+                
+                if time.time() >= deadline:
+                    return
+                try:
+                    user_data = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    user_data = await run_io(get_user, user_id) or user_data
+        finally:
+            registration_events.unsubscribe(user_id, subscription)
     
-    if status in ['completed_successfully', 'completed_without_model']:
-        # Processing is complete
-        return JsonResponse({
-            'status': 'completed',
-            'progress': 100,
-            'step': 'Processing complete'
-        })
-    elif status in ['error', 'frame_extraction_failed', 'video_too_small', 'annotation_generation_failed']:
-        # Processing failed
-        return JsonResponse({
-            'status': 'failed',
-            'message': user_data.get('error_message', f'Processing failed: {status}')
-        })
-    elif status == 'video_captured':
-        # Just started processing
-        return JsonResponse({
-            'status': 'processing',
-            'progress': 30,
-            'step': 'Extracting frames from video...'
-        })
-    elif status == 'frame_extraction_complete':
-        # Extracted frames, processing annotations
-        return JsonResponse({
-            'status': 'processing',
-            'progress': 50,
-            'step': 'Generating annotations...'
-        })
-    elif status == 'model_training_started':
-        # Training model
-        return JsonResponse({
-            'status': 'processing',
-            'progress': 75,
-            'step': 'Training recognition model...'
-        })
-    elif status == 'processing_skipped':
-        # User skipped processing
-        return JsonResponse({
-            'status': 'completed',
-            'progress': 100,
-            'step': 'Processing skipped'
-        })
-    else:
-        # Default response for unknown or other statuses
-        return JsonResponse({
-            'status': 'processing',
-            'progress': 50,
-            'step': 'Processing your video...'
-        })
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def prometheus_metrics(request):
+    """Per-stage latency histograms and p50/p95/p99, counters and queue gauges in Prometheus text format."""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @csrf_exempt
 def skip_processing(request):
@@ -339,7 +549,7 @@ def skip_processing(request):
             return JsonResponse({'status': 'error', 'message': 'Missing user ID'})
         
         # Update user status in database
-        if is_mongodb_available():
+        if is_storage_available():
             update_user(user_id, {
                 "registration_status": "processing_skipped",
                 "processing_skipped_at": time.time()
@@ -6,6 +6,10 @@
  * 2. Mouse movement tracking
  * 3. Copy-paste/cut prevention
  * 4. Screen capture detection
+ * 5. Webcam frame streaming
+ *
+ * Frames and events travel over one WebSocket per session (/ws/monitor)
+ * when the server supports it, falling back to HTTP POSTs otherwise.
  */
 
 class ExamMonitor {
@@ -18,8 +22,25 @@ class ExamMonitor {
             mouseMovement: '/log_mouse_movement',
             screenCapture: '/detect_screen_capture',
             copyPaste: '/log_copy_paste',
-            monitorFrame: '/monitor_frame'
+            endSession: '/end_session',
+            monitorFrame: '/monitor_frame',
+            socket: '/ws/monitor'
         };
+        // Event names used on the WebSocket channel, and the payload key each endpoint uses
+        this.socketEvents = {
+            '/log_tab_switch': ['tab_switch', 'event_data'],
+            '/log_mouse_movement': ['mouse_movement', 'movement_data'],
+            '/detect_screen_capture': ['screen_capture', 'event_data'],
+            '/log_copy_paste': ['copy_paste', 'event_data']
+        };
+        this.socket = null;
+        this.socketRetryMs = 1000;
+        // Capture settings; the server adjusts these with every result (see applyCaptureSettings)
+        this.frameIntervalMs = 1000;
+        this.frameMaxWidth = 640;
+        this.frameQuality = 0.8;
+        this.frameInFlight = false;
+        this.frameBackoffUntil = 0;
         this.intervalIds = {};
         this.mouseThrottleTimeout = null;
         this.mouseMoveThrottleMs = 500; // Only log mouse movement every 500ms
@@ -52,6 +73,7 @@ class ExamMonitor {
         this.setupMouseMovementTracking();
         this.preventCopyPaste();
         this.detectScreenCapture();
+        this.connectSocket();
 
         console.log(`ExamMonitor: Monitoring initialized for user ${userId}, session ${this.sessionId}`);
     }
@@ -60,8 +82,23 @@ class ExamMonitor {
      * Stop all monitoring activities
      */
     stop() {
+        // Let the server close and archive this session's logs.
+        // sendBeacon survives the page navigation that follows exam submission.
+        if (this.monitorActive) {
+            const payload = JSON.stringify({
+                user_id: this.userId,
+                session_id: this.sessionId
+            });
+            navigator.sendBeacon(this.apiEndpoints.endSession,
+                new Blob([payload], { type: 'application/json' }));
+        }
         this.monitorActive = false;
         
+        if (this.socket) {
+            this.socket.close(1000);
+            this.socket = null;
+        }
+        
         // Clear all interval timers
         Object.values(this.intervalIds).forEach(id => clearInterval(id));
         
@@ -534,13 +571,161 @@ class ExamMonitor {
     }
 
     /**
-     * Send data to server endpoint
+     * Open the session's WebSocket channel, reconnecting with backoff while monitoring is active
+     */
+    connectSocket() {
+        if (!('WebSocket' in window)) return;
+        
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const query = `user_id=${encodeURIComponent(this.userId)}&session_id=${encodeURIComponent(this.sessionId)}`;
+        const socket = new WebSocket(`${protocol}//${window.location.host}${this.apiEndpoints.socket}?${query}`);
+        
+        socket.onopen = () => {
+            this.socketRetryMs = 1000;
+        };
+        socket.onmessage = (event) => {
+            let message;
+            try {
+                message = JSON.parse(event.data);
+            } catch (error) {
+                return;
+            }
+            this.handleSocketMessage(message);
+        };
+        socket.onclose = () => {
+            if (this.socket === socket) {
+                this.socket = null;
+            }
+            if (this.monitorActive) {
+                // Fall back to HTTP until the channel is back
+                setTimeout(() => {
+                    if (this.monitorActive && !this.socket) this.connectSocket();
+                }, this.socketRetryMs);
+                this.socketRetryMs = Math.min(this.socketRetryMs * 2, 30000);
+            }
+        };
+        
+        this.socket = socket;
+    }
+    
+    /**
+     * Whether the WebSocket channel is open
+     */
+    socketOpen() {
+        return this.socket && this.socket.readyState === WebSocket.OPEN;
+    }
+    
+    /**
+     * Handle a detection result or alert pushed by the server
+     * @param {object} message - Message from the WebSocket channel
+     */
+    handleSocketMessage(message) {
+        if (message.type === 'result') {
+            this.frameInFlight = false;
+            this.applyCaptureSettings(message.capture);
+            if (message.retry_after) {
+                this.frameBackoffUntil = Date.now() + message.retry_after * 1000;
+            }
+            window.dispatchEvent(new CustomEvent('exammonitor:result', { detail: message }));
+        } else if (message.type === 'alert') {
+            window.dispatchEvent(new CustomEvent('exammonitor:alert', { detail: message }));
+        } else if (message.type === 'error') {
+            console.error('ExamMonitor: server error:', message.message);
+        }
+    }
+    
+    /**
+     * Apply the capture interval, resolution and JPEG quality recommended by the server
+     * @param {object} capture - {interval_ms, max_width, jpeg_quality} from a monitoring result
+     */
+    applyCaptureSettings(capture) {
+        if (!capture) return;
+        
+        if (capture.max_width) this.frameMaxWidth = capture.max_width;
+        if (capture.jpeg_quality) this.frameQuality = capture.jpeg_quality;
+        if (capture.interval_ms && capture.interval_ms !== this.frameIntervalMs) {
+            this.frameIntervalMs = capture.interval_ms;
+            if (this.intervalIds.frameCapture) {
+                this.startFrameStreaming(this.videoElement);
+            }
+        }
+    }
+    
+    /**
+     * Periodically capture webcam frames and send them for analysis
+     * @param {HTMLVideoElement} videoElement - Element showing the webcam stream
+     */
+    startFrameStreaming(videoElement) {
+        this.videoElement = videoElement;
+        this.captureCanvas = this.captureCanvas || document.createElement('canvas');
+        clearInterval(this.intervalIds.frameCapture);
+        this.intervalIds.frameCapture = setInterval(() => this.captureFrame(), this.frameIntervalMs);
+    }
+    
+    /**
+     * Capture one frame as JPEG and send it, unless the previous one is still being processed
+     */
+    captureFrame() {
+        const video = this.videoElement;
+        if (!this.monitorActive || !video || !video.videoWidth) return;
+        // Latest frame wins: skip this capture rather than queue behind a slow upload
+        if (this.frameInFlight || (this.socket && this.socket.bufferedAmount > 0)) return;
+        // The server shed a recent frame and asked us to wait
+        if (Date.now() < this.frameBackoffUntil) return;
+        
+        // Downscale to the recommended width, keeping the aspect ratio
+        const scale = Math.min(1, this.frameMaxWidth / video.videoWidth);
+        const canvas = this.captureCanvas;
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
+        canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+        
+        if (this.socketOpen()) {
+            canvas.toBlob((blob) => {
+                if (blob && this.socketOpen()) {
+                    this.frameInFlight = true;
+                    this.socket.send(blob);
+                    // Don't stall capture forever if a result is lost
+                    setTimeout(() => { this.frameInFlight = false; }, 10000);
+                }
+            }, 'image/jpeg', this.frameQuality);
+            return;
+        }
+        
+        this.frameInFlight = true;
+        fetch(this.apiEndpoints.monitorFrame, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': this.getCsrfToken()
+            },
+            body: JSON.stringify({
+                user_id: this.userId,
+                session_id: this.sessionId,
+                frame: canvas.toDataURL('image/jpeg', this.frameQuality)
+            })
+        })
+        .then(response => response.json())
+        .then(result => this.handleSocketMessage({ type: 'result', ...result }))
+        .catch(error => console.error('Error sending frame:', error))
+        .finally(() => { this.frameInFlight = false; });
+    }
+
+    /**
+     * Send data to server endpoint, over the WebSocket channel when it is open
      * @param {string} endpoint - API endpoint
      * @param {object} data - Data to send
      */
     sendToServer(endpoint, data) {
         if (!this.monitorActive) return;
         
+        const socketEvent = this.socketEvents[endpoint];
+        if (socketEvent && this.socketOpen()) {
+            const [name, payloadKey] = socketEvent;
+            this.socket.send(JSON.stringify({ type: 'event', event: name, data: data[payloadKey] || {} }));
+            return;
+        }
+        
         fetch(endpoint, {
             method: 'POST',
             headers: {
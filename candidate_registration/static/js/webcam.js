@@ -368,6 +368,9 @@ document.addEventListener('DOMContentLoaded', function() {
             
             updateProcessingProgress(20, 'Uploading video...');
             
+            // Show pipeline stages while save_video is still running
+            startUploadProgressStream();
+            
             // Add retry mechanism
             let retries = 0;
             const maxRetries = 2;
@@ -391,6 +394,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     return response.json();
                 })
                 .then(data => {
+                    // The response carries the final outcome; stop the upload-time stream
+                    stopStatusUpdates();
                     if (data.status === 'success') {
                         // Complete success - simulate processing steps
                         simulateProcessingSteps();
@@ -439,6 +444,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         updateProcessingProgress(10, `Retrying upload (${retries}/${maxRetries})...`);
                         setTimeout(attemptSend, 2000);  // Wait 2 seconds before retrying
                     } else {
+                        stopStatusUpdates();
                         // Display a user-friendly error modal
                         showErrorModal(
                             'An error occurred while processing your video. This might be due to connection issues or problems with the video format. Please try again.',
@@ -554,63 +560,133 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Update processing progress
+    let currentProgress = 0;
     function updateProcessingProgress(percent, step) {
+        currentProgress = percent;
         processingProgressFill.style.width = percent + '%';
         processingStepElement.textContent = step;
     }
     
-    // Simulate processing steps (for UI feedback)
-    function simulateProcessingSteps() {
-        // Start with extraction feedback
-        updateProcessingProgress(30, 'Extracting frames...');
+    // Status updates for the current processing run (stream, or polling fallback)
+    let statusEventSource = null;
+    let pollingInterval = null;
+    
+    function stopStatusUpdates() {
+        if (statusEventSource) {
+            statusEventSource.close();
+            statusEventSource = null;
+        }
+        if (pollingInterval) {
+            clearInterval(pollingInterval);
+            pollingInterval = null;
+        }
+    }
+    
+    // Apply a progress payload from the server; returns true once processing is finished
+    function handleProcessingStatus(data) {
+        if (data.status === 'completed') {
+            // Processing complete, stop updates and redirect
+            stopStatusUpdates();
+            updateProcessingProgress(100, 'Registration complete!');
+            setTimeout(() => {
+                window.location.href = '/confirmation/' + userId;
+            }, 1000);
+            return true;
+        } else if (data.status === 'failed') {
+            // Processing failed
+            stopStatusUpdates();
+            showErrorModal(data.message || 'Processing failed', () => {
+                processingSection.classList.add('hidden');
+                videoSection.classList.remove('hidden');
+                recordingProgress.classList.add('hidden');
+                startCaptureBtn.disabled = false;
+            });
+            return true;
+        }
         
-        // Set up status polling to get real progress from server
-        const pollingInterval = setInterval(() => {
+        // Update progress based on server response
+        const progress = data.progress || 50;
+        const step = data.step || 'Processing your video...';
+        updateProcessingProgress(progress, step);
+        return false;
+    }
+    
+    // Poll the status endpoint (used when the event stream is unavailable)
+    function startStatusPolling() {
+        if (pollingInterval) {
+            return;
+        }
+        pollingInterval = setInterval(() => {
             if (!userId) {
-                clearInterval(pollingInterval);
+                stopStatusUpdates();
                 return;
             }
             
             fetch(`/processing_status?user_id=${userId}`)
                 .then(response => response.json())
-                .then(data => {
-                    if (data.status === 'completed') {
-                        // Processing complete, clear polling and redirect
-                        clearInterval(pollingInterval);
-                        updateProcessingProgress(100, 'Registration complete!');
-                        setTimeout(() => {
-                            window.location.href = '/confirmation/' + userId;
-                        }, 1000);
-                    } else if (data.status === 'failed') {
-                        // Processing failed
-                        clearInterval(pollingInterval);
-                        showErrorModal(data.message || 'Processing failed', () => {
-                            processingSection.classList.add('hidden');
-                            videoSection.classList.remove('hidden');
-                            recordingProgress.classList.add('hidden');
-                            startCaptureBtn.disabled = false;
-                        });
-                    } else {
-                        // Update progress based on server response
-                        const progress = data.progress || 50;
-                        const step = data.step || 'Processing your video...';
-                        updateProcessingProgress(progress, step);
-                    }
-                })
+                .then(handleProcessingStatus)
                 .catch(err => {
                     console.error('Error checking processing status:', err);
                     // Continue with simulated steps if polling fails
                 });
         }, 3000); // Poll every 3 seconds
+    }
+    
+    // Follow the pipeline's stage changes while the upload request is in flight.
+    // Only forward progress is shown; the save_video response decides the outcome.
+    function startUploadProgressStream() {
+        if (!window.EventSource || !userId || statusEventSource) {
+            return;
+        }
+        statusEventSource = new EventSource(`/processing_events?user_id=${userId}`);
+        statusEventSource.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.status !== 'processing') {
+                stopStatusUpdates();
+            } else if (data.progress > currentProgress) {
+                updateProcessingProgress(data.progress, data.step);
+            }
+        };
+        statusEventSource.onerror = () => {
+            // Progress is cosmetic here; the upload response still arrives
+            stopStatusUpdates();
+        };
+    }
+    
+    // Simulate processing steps (for UI feedback)
+    function simulateProcessingSteps() {
+        // Start with extraction feedback
+        updateProcessingProgress(30, 'Extracting frames...');
+        
+        // Let the server push progress as stages change; fall back to polling
+        if (window.EventSource && userId) {
+            let finished = false;
+            statusEventSource = new EventSource(`/processing_events?user_id=${userId}`);
+            statusEventSource.onmessage = (event) => {
+                finished = handleProcessingStatus(JSON.parse(event.data));
+            };
+            statusEventSource.onerror = () => {
+                // Stream dropped or was closed by the server
+                if (statusEventSource) {
+                    statusEventSource.close();
+                    statusEventSource = null;
+                }
+                if (!finished) {
+                    startStatusPolling();
+                }
+            };
+        } else {
+            startStatusPolling();
+        }
         
         // Show skip option after 20 seconds
         setTimeout(() => {
-            showSkipOption(pollingInterval);
+            showSkipOption();
         }, 20000);
     }
     
     // Show an option to skip waiting and proceed to confirmation
-    function showSkipOption(pollingInterval) {
+    function showSkipOption() {
         // Only show if we're still in the processing section
         if (processingSection.classList.contains('hidden')) {
             return;
@@ -632,10 +708,8 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // Add click handler
             skipButton.addEventListener('click', () => {
-                // Clear polling interval
-                if (pollingInterval) {
-                    clearInterval(pollingInterval);
-                }
+                // Stop listening for status updates
+                stopStatusUpdates();
                 
                 // Show a message explaining what skipping means
                 const message = 'The registration process will continue in the background. ' +